@@ -1,29 +1,20 @@
 from flask import Flask, render_template, request, jsonify, Response
+import os
 import sys
-import threading
-import queue
-import time
 from main import main as execute_glossary_agent
+from modules.context_serializer import CONTEXT_FORMAT
+from modules.job_manager import JobManager, JobQueueFull, JobStreamCapture
 
 app = Flask(__name__)
 
-# Queue for capturing print output
-log_queue = queue.Queue()
+# Bounded pool of agent runs; each run has its own log buffer (no crosstalk between users)
+job_manager = JobManager(
+    max_workers=int(os.getenv("JOB_MAX_WORKERS", "4")),
+    max_pending=int(os.getenv("JOB_MAX_PENDING", "20"))
+)
 
-class StreamCapture:
-    def __init__(self, original_stdout):
-        self.original_stdout = original_stdout
-
-    def write(self, text):
-        if text.strip():
-            log_queue.put(text.strip())
-        self.original_stdout.write(text)
-    
-    def flush(self):
-        self.original_stdout.flush()
-
-# Replace stdout globally
-sys.stdout = StreamCapture(sys.stdout)
+# Replace stdout globally: print output is routed to the log of the job that produced it
+sys.stdout = JobStreamCapture(sys.stdout)
 
 @app.route("/")
 def index():
@@ -40,44 +31,74 @@ def run_agent():
     data_source = data.get("data_source", "bigquery")
     drive_folder_id = data.get("drive_folder_id", "")
     publish_mode = data.get("publish_mode", "pull_request")
-    
-    def run_task():
-        try:
-            execute_glossary_agent(
-                project_id=project_id,
-                location=location,
-                target_dataset=target_dataset,
-                glossary_id=glossary_id,
-                glossary_display_name=glossary_display_name,
-                data_source=data_source,
-                drive_folder_id=drive_folder_id,
-                publish_mode=publish_mode
-            )
-            log_queue.put("DONE")
-        except Exception as e:
-            log_queue.put(f"❌ ERROR: {str(e)}")
-            log_queue.put("DONE")
+    bq_use_information_schema = bool(data.get("bq_use_information_schema", False))
+    bypass_cache = bool(data.get("bypass_cache", False))
+    incremental = bool(data.get("incremental", False))
+    stream = bool(data.get("stream", True))
+    context_format = data.get("context_format", CONTEXT_FORMAT)
+
+    try:
+        job = job_manager.submit(
+            execute_glossary_agent,
+            project_id=project_id,
+            location=location,
+            target_dataset=target_dataset,
+            glossary_id=glossary_id,
+            glossary_display_name=glossary_display_name,
+            data_source=data_source,
+            drive_folder_id=drive_folder_id,
+            publish_mode=publish_mode,
+            bq_use_information_schema=bq_use_information_schema,
+            use_llm_cache=not bypass_cache,
+            incremental=incremental,
+            stream=stream,
+            context_format=context_format
+        )
+    except JobQueueFull as e:
+        return jsonify({"status": "rejected", "error": str(e)}), 429
+
+    return jsonify({"status": "started", "job_id": job.id})
 
-    threading.Thread(target=run_task).start()
-    return jsonify({"status": "started"})
+@app.route("/jobs")
+def list_jobs():
+    return jsonify([job.to_dict() for job in job_manager.list()])
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/jobs/<job_id>/stream")
+def stream(job_id):
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({"error": "job not found"}), 404
+
+    # EventSource sends Last-Event-ID on reconnection: resume after the last delivered line
+    # (empty or non-numeric values, e.g. rewritten by a proxy, restart from the beginning)
+    try:
+        last_seq = int(request.headers.get("Last-Event-ID", -1))
+    except ValueError:
+        last_seq = -1
 
-@app.route("/stream")
-def stream():
     def event_stream():
+        nonlocal last_seq
         while True:
-            # wait for log entry
-            try:
-                # Prevent keeping connection open forever by putting a small timeout
-                log = log_queue.get(timeout=30)
-                if log == "DONE":
-                    yield f"data: DONE\n\n"
-                    break
-                # Server sent events data payload
-                yield f"data: {log}\n\n"
-            except queue.Empty:
+            lines = job.read(after_seq=last_seq, timeout=30)
+            for seq, line in lines:
+                last_seq = seq
+                # Server sent events data payload (one data field per line of multi-line output)
+                data_fields = "".join(f"data: {part}\n" for part in line.split("\n"))
+                yield f"id: {seq}\n{data_fields}\n"
+            if job.finished and not lines:
+                yield f"data: DONE\n\n"
+                break
+            if not lines:
                 # Send a ping to keep connection alive
                 yield ": ping\n\n"
-                
+
     return Response(event_stream(), mimetype="text/event-stream")
 
 if __name__ == "__main__":
@@ -1,8 +1,80 @@
 import os
-from dataclasses import dataclass
-from dotenv import load_dotenv
-from google.cloud import secretmanager
-import google.auth
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Tuple
+
+from core.client_pool import secret_manager_client
+
+# Segundos que un secreto se sirve desde caché; pasado REFRESH_RATIO del TTL se refresca en segundo plano
+SECRET_CACHE_TTL = float(os.getenv("SECRET_CACHE_TTL", "3600"))
+SECRET_REFRESH_RATIO = float(os.getenv("SECRET_REFRESH_RATIO", "0.8"))
+
+_PLACEHOLDERS = ("GEMINI API KEY", "GEMINI_API_KEY")
+
+
+class SecretCache:
+    """
+    Caché en memoria de secretos con TTL.
+
+    - El primer acceso a un secreto lo descarga (miss); los siguientes se sirven de memoria (hit).
+    - Pasado `refresh_ratio` del TTL se sigue sirviendo el valor en caché y se refresca en un
+      hilo en segundo plano, así ninguna petición espera a Secret Manager en el caso normal.
+    - Si el secreto ha expirado del todo se descarga de forma síncrona.
+    - Los valores vacíos (error al descargar) no se cachean; un refresco fallido conserva el anterior.
+    """
+
+    def __init__(self, fetcher: Callable[[str], str], ttl: float = SECRET_CACHE_TTL, refresh_ratio: float = SECRET_REFRESH_RATIO):
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.refresh_ratio = refresh_ratio
+        self._entries: Dict[str, Tuple[str, float]] = {}  # secret_id -> (valor, instante de descarga)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0, "errors": 0}
+
+    def get(self, secret_id: str) -> str:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(secret_id)
+            if entry and now - entry[1] < self.ttl:
+                self.stats["hits"] += 1
+                if now - entry[1] >= self.ttl * self.refresh_ratio and secret_id not in self._refreshing:
+                    self._refreshing.add(secret_id)
+                    threading.Thread(target=self._refresh, args=(secret_id,), daemon=True).start()
+                return entry[0]
+            self.stats["misses"] += 1
+        return self._load(secret_id)
+
+    def _load(self, secret_id: str) -> str:
+        value = self.fetcher(secret_id)
+        with self._lock:
+            if value:
+                self._entries[secret_id] = (value, time.monotonic())
+            else:
+                self.stats["errors"] += 1
+        return value
+
+    def _refresh(self, secret_id: str):
+        try:
+            self._load(secret_id)
+            with self._lock:
+                self.stats["refreshes"] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(secret_id)
+
+    def invalidate(self, secret_id: Optional[str] = None):
+        with self._lock:
+            if secret_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(secret_id, None)
+
+
+def _env(name: str, default: Optional[str] = None, **kwargs):
+    # Los valores se leen al instanciar Config (tras cargar config/.env), no al importar el módulo
+    return field(default_factory=lambda: os.getenv(name, default), **kwargs)
 
 
 @dataclass
@@ -11,53 +83,39 @@ class Config:
     Centralized configuration class for the **Business Glossary Agent**.
     It loads environment variables and sets defaults.
     """
-    # Load Global Vars
-    load_dotenv(f"{os.getcwd()}/config/.env")
-
     # --- GCP Config ---
-    PROJECT_ID: str = os.getenv("PROJECT_ID")
-    LOCATION: str = os.getenv("LOCATION")
-    GCS_BUCKET: str = os.getenv("GCS_BUCKET")
+    PROJECT_ID: str = _env("PROJECT_ID")
+    LOCATION: str = _env("LOCATION")
+    GCS_BUCKET: str = _env("GCS_BUCKET")
     # Dataplex specific for Glossary
-    GLOSSARY_ID: str = os.getenv("GLOSSARY_ID", "my-business-glossary")
-    GLOSSARY_LOCATION: str = os.getenv("GLOSSARY_LOCATION", os.getenv("LOCATION"))
+    GLOSSARY_ID: str = _env("GLOSSARY_ID", "my-business-glossary")
+    GLOSSARY_LOCATION: str = field(default_factory=lambda: os.getenv("GLOSSARY_LOCATION", os.getenv("LOCATION")))
     
-    DATASET_ID: str = os.getenv("DATASET_ID") # Optional, if needed for context
-    TABLE_ID: str = os.getenv("TABLE_ID") # Optional, if needed for context
+    DATASET_ID: str = _env("DATASET_ID") # Optional, if needed for context
+    TABLE_ID: str = _env("TABLE_ID") # Optional, if needed for context
     
-    GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY")
+    # Valor de entorno; si falta o es un placeholder, GEMINI_API_KEY se resuelve desde Secret Manager al usarse
+    _gemini_api_key_env: Optional[str] = _env("GEMINI_API_KEY", repr=False)
     # TODO revisar modelo más adecuado
     MODEL_NAME: str = "gemini-2.5-flash-lite"
 
     # --- GitHub Config ---
-    GITHUB_REPO: str = os.getenv("GITHUB_REPO", "")  # Ej: "usuario/repo"
-    GITHUB_BASE_BRANCH: str = os.getenv("GITHUB_BASE_BRANCH", "main")
-    GITHUB_SECRET_NAME: str = os.getenv("GITHUB_SECRET_NAME", "github-token")
-    GEMINI_SECRET_NAME: str = os.getenv("GEMINI_SECRET_NAME", "gemini-api-key")
+    GITHUB_REPO: str = _env("GITHUB_REPO", "")  # Ej: "usuario/repo"
+    GITHUB_BASE_BRANCH: str = _env("GITHUB_BASE_BRANCH", "main")
+    GITHUB_SECRET_NAME: str = _env("GITHUB_SECRET_NAME", "github-token")
+    GEMINI_SECRET_NAME: str = _env("GEMINI_SECRET_NAME", "gemini-api-key")
     
     # --- Flask Config ---
-    PORT: int = int(os.environ.get("PORT", "8080"))
+    PORT: int = field(default_factory=lambda: int(os.environ.get("PORT", "8080")))
 
     def __post_init__(self):
-        # 1. Intentar resolver GEMINI_API_KEY si es placeholder o None
-        # Comprobamos variantes comunes de placeholder
-        is_placeholder = (
-            not self.GEMINI_API_KEY 
-            or self.GEMINI_API_KEY.strip() == "GEMINI API KEY" 
-            or self.GEMINI_API_KEY.strip() == "GEMINI_API_KEY"
-        )
-        
-        if is_placeholder:
-            secret_value = self._fetch_secret(self.GEMINI_SECRET_NAME)
-            if secret_value:
-                self.GEMINI_API_KEY = secret_value
-            else:
-                print("❌ No se pudo recuperar GEMINI_API_KEY del Secret Manager.")
+        # Los secretos se descargan bajo demanda (no al importar) y se cachean con TTL
+        self._secrets = SecretCache(self._fetch_secret)
 
-        # Validation of global variables
+        # Validation of global variables (los campos privados son opcionales)
         missing_fields = [
             field_name for field_name, value in vars(self).items()
-            if value is None
+            if value is None and not field_name.startswith("_")
         ]
 
         if missing_fields:
@@ -67,15 +125,29 @@ class Config:
             )
 
 
+    @property
+    def GEMINI_API_KEY(self) -> str:
+        env_value = (self._gemini_api_key_env or "").strip()
+        if env_value and env_value not in _PLACEHOLDERS:
+            return env_value
+        secret_value = self._secrets.get(self.GEMINI_SECRET_NAME)
+        if not secret_value:
+            print("❌ No se pudo recuperar GEMINI_API_KEY del Secret Manager.")
+        return secret_value
+
     @property
     def GITHUB_TOKEN(self) -> str:
-        return self._fetch_secret(self.GITHUB_SECRET_NAME)
+        return self._secrets.get(self.GITHUB_SECRET_NAME)
+
+    def secret_cache_stats(self) -> dict:
+        """Aciertos, fallos, refrescos y errores de la caché de secretos."""
+        return dict(self._secrets.stats)
 
 
     def _fetch_secret(self, secret_id: str, version_id: str = "latest") -> str:
         try:
-            # Crea el cliente de Secret Manager
-            client = secretmanager.SecretManagerServiceClient()
+            # Cliente de Secret Manager compartido (se crea una sola vez por proceso)
+            client = secret_manager_client()
 
             # Construye el nombre del recurso
             name = f"projects/{self.PROJECT_ID}/secrets/{secret_id}/versions/{version_id}"
@@ -89,4 +161,50 @@ class Config:
             print(f"Error recuperando secreto {secret_id}: {e}")
             return ""
 
-config = Config()
\ No newline at end of file
+
+def load_env(path: Optional[str] = None):
+    """Carga config/.env en el entorno; sin fichero (p.ej. Cloud Run) ni siquiera importa dotenv."""
+    path = path or f"{os.getcwd()}/config/.env"
+    if os.path.exists(path):
+        from dotenv import load_dotenv
+        load_dotenv(path)
+
+
+def load_config() -> Config:
+    """Carga config/.env y construye la configuración (validando los campos obligatorios)."""
+    # Load Global Vars
+    load_env()
+    return Config()
+
+
+class _LazyConfig:
+    """
+    Proxy de `config`: la configuración se construye en el primer acceso a un atributo,
+    no al importar el módulo, así importar `config.settings` no lee ficheros ni valida nada.
+    """
+
+    def __init__(self):
+        self._config: Optional[Config] = None
+        self._lock = threading.Lock()
+
+    def _get(self) -> Config:
+        if self._config is None:
+            with self._lock:
+                if self._config is None:
+                    self._config = load_config()
+        return self._config
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def __setattr__(self, name, value):
+        if name in ("_config", "_lock"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._get(), name, value)
+
+    def __repr__(self):
+        return repr(self._get())
+
+
+config = _LazyConfig()
\ No newline at end of file
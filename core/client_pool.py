@@ -0,0 +1,92 @@
+import atexit
+import threading
+from typing import Callable, Dict, Hashable, Optional
+
+
+class ClientPool:
+    """
+    Thread-safe registry of Google Cloud / Gemini clients.
+
+    Each client is created lazily on first use and then shared by every caller (and every
+    Flask worker thread) in the process, so its gRPC channel / HTTP session, TLS handshake and
+    credentials are reused instead of being set up again for each object that needs a client.
+    """
+
+    def __init__(self):
+        self._clients: Dict[Hashable, object] = {}
+        self._locks: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, factory: Callable[[], object]):
+        """
+        Returns the client registered under `key`, creating it with `factory()` the first time.
+        Creation happens under a per-key lock: concurrent callers wait for one client instead
+        of each building their own, and unrelated clients are not serialized behind it.
+        """
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = factory()
+                self._clients[key] = client
+            return client
+
+    def close_all(self):
+        """Closes every client (channels, sessions) and empties the registry."""
+        with self._lock:
+            clients, self._clients = list(self._clients.items()), {}
+        for key, client in clients:
+            try:
+                _close(client)
+            except Exception as e:
+                print(f"⚠️ Error closing client {key}: {e}")
+
+
+def _close(client):
+    # bigquery/storage/genai clients expose close(); GAPIC clients close their transport
+    if hasattr(client, "close"):
+        client.close()
+    elif hasattr(client, "transport") and hasattr(client.transport, "close"):
+        client.transport.close()
+
+
+pool = ClientPool()
+atexit.register(pool.close_all)
+
+
+def bigquery_client(project_id: str, location: Optional[str] = None):
+    from google.cloud import bigquery
+    return pool.get(("bigquery", project_id, location), lambda: bigquery.Client(project=project_id, location=location))
+
+
+def bigquery_write_client():
+    from google.cloud import bigquery_storage_v1
+    return pool.get(("bigquery_write",), bigquery_storage_v1.BigQueryWriteClient)
+
+
+def storage_client(project_id: Optional[str] = None):
+    from google.cloud import storage
+    return pool.get(("storage", project_id), lambda: storage.Client(project=project_id))
+
+
+def secret_manager_client():
+    from google.cloud import secretmanager
+    return pool.get(("secretmanager",), secretmanager.SecretManagerServiceClient)
+
+
+def dataplex_glossary_client():
+    from google.cloud import dataplex_v1
+    return pool.get(("dataplex_glossary",), dataplex_v1.BusinessGlossaryServiceClient)
+
+
+def genai_client(project_id: str, location: str):
+    from google import genai
+    return pool.get(("genai", project_id, location), lambda: genai.Client(vertexai=True, project=project_id, location=location))
+
+
+def close_all():
+    pool.close_all()
@@ -1,6 +1,6 @@
-from google import genai
 from google.genai import types
 from config.settings import config
+from core.client_pool import genai_client
 from typing import Optional
 
 class VertexAIClient:
@@ -13,11 +13,7 @@ class VertexAIClient:
         Initializes the connection with Vertex AI.
         """
         # Initialization for Vertex AI (vertexai=True)
-        self.client = genai.Client(
-            vertexai=True,
-            project=config.PROJECT_ID,
-            location=config.LOCATION
-        )
+        self.client = genai_client(config.PROJECT_ID, config.LOCATION)
         self.model_name = config.MODEL_NAME
 
     def analyze_pdf_content(self, gcs_uri: str, prompt_text: str) -> Optional[str]:
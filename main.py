@@ -1,89 +1,194 @@
+import json
 import os
-from google.cloud import bigquery
 
-from core.github_client import GitHubClient
+from config.settings import load_env
+
+# config/.env antes que los módulos, que leen sus constantes GLOSSARY_* del entorno al importarse
+load_env()
+
+# Solo módulos ligeros al importar: los SDK (BigQuery, GitHub, genai, numpy...) se importan
+# dentro de main() al usarse, para no penalizar el arranque en frío de la app y del CLI
+# (ver scripts/profile_imports.py)
+from modules.context_serializer import CONTEXT_FORMAT
+from modules.incremental_glossary import IncrementalGlossaryState, attribute_terms_to_documents, generate_incremental_glossary, splice_document_glossary
+from modules.token_budget import BUDGET_POLICY, MAX_CONTEXT_TOKENS, TOKEN_COUNTER, TokenBudget, TokenCounter
 
 # --- CONFIGURACIÓN TÉCNICA ---
 PROJECT_ID = "pg-gccoe-carlos-monteverde" 
 LOCATION = "us" 
 TARGET_DATASET = "pharmaceutical_drugs"
+BQ_MAX_WORKERS = int(os.getenv("BQ_MAX_WORKERS", "8"))
 # DATA_STORE_ID ya no es necesario para este enfoque
 
-def get_context_from_bigquery(project_id: str, location: str, dataset_id: str) -> str:
+def get_context_from_bigquery(project_id: str, location: str, dataset_id: str, max_workers: int = BQ_MAX_WORKERS, use_information_schema: bool = False, use_cache: bool = True, context_format: str = CONTEXT_FORMAT) -> str:
     """
     Recupera el contexto de los metadatos de las tablas en BigQuery de un dataset específico.
+    Las tablas se leen en paralelo (`max_workers`) o con una única consulta a INFORMATION_SCHEMA.
+    Con `use_cache`, solo se releen las tablas modificadas desde la última ejecución (output/.cache).
+    `context_format` selecciona el serializador ("text", "tsv" o "json").
     """
-    client = bigquery.Client(project=project_id, location=location)
-    context = ""
-    
-    try:
-        print(f"DEBUG: Listando tablas en el dataset '{dataset_id}'...")
-        # Construir referencia completa del dataset
-        dataset_ref = f"{project_id}.{dataset_id}"
-        
-        try:
-            # Verificar si existe el dataset y listar tablas directo
-            tables = list(client.list_tables(dataset_id))
-        except Exception as e:
-            print(f"⚠️ Error accediendo al dataset {dataset_id}: {e}")
-            return ""
+    reader = _build_bigquery_reader(project_id, location, max_workers, use_information_schema, use_cache)
+    return reader.get_context_from_dataset(dataset_id, context_format)
 
-        if not tables:
-             print(f"⚠️ No se encontraron tablas en {dataset_id}.")
-             return ""
+def _build_bigquery_reader(project_id: str, location: str, max_workers: int, use_information_schema: bool, use_cache: bool):
+    from modules.bigquery_reader import BigQueryMetadataReader
+    from modules.metadata_cache import MetadataSnapshotCache
 
-        context += f"\nDataset: {dataset_id}\n"
-        
-        for table in tables:
-            # Obtener detalles completos de la tabla para ver descripción y esquema
-            full_table = client.get_table(table)
-            
-            context += f"  Table: {full_table.table_id}\n"
-            if full_table.description:
-                context += f"    Description: {full_table.description}\n"
-            
-            context += "    Columns:\n"
-            for schema_field in full_table.schema:
-                desc_str = f" - Description: {schema_field.description}" if schema_field.description else ""
-                context += f"      - {schema_field.name} ({schema_field.field_type}){desc_str}\n"
-
-    except Exception as e:
-        print(f"⚠️ Error recuperando metadatos de BigQuery: {e}")
-        return ""
-
-    return context.strip()
-
-def main(project_id=PROJECT_ID, location=LOCATION, target_dataset=TARGET_DATASET, glossary_id="business-glossary-v1", glossary_display_name="Business Glossary", data_source="bigquery", drive_folder_id="", publish_mode="pull_request"):
-    print("🚀 Lanzando Agente de Glosario (Vertex AI + Contexto Dinámico)")
+    return BigQueryMetadataReader(
+        project_id,
+        location,
+        max_workers=max_workers,
+        use_information_schema=use_information_schema,
+        cache=MetadataSnapshotCache() if use_cache else None
+    )
 
-    # Inicialización
-    # vertexai.init no longer needed for google-genai client logic inside classes
-    github_client = GitHubClient()
+def main(project_id=PROJECT_ID, location=LOCATION, target_dataset=TARGET_DATASET, glossary_id="business-glossary-v1", glossary_display_name="Business Glossary", data_source="bigquery", drive_folder_id="", publish_mode="pull_request", bq_max_workers=BQ_MAX_WORKERS, bq_use_information_schema=False, use_metadata_cache=True, use_llm_cache=True, incremental=False, stream=False, context_token_budget=None, max_context_tokens=MAX_CONTEXT_TOKENS, budget_policy=BUDGET_POLICY, context_format=CONTEXT_FORMAT):
+    print("🚀 Lanzando Agente de Glosario (Vertex AI + Contexto Dinámico)")
 
     # PASO 1: Búsqueda de contexto
+    bq_reader = None
+    drive_reader = None
     if data_source == "google_drive" and drive_folder_id:
         print(f"🔍 Recuperando PDFs desde Google Drive (Carpeta ID: '{drive_folder_id}')...")
         from modules.drive_pdf_reader import DrivePDFReader
-        reader = DrivePDFReader()
-        contexto_metadatos = reader.get_context_from_drive_folder(drive_folder_id)
+        drive_reader = DrivePDFReader()
+        contexto_metadatos = drive_reader.get_context_from_drive_folder(drive_folder_id, incremental=incremental)
     else:
         print(f"🔍 Recuperando metadatos de BigQuery para dataset '{target_dataset}'...")
-        contexto_metadatos = get_context_from_bigquery(project_id, location, target_dataset)
+        bq_reader = _build_bigquery_reader(project_id, location, bq_max_workers, bq_use_information_schema, use_metadata_cache)
+        contexto_metadatos = bq_reader.get_context_from_dataset(target_dataset, context_format)
 
-    if not contexto_metadatos:
+    # Contexto original de Drive (antes de selección/recorte) para atribuir términos a cada PDF
+    drive_context = contexto_metadatos if drive_reader else ""
+    drive_removed_only = False
+    if not contexto_metadatos and incremental and drive_reader and drive_reader.last_changes:
+        removed_pdfs = drive_reader.last_changes["removed"]
+        if removed_pdfs and drive_reader.sync_state.proposal_file:
+            # Nada que generar, pero los términos de los PDFs eliminados deben salir de la propuesta
+            print(f"🗑️ {len(removed_pdfs)} PDF(s) eliminado(s) de Drive; se retiran sus términos de la propuesta anterior.")
+            drive_removed_only = True
+        else:
+            # Confirma los PDFs eliminados (si los hay) aunque no haya que regenerar nada
+            drive_reader.sync_state.commit()
+            print("✅ No hay PDFs nuevos o modificados en Drive; no es necesario regenerar el glosario.")
+            return
+
+    if not contexto_metadatos and not drive_removed_only:
         print("❌ No se pudo recuperar ningún contexto de metadatos de BigQuery.")
         print("💡 Verifica permisos o que existan datasets/tablas en la ubicación configurada.")
         return
 
-    print(f"✅ Contexto recuperado ({len(contexto_metadatos)} caracteres).")
+    glossary_gen = None
+    glossary_state = None
+    generation_stats = {}
+    if drive_removed_only:
+        # Glosario parcial vacío: solo se podan los términos de los PDFs eliminados
+        clean_json = json.dumps({"glossary": {"categories": []}})
+    else:
+        print(f"✅ Contexto recuperado ({len(contexto_metadatos)} caracteres).")
+
+        # PASO 1.1: Selección por relevancia si el contexto supera el presupuesto de tokens
+        # (context_token_budget=None: GLOSSARY_CONTEXT_TOKEN_BUDGET). Es el presupuesto objetivo;
+        # max_context_tokens (PASO 1.2) es el límite duro, así que la selección nunca apunta por encima
+        from modules.context_selector import CONTEXT_TOKEN_BUDGET, ContextSelector
+        if context_token_budget is None:
+            context_token_budget = CONTEXT_TOKEN_BUDGET
+        if context_token_budget and max_context_tokens:
+            context_token_budget = min(context_token_budget, max_context_tokens)
+        contexto_metadatos = ContextSelector(token_budget=context_token_budget).select(contexto_metadatos)
 
-    # PASO 2: Generar glosario Estructurado
-    from modules.business_glossary import BusinessGlossaryGenerator
+        # PASO 2: Generar glosario Estructurado
+        from modules.business_glossary import BusinessGlossaryGenerator
     
-    glossary_gen = BusinessGlossaryGenerator(model_name="gemini-2.5-flash")
-    clean_json = glossary_gen.suggest_glossary_structure(contexto_metadatos)
+        # Los PDFs de Drive siempre son texto libre; el formato compacto solo aplica a BigQuery
+        # Modelo base: config.MODEL_NAME; el router escala a modelos mayores solo si hace falta
+        glossary_gen = BusinessGlossaryGenerator(
+            use_cache=use_llm_cache,
+            context_format=context_format if bq_reader else "text"
+        )
+
+        # PASO 1.2: Presupuesto de tokens y desglose por tabla/documento del prompt realmente enviado
+        token_budget = TokenBudget(
+            TokenCounter(glossary_gen.client, glossary_gen.model_name, use_sdk=TOKEN_COUNTER == "sdk"),
+            max_tokens=max_context_tokens,
+            policy=budget_policy,
+            context_format=glossary_gen.context_format
+        )
+
+        def budget_report(sent_context: str) -> dict:
+            stats = token_budget.report(
+                sent_context,
+                prompt_tokens=glossary_gen.count_prompt_tokens(sent_context, token_budget.counter),
+                model_name=glossary_gen.model_name
+            )
+            TokenBudget.print_report(stats)
+            return stats
+
+        clean_json = None
+        glossary_state = IncrementalGlossaryState(target_dataset) if bq_reader and bq_reader.tables else None
+        if incremental and glossary_state:
+            # El modo incremental envía solo las tablas nuevas/modificadas: el informe es sobre ese contexto
+            clean_json = generate_incremental_glossary(glossary_gen, glossary_state, target_dataset, bq_reader.tables, token_budget=token_budget)
+            if clean_json:
+                if glossary_state.last_context is not None:
+                    generation_stats = budget_report(glossary_state.last_context)
+                else:
+                    generation_stats = {"prompt_tokens": 0, "note": "no aplica: no se llamó al modelo (propuesta reutilizada o solo tablas eliminadas)"}
+                generation_stats["mode"] = "incremental"
+        if not clean_json:
+            contexto_metadatos = token_budget.enforce(contexto_metadatos)
+            generation_stats = budget_report(contexto_metadatos)
+        if not clean_json and stream:
+            # Cada término/categoría se muestra (y llega al SSE de la UI) en cuanto se completa
+            for kind, item in glossary_gen.stream_glossary_structure(contexto_metadatos):
+                if kind == "term":
+                    print(f"📄 Término: {item.get('term')} ({item.get('parent_category', '')})")
+                elif kind == "category":
+                    print(f"📁 Categoría completada: {item.get('display_name')} ({len(item.get('terms', []))} términos)")
+                else:
+                    clean_json = item
+        elif not clean_json:
+            clean_json = glossary_gen.suggest_glossary_structure(contexto_metadatos)
+
+    drive_provenance = None
+    if clean_json and drive_reader:
+        # Procedencia (qué PDF originó cada término) para poder podar en la próxima ejecución incremental
+        partial_glossary = json.loads(clean_json)
+        drive_provenance = attribute_terms_to_documents(partial_glossary, drive_context, drive_reader.last_documents)
+
+        if incremental and drive_reader.sync_state.proposal_file:
+            # Solo se enviaron los PDFs nuevos/modificados: se inserta en la propuesta anterior
+            try:
+                with open(drive_reader.sync_state.proposal_file, "r", encoding="utf-8") as f:
+                    previous_glossary = json.load(f)
+                changes = drive_reader.last_changes
+                stale_documents = [item["id"] for item in changes["changed"] + changes["removed"]]
+                merged, drive_provenance, removed = splice_document_glossary(
+                    previous_glossary, partial_glossary, drive_reader.sync_state.provenance, drive_provenance, stale_documents
+                )
+                clean_json = json.dumps(merged, ensure_ascii=False, indent=2)
+                print(f"✂️ {removed} término(s) retirados por pertenecer a PDFs modificados o eliminados.")
+                print(f"🔗 Propuesta fusionada con {drive_reader.sync_state.proposal_file}.")
+            except Exception as merge_e:
+                # Sin fusión no se confirma el estado: la próxima ejecución vuelve a procesar estos PDFs
+                print(f"⚠️ No se pudo fusionar con la propuesta anterior: {merge_e}")
+                clean_json = None
     
+    if glossary_gen:
+        glossary_gen.router.print_summary()
+
     if clean_json:
+        try:
+            glossary_output = json.loads(clean_json)
+            if glossary_gen:
+                generation_stats["model"] = glossary_gen.model_name
+                generation_stats["model_usage"] = glossary_gen.usage
+                generation_stats["model_metrics"] = glossary_gen.router.summary()
+            glossary_output["generation_stats"] = generation_stats
+            clean_json = json.dumps(glossary_output, ensure_ascii=False, indent=2)
+        except (ValueError, TypeError, AttributeError) as stats_e:
+            print(f"⚠️ No se pudieron añadir las estadísticas de generación: {stats_e}")
+
         print("\nSugerencia generada (Estructura Dataplex):")
         print(clean_json)
 
@@ -100,10 +205,24 @@ def main(project_id=PROJECT_ID, location=LOCATION, target_dataset=TARGET_DATASET
         
         print(f"\n✅ Propuesta guardada localmente en: {local_filename}")
 
+        if glossary_state:
+            # Punto de partida de la próxima ejecución incremental
+            try:
+                # Las tablas recortadas por el presupuesto no quedan cubiertas: no se avanza su versión
+                glossary_state.save(local_filename, json.loads(clean_json), bq_reader.tables, incomplete_tables=token_budget.truncated_sources)
+            except Exception as state_e:
+                print(f"⚠️ No se pudo guardar el estado incremental: {state_e}")
+
+        if drive_reader and drive_reader.sync_state:
+            drive_reader.sync_state.commit(proposal_file=local_filename, provenance=drive_provenance)
+
         # --- STEP 3: CREATE PULL REQUEST ---
         if publish_mode == "pull_request":
             print("\n🚀 Generando Pull Request con la propuesta...")
             try:
+                # El token de GitHub solo se resuelve (Secret Manager) cuando hay que abrir el PR
+                from core.github_client import GitHubClient
+                github_client = GitHubClient()
                 if github_client.repo:
                     pr_url = github_client.create_proposal_pr(clean_json, "business_glossary")
                     print(f"✅ Pull Request creado exitosamente: {pr_url}")
@@ -116,84 +235,65 @@ def main(project_id=PROJECT_ID, location=LOCATION, target_dataset=TARGET_DATASET
         # --- STEP 4: PUBLISH TO DATAPLEX ---
         elif publish_mode == "direct_dataplex":
             print("\n🚀 Iniciando publicación directa a Dataplex (SALTANDO PULL REQUEST)...")
+            from modules.audit_logger import PublishEventLog, get_audit_logger
+            # Logger compartido (y con buffer) para el evento de éxito y el de fallo
+            audit = get_audit_logger(project_id, "openFormatHealthcare")
+            actor = os.getenv("GITHUB_ACTOR", "ai_agent")
             try:
                 # 1. Init Client
                 from modules.dataplex_client import DataplexGlossaryClient
-                import json
-                import unicodedata
-                import re
+                from modules.glossary_publisher import GlossaryReconciler, build_desired_state
                 
                 dp_client = DataplexGlossaryClient(project_id, location)
                 
                 # 2. Parse JSON
                 glossary_data = json.loads(clean_json) # clean_json is a string
-                root = glossary_data.get("glossary", {})
-                categories = root.get("categories", [])
-                
-                # 2.5 Delete existing glossary (if any) to start fresh
-                print(f"🧹 Borrando glosario existente para carga desde cero: {glossary_id}...")
-                dp_client.delete_glossary(glossary_id)
                 
-                # 3. Create Root Glossary
+                # 3. Create Root Glossary (if missing)
                 dp_client.create_or_update_glossary(glossary_id, glossary_display_name, "Corporate Glossary generated by AI Agent")
                 
-                # 4. Iterate Categories
-                term_count = 0
-                for cat in categories:
-                    # Sanitize ID
-                    cat_original_id = cat.get("id")
-                    # Simple sanitation (can be improved)
-                    safe_cat_id = re.sub(r'[^a-zA-Z0-9-]', '', cat_original_id.lower().replace("_", "-").replace(" ", "-"))
-                    
-                    dp_client.create_category(
-                        glossary_id,
-                        safe_cat_id,
-                        cat.get("display_name", cat_original_id),
-                        cat.get("description", ""),
-                        labels=cat.get("labels")
-                    )
-                    
-                    # 5. Create Terms inside this Category
-                    cat_terms = cat.get("terms", [])
-                    for term in cat_terms:
-                        term_name = term.get("term", "Unnamed")
-                        safe_term_id = re.sub(r'[^a-zA-Z0-9-]', '', term_name.lower().replace("_", "-").replace(" ", "-"))[:60]
-                        
-                        dp_client.create_term(
-                            glossary_id,
-                            safe_term_id,
-                            term_name,
-                            term.get("definition", ""),
-                            parent_category_id=safe_cat_id,
-                            labels=term.get("labels")
-                        )
-                        term_count += 1
-                
-                print("✅ Publicación en Dataplex completada.")
+                # 4. Reconcile categories and terms: only the differences are applied
+                reconciler = GlossaryReconciler(dp_client, glossary_id)
+                publish_summary = reconciler.sync(glossary_data)
+                term_count = len(build_desired_state(glossary_data)[1])
+
+                # run_parallel no propaga los errores por elemento: hay que mirar el resumen
+                failed_results = [r for r in reconciler.results if r.outcome != "SUCCESS"]
+                if publish_summary.get("failed"):
+                    publish_status = "PARTIALLY_PUBLISHED"
+                    print(f"⚠️ Publicación en Dataplex incompleta: {publish_summary['failed']} operación(es) fallida(s):")
+                    for r in failed_results:
+                        print(f"   ❌ {r.operation} {r.item_id}: {r.error}")
+                else:
+                    publish_status = "APPROVED_AND_PUBLISHED"
+                    print("✅ Publicación en Dataplex completada.")
                 
                 # --- STEP 5: AUDIT LOG ---
                 try:
                     print("📝 Registrando evento de publicación en Audit Log de BigQuery...")
-                    from modules.audit_logger import AuditLogger
-                    audit = AuditLogger(project_id, "openFormatHealthcare")
+                    # Una fila por operación de categoría/término (job de carga, no streaming)
+                    publish_run_id = PublishEventLog(project_id, "openFormatHealthcare").log_results(
+                        reconciler.results, glossary_id=glossary_id, actor=actor, resource_name=reconciler.resource_name
+                    )
+                    details = {"file": local_filename, "terms_count": term_count, "publish_run_id": publish_run_id, **publish_summary}
+                    if failed_results:
+                        details["failed_items"] = [f"{r.operation} {r.item_id}" for r in failed_results]
                     audit.log_event(
-                        status="APPROVED_AND_PUBLISHED", 
-                        actor=os.getenv("GITHUB_ACTOR", "ai_agent"), 
+                        status=publish_status, 
+                        actor=actor, 
                         glossary_id=glossary_id, 
-                        details={"file": local_filename, "terms_count": term_count}
+                        details=details
                     )
-                    print("✅ Evento registrado en BigQuery exitosamente.")
+                    print("✅ Evento encolado; se escribirá en BigQuery en segundo plano.")
                 except Exception as audit_e:
                     print(f"⚠️ No se pudo registrar en Audit Log: {audit_e}")
 
             except Exception as e:
                 print(f"❌ Error publicando en Dataplex: {e}")
                 try:
-                    from modules.audit_logger import AuditLogger
-                    audit = AuditLogger(project_id, "openFormatHealthcare")
                     audit.log_event(
                         status="FAILED", 
-                        actor=os.getenv("GITHUB_ACTOR", "ai_agent"), 
+                        actor=actor, 
                         glossary_id=glossary_id, 
                         details={"error": str(e)}
                     )
@@ -1,40 +1,381 @@
 from google.cloud import bigquery
-from datetime import datetime
+from datetime import datetime, timezone
+import atexit
+import glob
 import json
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from core.client_pool import bigquery_client, bigquery_write_client
+
+# Flush when this many events are buffered or after this many seconds, whichever comes first
+AUDIT_FLUSH_SIZE = int(os.getenv("AUDIT_FLUSH_SIZE", "500"))
+AUDIT_FLUSH_SECONDS = float(os.getenv("AUDIT_FLUSH_SECONDS", "5"))
+# Use the BigQuery Storage Write API (default stream) instead of streaming inserts
+AUDIT_USE_WRITE_API = os.getenv("AUDIT_USE_WRITE_API", "false").lower() in ("1", "true", "yes")
+# Rows that could not be written to BigQuery are kept here and replayed on the next successful flush
+AUDIT_FALLBACK_PATH = os.getenv("AUDIT_FALLBACK_PATH", os.path.join("output", ".cache", "audit_fallback.jsonl"))
+# Per-operation publish events: table and local NDJSON spool used for the load jobs
+PUBLISH_EVENTS_TABLE = os.getenv("AUDIT_PUBLISH_EVENTS_TABLE", "glossary_publish_events")
+PUBLISH_EVENTS_SPOOL_DIR = os.getenv("AUDIT_PUBLISH_EVENTS_SPOOL_DIR", os.path.join("output", ".cache", "publish_events"))
+# Seconds after which a spool file claimed by a load that never finished is returned to the spool
+PUBLISH_EVENTS_CLAIM_TTL = int(os.getenv("AUDIT_PUBLISH_EVENTS_CLAIM_TTL", "3600"))
+
+AUDIT_SCHEMA = [
+    ("timestamp", "TIMESTAMP", "REQUIRED"),
+    ("actor", "STRING", "NULLABLE"),
+    ("status", "STRING", "REQUIRED"),
+    ("glossary_id", "STRING", "NULLABLE"),
+    ("details", "STRING", "NULLABLE"),  # JSON string
+]
+
+PUBLISH_EVENT_SCHEMA = [
+    ("timestamp", "TIMESTAMP", "REQUIRED"),
+    ("run_id", "STRING", "REQUIRED"),
+    ("actor", "STRING", "NULLABLE"),
+    ("glossary_id", "STRING", "NULLABLE"),
+    ("operation", "STRING", "REQUIRED"),  # CREATE_TERM, UPDATE_CATEGORY, ...
+    ("resource_name", "STRING", "REQUIRED"),
+    ("outcome", "STRING", "REQUIRED"),  # SUCCESS | FAILED
+    ("attempts", "INT64", "NULLABLE"),
+    ("latency_ms", "FLOAT64", "NULLABLE"),
+    ("error", "STRING", "NULLABLE"),
+]
+
 
 class AuditLogger:
-    def __init__(self, project_id: str, dataset_id: str, table_id: str = "glossary_audit_log"):
-        self.client = bigquery.Client(project=project_id)
+    def __init__(
+        self,
+        project_id: str,
+        dataset_id: str,
+        table_id: str = "glossary_audit_log",
+        flush_size: int = AUDIT_FLUSH_SIZE,
+        flush_interval: float = AUDIT_FLUSH_SECONDS,
+        use_write_api: bool = AUDIT_USE_WRITE_API,
+        fallback_path: str = AUDIT_FALLBACK_PATH,
+    ):
+        """
+        Buffered audit sink. `log_event` only queues the row; a background thread writes
+        batches to BigQuery when `flush_size` rows are pending or every `flush_interval` seconds,
+        and once more at interpreter exit. The BigQuery client and table check are created
+        lazily on the first flush, so instantiating the logger is free.
+        If BigQuery is unreachable, rows go to a local JSONL file (`fallback_path`).
+        """
+        self.project_id = project_id
         self.table_ref = f"{project_id}.{dataset_id}.{table_id}"
-        self._ensure_table_exists()
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.use_write_api = use_write_api
+        self.fallback_path = fallback_path
+        self._client: Optional[bigquery.Client] = None
+        self._buffer: List[Dict] = []
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._write_api = None
+        atexit.register(self.close)
+
+    @property
+    def client(self) -> bigquery.Client:
+        if self._client is None:
+            self._client = bigquery_client(self.project_id)
+            self._ensure_table_exists()
+        return self._client
 
     def _ensure_table_exists(self):
-        schema = [
-            bigquery.SchemaField("timestamp", "TIMESTAMP", mode="REQUIRED"),
-            bigquery.SchemaField("actor", "STRING", mode="NULLABLE"),
-            bigquery.SchemaField("status", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("glossary_id", "STRING", mode="NULLABLE"),
-            bigquery.SchemaField("details", "STRING", mode="NULLABLE"), # JSON string
-        ]
+        schema = [bigquery.SchemaField(name, field_type, mode=mode) for name, field_type, mode in AUDIT_SCHEMA]
         try:
-            self.client.get_table(self.table_ref)
+            self._client.get_table(self.table_ref)
         except Exception:
             print(f"Creating audit table {self.table_ref}...")
             table = bigquery.Table(self.table_ref, schema=schema)
-            self.client.create_table(table)
+            self._client.create_table(table, exists_ok=True)
 
     def log_event(self, status: str, actor: str = "system", glossary_id: str = None, details: dict = None):
-        rows_to_insert = [
+        row = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "actor": actor,
+            "status": status,
+            "glossary_id": glossary_id,
+            "details": json.dumps(details) if details else None
+        }
+        with self._condition:
+            closed = self._closed
+            if not closed:
+                self._buffer.append(row)
+                self._start_thread()
+                if len(self._buffer) >= self.flush_size:
+                    self._condition.notify()
+        if closed:
+            # After close (e.g. during interpreter shutdown): write synchronously
+            self._write([row])
+
+    def _start_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="audit-flush", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._closed and len(self._buffer) < self.flush_size:
+                    self._condition.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self):
+        """Writes all buffered rows now (also called by the background thread)."""
+        with self._flush_lock:
+            with self._condition:
+                rows, self._buffer = self._buffer, []
+            if rows:
+                self._write(rows)
+
+    def close(self):
+        """Flushes pending rows and stops the background thread. Registered with atexit."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+        self.flush()
+
+    def _write(self, rows: List[Dict]):
+        try:
+            if self.use_write_api:
+                self._append_with_write_api(rows)
+            else:
+                errors = self.client.insert_rows_json(self.table_ref, rows)
+                if errors:
+                    raise RuntimeError(errors)
+            print(f"✅ {len(rows)} audit event(s) logged to BigQuery ({', '.join(sorted({r['status'] for r in rows}))}).")
+        except Exception as e:
+            print(f"❌ Error logging to BigQuery ({e}); saving {len(rows)} event(s) to {self.fallback_path}")
+            self._write_fallback(rows)
+            return
+        self._replay_fallback()
+
+    def _write_fallback(self, rows: List[Dict]):
+        os.makedirs(os.path.dirname(self.fallback_path) or ".", exist_ok=True)
+        with open(self.fallback_path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps({"table": self.table_ref, **row}, ensure_ascii=False) + "\n")
+
+    def _replay_fallback(self):
+        # BigQuery is reachable again: resend rows saved by earlier failed flushes for this table
+        if not os.path.exists(self.fallback_path):
+            return
+        replay_path = f"{self.fallback_path}.{os.getpid()}.replay"
+        try:
+            os.replace(self.fallback_path, replay_path)
+        except OSError:
+            return
+        with open(replay_path, "r", encoding="utf-8") as f:
+            saved = [json.loads(line) for line in f if line.strip()]
+        os.remove(replay_path)
+
+        mine = [{k: v for k, v in row.items() if k != "table"} for row in saved if row.get("table") == self.table_ref]
+        others = [row for row in saved if row.get("table") != self.table_ref]
+        if others:
+            with open(self.fallback_path, "a", encoding="utf-8") as f:
+                for row in others:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        if mine:
+            print(f"🔁 Replaying {len(mine)} audit event(s) from {self.fallback_path}...")
+            self._write(mine)
+
+    def _append_with_write_api(self, rows: List[Dict]):
+        # Optional dependency (google-cloud-bigquery-storage): imported only when enabled
+        from google.cloud.bigquery_storage_v1 import types as write_types
+
+        if self._write_api is None:
+            self.client  # Ensures the table exists
+            self._write_api = (bigquery_write_client(),) + _audit_row_proto()
+        write_client, descriptor_proto, row_class = self._write_api
+
+        project, dataset, table = self.table_ref.split(".")
+        stream_name = f"projects/{project}/datasets/{dataset}/tables/{table}/streams/_default"
+        proto_rows = write_types.ProtoRows()
+        for row in rows:
+            message = row_class(
+                timestamp=int(datetime.fromisoformat(row["timestamp"]).timestamp() * 1_000_000),
+                status=row["status"],
+            )
+            for field in ("actor", "glossary_id", "details"):
+                if row.get(field) is not None:
+                    setattr(message, field, row[field])
+            proto_rows.serialized_rows.append(message.SerializeToString())
+
+        request = write_types.AppendRowsRequest(
+            write_stream=stream_name,
+            proto_rows=write_types.AppendRowsRequest.ProtoData(
+                writer_schema=write_types.ProtoSchema(proto_descriptor=descriptor_proto),
+                rows=proto_rows,
+            ),
+        )
+        responses = write_client.append_rows(iter([request]), metadata=(("x-goog-request-params", f"write_stream={stream_name}"),))
+        for response in responses:
+            if response.error.code:
+                raise RuntimeError(response.error.message)
+            if response.row_errors:
+                raise RuntimeError([error.message for error in response.row_errors])
+
+
+def _audit_row_proto() -> Tuple[object, type]:
+    """Builds the protobuf message matching AUDIT_SCHEMA (TIMESTAMP as epoch microseconds)."""
+    from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+
+    descriptor_proto = descriptor_pb2.DescriptorProto(name="AuditRow")
+    for number, (name, field_type, _) in enumerate(AUDIT_SCHEMA, start=1):
+        descriptor_proto.field.add(
+            name=name,
+            number=number,
+            type=descriptor_pb2.FieldDescriptorProto.TYPE_INT64 if field_type == "TIMESTAMP" else descriptor_pb2.FieldDescriptorProto.TYPE_STRING,
+            label=descriptor_pb2.FieldDescriptorProto.LABEL_OPTIONAL,
+        )
+    file_proto = descriptor_pb2.FileDescriptorProto(name="glossary_audit_row.proto", package="glossary_audit", syntax="proto2")
+    file_proto.message_type.add().CopyFrom(descriptor_proto)
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(file_proto)
+    row_class = message_factory.GetMessageClass(pool.FindMessageTypeByName("glossary_audit.AuditRow"))
+    return descriptor_proto, row_class
+
+
+class PublishEventLog:
+    def __init__(self, project_id: str, dataset_id: str, table_id: str = PUBLISH_EVENTS_TABLE, spool_dir: str = PUBLISH_EVENTS_SPOOL_DIR, client: Optional[bigquery.Client] = None):
+        """
+        One row per category/term operation of a publish (operation, resource, latency,
+        attempts, outcome). Rows are written to a local NDJSON file and loaded with a single
+        BigQuery load job instead of streaming inserts, so large publishes stay cheap.
+        Files whose load fails stay in `spool_dir` and are retried with the next load.
+        """
+        self.project_id = project_id
+        self.table_ref = f"{project_id}.{dataset_id}.{table_id}"
+        self.spool_dir = spool_dir
+        self._client = client
+
+    @property
+    def client(self) -> bigquery.Client:
+        if self._client is None:
+            self._client = bigquery_client(self.project_id)
+        return self._client
+
+    def log_results(
+        self,
+        results: Iterable,
+        glossary_id: str = None,
+        actor: str = "system",
+        run_id: str = None,
+        resource_name: Callable = None,
+    ) -> str:
+        """
+        Records the ItemResults of a publish and loads them. `resource_name(result)` maps a
+        result to its full resource name (defaults to the item id). Returns the run id,
+        to be referenced from the summary audit event.
+        """
+        run_id = run_id or uuid.uuid4().hex
+        now = datetime.now(timezone.utc)
+        rows = [
             {
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": (datetime.fromtimestamp(r.finished_at, timezone.utc) if r.finished_at else now).isoformat(),
+                "run_id": run_id,
                 "actor": actor,
-                "status": status,
                 "glossary_id": glossary_id,
-                "details": json.dumps(details) if details else None
+                "operation": r.operation,
+                "resource_name": resource_name(r) if resource_name else r.item_id,
+                "outcome": r.outcome,
+                "attempts": r.attempts,
+                "latency_ms": round(r.latency_ms, 1),
+                "error": r.error,
             }
+            for r in results
         ]
-        errors = self.client.insert_rows_json(self.table_ref, rows_to_insert)
-        if errors:
-            print(f"❌ Error logging to BigQuery: {errors}")
-        else:
-            print(f"✅ Event logged to BigQuery: {status}")
+        if rows:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            path = os.path.join(self.spool_dir, f"{self._spool_prefix()}{run_id}.ndjson")
+            with open(path, "w", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.load()
+        return run_id
+
+    def _spool_prefix(self) -> str:
+        return self.table_ref.replace(".", "__") + "__"
+
+    def load(self) -> int:
+        """
+        Loads every pending NDJSON file for this table; returns the number of rows loaded.
+        Each file is first claimed by renaming it to `*.loading.<pid>`, so concurrent loads
+        (other threads, workers or instances sharing the spool) never load the same rows twice.
+        """
+        self._requeue_stale_claims()
+        paths = sorted(glob.glob(os.path.join(self.spool_dir, f"{self._spool_prefix()}*.ndjson")))
+        if not paths:
+            return 0
+        job_config = bigquery.LoadJobConfig(
+            source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+            schema=[bigquery.SchemaField(name, field_type, mode=mode) for name, field_type, mode in PUBLISH_EVENT_SCHEMA],
+            create_disposition=bigquery.CreateDisposition.CREATE_IF_NEEDED,
+            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+        )
+        loaded = 0
+        for path in paths:
+            claimed = f"{path}.loading.{os.getpid()}.{threading.get_ident()}"
+            try:
+                os.replace(path, claimed)
+                # mtime marks the claim, so an abandoned claim can be told apart from a slow load
+                os.utime(claimed)
+            except OSError:
+                continue  # already claimed by another load
+            try:
+                with open(claimed, "rb") as f:
+                    job = self.client.load_table_from_file(f, self.table_ref, job_config=job_config)
+                job.result()
+            except Exception as e:
+                print(f"❌ Error loading publish events into {self.table_ref} ({e}); kept in {path} for the next load")
+                self._release_claim(claimed, path)
+                continue
+            loaded += job.output_rows or 0
+            try:
+                os.remove(claimed)
+            except OSError as e:
+                print(f"⚠️ Could not remove loaded spool file {claimed}: {e}")
+        if loaded:
+            print(f"✅ {loaded} publish event(s) loaded into {self.table_ref}.")
+        return loaded
+
+    def _release_claim(self, claimed: str, path: str):
+        try:
+            os.replace(claimed, path)
+        except OSError as e:
+            print(f"⚠️ Could not return {claimed} to the spool: {e}")
+
+    def _requeue_stale_claims(self):
+        """Returns to the spool the files claimed by a load that died (claim older than PUBLISH_EVENTS_CLAIM_TTL)."""
+        now = time.time()
+        for claimed in glob.glob(os.path.join(self.spool_dir, f"{self._spool_prefix()}*.ndjson.loading.*")):
+            try:
+                if now - os.path.getmtime(claimed) > PUBLISH_EVENTS_CLAIM_TTL:
+                    self._release_claim(claimed, claimed.split(".loading.", 1)[0])
+            except OSError:
+                continue
+
+_loggers: Dict[str, AuditLogger] = {}
+_loggers_lock = threading.Lock()
+
+
+def get_audit_logger(project_id: str, dataset_id: str, table_id: str = "glossary_audit_log") -> AuditLogger:
+    """Process-wide AuditLogger per table, so every caller shares one buffer and flush thread."""
+    key = f"{project_id}.{dataset_id}.{table_id}"
+    with _loggers_lock:
+        if key not in _loggers:
+            _loggers[key] = AuditLogger(project_id, dataset_id, table_id)
+        return _loggers[key]
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from core.client_pool import storage_client as shared_storage_client
+from modules.business_glossary import MAX_CHUNK_TOKENS, build_glossary_prompt
+from modules.context_serializer import CONTEXT_FORMAT
+from modules.glossary_map_reduce import chunk_context, merge_glossaries
+from src.models.glossary import GlossaryProposal
+
+BATCH_DIR = os.path.join("output", ".cache", "batch")
+BATCH_POLL_SECONDS = int(os.getenv("GLOSSARY_BATCH_POLL_SECONDS", "60"))
+_FINAL_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED", "JOB_STATE_PARTIALLY_SUCCEEDED"}
+
+
+def response_schema(model_cls=GlossaryProposal) -> Dict:
+    """
+    Esquema JSON del modelo Pydantic en el subconjunto OpenAPI que acepta Vertex
+    (sin $ref ni anyOf con null) para el campo generationConfig.responseSchema.
+    """
+    schema = model_cls.model_json_schema()
+    definitions = schema.pop("$defs", {})
+
+    def convert(node):
+        if isinstance(node, list):
+            return [convert(item) for item in node]
+        if not isinstance(node, dict):
+            return node
+        if "$ref" in node:
+            return convert(definitions[node["$ref"].rsplit("/", 1)[-1]])
+        variants = node.get("anyOf")
+        if variants and any(v.get("type") == "null" for v in variants):
+            non_null = [v for v in variants if v.get("type") != "null"]
+            converted = convert(non_null[0]) if len(non_null) == 1 else {"anyOf": convert(non_null)}
+            extra = {k: convert(v) for k, v in node.items() if k not in ("anyOf", "default", "title")}
+            return {**converted, **extra, "nullable": True}
+        return {k: convert(v) for k, v in node.items() if k not in ("default", "title")}
+
+    return convert(schema)
+
+
+def request_key(*parts: str) -> str:
+    # Hex en minúsculas: válido como valor de label de Google Cloud
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()[:32]
+
+
+def _response_text(line: Dict) -> Optional[str]:
+    response = line.get("response") or {}
+    for candidate in response.get("candidates", []):
+        parts = (candidate.get("content") or {}).get("parts", [])
+        text = "".join(part.get("text", "") for part in parts)
+        if text:
+            return text
+    return None
+
+
+class LocalBatchBackend:
+    def __init__(self, responder: Optional[Callable[[str], str]] = None, work_dir: str = BATCH_DIR):
+        """
+        Backend local para pruebas: lee el JSONL de peticiones y escribe un JSONL de
+        resultados con el mismo formato que Vertex, sin llamadas a la API.
+        Por defecto responde con un glosario mínimo con un término por tabla del prompt.
+        """
+        self.responder = responder or self._stub_response
+        self.work_dir = work_dir
+
+    @staticmethod
+    def _stub_response(prompt: str) -> str:
+        tables = re.findall(r"^\s*Table: ([^\s{]+)", prompt, flags=re.MULTILINE)
+        terms = [
+            {"term": table, "definition": f"Entidad de negocio representada por la tabla {table}.", "parent_category": "Stub"}
+            for table in tables
+        ]
+        return json.dumps({"glossary": {"categories": [{"id": "stub", "display_name": "Stub", "description": "", "terms": terms}]}})
+
+    def run(self, run_id: str, requests_path: str, model_name: str) -> Iterable[Dict]:
+        output_path = os.path.join(self.work_dir, run_id, "predictions.jsonl")
+        with open(requests_path, "r", encoding="utf-8") as src, open(output_path, "w", encoding="utf-8") as dst:
+            for raw in src:
+                line = json.loads(raw)
+                prompt = line["request"]["contents"][0]["parts"][0]["text"]
+                line["response"] = {"candidates": [{"content": {"role": "model", "parts": [{"text": self.responder(prompt)}]}}]}
+                line["status"] = ""
+                dst.write(json.dumps(line, ensure_ascii=False) + "\n")
+        print(f"🧪 Batch local completado: {output_path}")
+        with open(output_path, "r", encoding="utf-8") as f:
+            for raw in f:
+                yield json.loads(raw)
+
+
+class VertexBatchBackend:
+    def __init__(self, client, bucket: str, prefix: str = "glossary_batch", poll_seconds: int = BATCH_POLL_SECONDS, storage_client=None):
+        """
+        Sube el JSONL a gs://`bucket`/`prefix`/<run_id>/, lanza un único job de batch prediction
+        de Vertex AI (`client.batches.create`) y lee las predicciones al terminar.
+        """
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.poll_seconds = poll_seconds
+        self.storage = storage_client or shared_storage_client()
+
+    def run(self, run_id: str, requests_path: str, model_name: str) -> Iterable[Dict]:
+        from google.genai import types
+
+        bucket = self.storage.bucket(self.bucket)
+        input_blob = f"{self.prefix}/{run_id}/input.jsonl"
+        bucket.blob(input_blob).upload_from_filename(requests_path, content_type="application/jsonl")
+        output_prefix = f"{self.prefix}/{run_id}/output"
+
+        job = self.client.batches.create(
+            model=model_name,
+            src=f"gs://{self.bucket}/{input_blob}",
+            config=types.CreateBatchJobConfig(display_name=f"glossary-{run_id}", dest=f"gs://{self.bucket}/{output_prefix}"),
+        )
+        print(f"📤 Batch job enviado: {job.name}")
+        while job.state.name not in _FINAL_STATES:
+            time.sleep(self.poll_seconds)
+            job = self.client.batches.get(name=job.name)
+            print(f"⏳ Batch job {job.name}: {job.state.name}")
+
+        if job.state.name not in ("JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED"):
+            raise RuntimeError(f"El batch job {job.name} terminó en estado {job.state.name}: {getattr(job, 'error', None)}")
+
+        for blob in self.storage.list_blobs(self.bucket, prefix=output_prefix):
+            if blob.name.endswith(".jsonl"):
+                for raw in blob.download_as_text().splitlines():
+                    if raw.strip():
+                        yield json.loads(raw)
+
+
+class BatchGlossaryRunner:
+    def __init__(self, backend, model_name: str, context_format: str = CONTEXT_FORMAT, max_chunk_tokens: int = MAX_CHUNK_TOKENS, work_dir: str = BATCH_DIR, output_dir: str = "output", fallback_generator=None):
+        """
+        Genera los glosarios de varios datasets con un único job batch: un prompt por fragmento
+        de contexto (mismo troceado que el modo online), una línea JSONL por prompt.
+        Los resultados se validan contra el esquema y se fusionan por dataset.
+        Con `fallback_generator`, los fragmentos sin respuesta válida se generan en modo online.
+        """
+        self.backend = backend
+        self.model_name = model_name
+        self.context_format = context_format
+        self.max_chunk_tokens = max_chunk_tokens
+        self.work_dir = work_dir
+        self.output_dir = output_dir
+        self.fallback_generator = fallback_generator
+        self._keys_by_prompt: Dict[str, str] = {}
+
+    def build_requests(self, contexts: Dict[str, str]) -> Tuple[List[Dict], Dict[str, Tuple[str, int, str]]]:
+        """Devuelve (líneas JSONL, clave -> (dataset, índice de fragmento, fragmento))."""
+        schema = response_schema()
+        lines, manifest = [], {}
+        for dataset_id, context in contexts.items():
+            for index, chunk in enumerate(chunk_context(context, self.max_chunk_tokens)):
+                prompt = build_glossary_prompt(chunk, self.context_format)
+                key = request_key(dataset_id, prompt)
+                manifest[key] = (dataset_id, index, chunk)
+                self._keys_by_prompt[request_key(prompt)] = key
+                lines.append({
+                    "request": {
+                        "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+                        "generationConfig": {"responseMimeType": "application/json", "responseSchema": schema},
+                        "labels": {"glossary_request_key": key},
+                    },
+                })
+        return lines, manifest
+
+    def _line_key(self, line: Dict) -> Optional[str]:
+        # La clave viaja en las labels de la petición; si se pierde, se localiza por el prompt
+        key = ((line.get("request") or {}).get("labels") or {}).get("glossary_request_key")
+        if key:
+            return key
+        try:
+            return self._keys_by_prompt.get(request_key(line["request"]["contents"][0]["parts"][0]["text"]))
+        except (KeyError, IndexError, TypeError):
+            return None
+
+    def run(self, contexts: Dict[str, str]) -> Dict[str, Optional[str]]:
+        """Devuelve dataset -> fichero de propuesta generado (None si no se obtuvo glosario)."""
+        run_id = time.strftime("%Y%m%d-%H%M%S")
+        run_dir = os.path.join(self.work_dir, run_id)
+        os.makedirs(run_dir, exist_ok=True)
+
+        lines, manifest = self.build_requests(contexts)
+        requests_path = os.path.join(run_dir, "input.jsonl")
+        with open(requests_path, "w", encoding="utf-8") as f:
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        print(f"📦 {len(lines)} petición(es) de {len(contexts)} dataset(s) en {requests_path}")
+
+        partials: Dict[str, Dict[int, Dict]] = {dataset_id: {} for dataset_id in contexts}
+        for line in self.backend.run(run_id, requests_path, self.model_name):
+            key = self._line_key(line)
+            if key not in manifest:
+                print(f"⚠️ Resultado batch sin petición asociada (clave {key}); se ignora.")
+                continue
+            dataset_id, index, _ = manifest[key]
+            text = _response_text(line)
+            try:
+                partials[dataset_id][index] = json.loads(GlossaryProposal.model_validate_json(text or "").model_dump_json())
+            except ValidationError as e:
+                print(f"⚠️ {dataset_id} fragmento {index + 1}: respuesta no válida ({line.get('status') or e.error_count()}).")
+
+        missing = [(key, entry) for key, entry in manifest.items() if entry[1] not in partials[entry[0]]]
+        if missing and self.fallback_generator:
+            print(f"🔁 {len(missing)} fragmento(s) sin respuesta válida; generando en modo online...")
+            for _, (dataset_id, index, chunk) in missing:
+                result = self.fallback_generator.suggest_glossary_structure(chunk)
+                if result:
+                    partials[dataset_id][index] = json.loads(result)
+
+        timestamp = int(time.time())
+        os.makedirs(self.output_dir, exist_ok=True)
+        outputs: Dict[str, Optional[str]] = {}
+        for dataset_id, by_index in partials.items():
+            if not by_index:
+                print(f"❌ {dataset_id}: ningún fragmento con glosario válido.")
+                outputs[dataset_id] = None
+                continue
+            ordered = [by_index[i] for i in sorted(by_index)]
+            glossary = ordered[0] if len(ordered) == 1 else merge_glossaries(ordered)
+            expected = sum(1 for entry in manifest.values() if entry[0] == dataset_id)
+            glossary["generation_stats"] = {"mode": "batch", "model": self.model_name, "run_id": run_id, "chunks": expected, "chunks_ok": len(by_index)}
+            path = os.path.join(self.output_dir, f"glossary_proposal_{timestamp}_{dataset_id}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(glossary, f, ensure_ascii=False, indent=2)
+            print(f"✅ {dataset_id}: propuesta guardada en {path} ({len(by_index)}/{expected} fragmento(s)).")
+            outputs[dataset_id] = path
+        return outputs
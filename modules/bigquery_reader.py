@@ -0,0 +1,202 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from google.cloud import bigquery
+
+from core.client_pool import bigquery_client
+
+from modules.concurrency import map_in_context
+from modules.context_serializer import CONTEXT_FORMAT, serialize_tables
+from modules.metadata_cache import MetadataSnapshotCache
+
+
+class BigQueryMetadataReader:
+    def __init__(self, project_id: str, location: str, max_workers: int = 8, use_information_schema: bool = False, cache: Optional[MetadataSnapshotCache] = None):
+        """
+        Lector de metadatos técnicos (tablas, columnas, descripciones) de un dataset de BigQuery.
+
+        Args:
+            max_workers: Número máximo de llamadas `get_table` simultáneas.
+            use_information_schema: Si es True, recupera todo el esquema con una única consulta
+                a `INFORMATION_SCHEMA` en lugar de una llamada `get_table` por tabla.
+            cache: Caché de snapshots; si se indica, solo se releen las tablas modificadas.
+        """
+        self.project_id = project_id
+        self.location = location
+        self.max_workers = max(1, max_workers)
+        self.use_information_schema = use_information_schema
+        self.cache = cache
+        # Resultado de la última lectura: metadatos por tabla y cambios frente a la caché
+        self.tables: List[Dict] = []
+        self.last_changes: Optional[Dict[str, List[str]]] = None
+        self.client = bigquery_client(project_id, location)
+
+    def list_table_ids(self, dataset_id: str) -> List[str]:
+        tables = self.client.list_tables(dataset_id)
+        return sorted(table.table_id for table in tables)
+
+    def list_table_versions(self, dataset_id: str) -> Dict[str, int]:
+        """
+        Devuelve table_id -> last_modified_time (ms) de todas las tablas del dataset con una sola consulta.
+        """
+        query = f"SELECT table_id, last_modified_time FROM `{self.project_id}.{dataset_id}.__TABLES__`"
+        rows = self.client.query(query).result()
+        return {row.table_id: int(row.last_modified_time) for row in rows}
+
+    def fetch_tables(self, dataset_id: str, table_ids: List[str]) -> List[Dict]:
+        """
+        Devuelve los metadatos de las tablas indicadas, en el mismo orden que `table_ids`.
+        """
+        if not table_ids:
+            return []
+        if self.use_information_schema:
+            return self._fetch_from_information_schema(dataset_id, table_ids)
+        return self._fetch_with_get_table(dataset_id, table_ids)
+
+    def _fetch_with_get_table(self, dataset_id: str, table_ids: List[str]) -> List[Dict]:
+        def fetch(table_id: str) -> Dict:
+            full_table = self.client.get_table(f"{self.project_id}.{dataset_id}.{table_id}")
+            return {
+                "table_id": full_table.table_id,
+                "description": full_table.description or "",
+                "modified": int(round(full_table.modified.timestamp() * 1000)) if full_table.modified else None,
+                "etag": full_table.etag,
+                "columns": [
+                    {
+                        "name": field.name,
+                        "type": field.field_type,
+                        "description": field.description or "",
+                    }
+                    for field in full_table.schema
+                ],
+            }
+
+        # executor.map conserva el orden de entrada, así la salida es determinista
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(table_ids))) as executor:
+            return list(map_in_context(executor, fetch, table_ids))
+
+    def _fetch_from_information_schema(self, dataset_id: str, table_ids: List[str]) -> List[Dict]:
+        dataset_ref = f"`{self.project_id}.{dataset_id}`"
+        # Solo campos de primer nivel (field_path == column_name), igual que el esquema de get_table
+        query = f"""
+            SELECT
+              c.table_name,
+              c.column_name,
+              c.data_type,
+              c.description,
+              o.option_value AS table_description
+            FROM {dataset_ref}.INFORMATION_SCHEMA.COLUMNS AS cols
+            JOIN {dataset_ref}.INFORMATION_SCHEMA.COLUMN_FIELD_PATHS AS c
+              ON c.table_name = cols.table_name AND c.field_path = cols.column_name
+            LEFT JOIN {dataset_ref}.INFORMATION_SCHEMA.TABLE_OPTIONS AS o
+              ON o.table_name = c.table_name AND o.option_name = 'description'
+            WHERE c.table_name IN UNNEST(@table_ids)
+            ORDER BY c.table_name, cols.ordinal_position
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ArrayQueryParameter("table_ids", "STRING", table_ids)]
+        )
+        rows = self.client.query(query, job_config=job_config).result()
+
+        tables: Dict[str, Dict] = {}
+        for row in rows:
+            table = tables.setdefault(row.table_name, {
+                "table_id": row.table_name,
+                "description": _unquote_option(row.table_description),
+                "modified": None,
+                "etag": None,
+                "columns": [],
+            })
+            table["columns"].append({
+                "name": row.column_name,
+                "type": row.data_type,
+                "description": row.description or "",
+            })
+
+        return [tables[table_id] for table_id in table_ids if table_id in tables]
+
+    def _fetch_all(self, dataset_id: str, table_ids: List[str]) -> List[Dict]:
+        mode = "INFORMATION_SCHEMA" if self.use_information_schema else f"get_table x{self.max_workers}"
+        print(f"DEBUG: Recuperando esquema de {len(table_ids)} tabla(s) ({mode})...")
+        return self.fetch_tables(dataset_id, table_ids)
+
+    def _fetch_with_cache(self, dataset_id: str, table_ids: List[str]) -> List[Dict]:
+        try:
+            versions = self.list_table_versions(dataset_id)
+        except Exception as e:
+            print(f"⚠️ No se pudo consultar __TABLES__, se ignora la caché de metadatos: {e}")
+            return self._fetch_all(dataset_id, table_ids)
+
+        changes = self.cache.diff(self.project_id, dataset_id, versions)
+        self.last_changes = changes
+
+        print(
+            f"📦 Caché de metadatos: {len(changes['new'])} nueva(s), {len(changes['changed'])} modificada(s), "
+            f"{len(changes['removed'])} eliminada(s), {len(changes['unchanged'])} sin cambios."
+        )
+        for label in ("new", "changed", "removed"):
+            if changes[label]:
+                print(f"   - {label}: {', '.join(changes[label])}")
+
+        stale = changes["new"] + changes["changed"]
+        fetched = self._fetch_all(dataset_id, stale) if stale else []
+        for table in fetched:
+            # __TABLES__ es la referencia de frescura, también en modo INFORMATION_SCHEMA
+            table["modified"] = versions.get(table["table_id"])
+
+        self.cache.store(self.project_id, dataset_id, fetched)
+        self.cache.remove(self.project_id, dataset_id, changes["removed"])
+        return self.cache.load(self.project_id, dataset_id, table_ids)
+
+    def get_context_from_dataset(self, dataset_id: str, context_format: str = CONTEXT_FORMAT) -> str:
+        """
+        Recupera el contexto de los metadatos de las tablas de un dataset como texto para el prompt
+        (`context_format`: "text", o los formatos compactos "tsv" / "json").
+        """
+        try:
+            print(f"DEBUG: Listando tablas en el dataset '{dataset_id}'...")
+            try:
+                table_ids = self.list_table_ids(dataset_id)
+            except Exception as e:
+                print(f"⚠️ Error accediendo al dataset {dataset_id}: {e}")
+                return ""
+
+            if not table_ids:
+                print(f"⚠️ No se encontraron tablas en {dataset_id}.")
+                return ""
+
+            if self.cache:
+                tables = self._fetch_with_cache(dataset_id, table_ids)
+            else:
+                tables = self._fetch_all(dataset_id, table_ids)
+        except Exception as e:
+            print(f"⚠️ Error recuperando metadatos de BigQuery: {e}")
+            return ""
+
+        self.tables = tables
+        return serialize_tables(dataset_id, tables, context_format)
+
+
+def render_context(dataset_id: str, tables: List[Dict]) -> str:
+    context = f"\nDataset: {dataset_id}\n"
+    for table in tables:
+        context += f"  Table: {table['table_id']}\n"
+        if table.get("description"):
+            context += f"    Description: {table['description']}\n"
+
+        context += "    Columns:\n"
+        for column in table["columns"]:
+            desc_str = f" - Description: {column['description']}" if column.get("description") else ""
+            context += f"      - {column['name']} ({column['type']}){desc_str}\n"
+
+    return context.strip()
+
+
+def _unquote_option(value: Optional[str]) -> str:
+    # TABLE_OPTIONS devuelve los valores como literales SQL: "texto"
+    if not value:
+        return ""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value.strip('"')
@@ -1,29 +1,139 @@
-from typing import Optional
-from google import genai
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Optional, Tuple
+from google.genai import types
+from pydantic import ValidationError
 from config.settings import config
+from core.client_pool import genai_client
+from modules.concurrency import map_in_context
+from modules.context_serializer import CONTEXT_FORMAT, FORMAT_NOTES
+from modules.glossary_map_reduce import chunk_context, merge_glossaries
+from modules.json_stream import CATEGORY_PATH, IncrementalGlossaryParser
+from modules.model_router import ModelRouter, quality_issues
+from src.models.glossary import Category, Glossary, GlossaryProposal
 
-class BusinessGlossaryGenerator:
-    def __init__(self, model_name: str = "gemini-2.5-flash"):
+# Presupuesto (tokens estimados) de contexto por llamada antes de pasar a modo map-reduce
+MAX_CHUNK_TOKENS = int(os.getenv("GLOSSARY_MAX_CHUNK_TOKENS", "30000"))
+MAX_PARALLEL_CHUNKS = int(os.getenv("GLOSSARY_MAX_PARALLEL_CHUNKS", "4"))
+
+# Incrementar al modificar build_glossary_prompt para invalidar las respuestas cacheadas
+PROMPT_TEMPLATE_VERSION = "2"
+
+RESPONSE_CACHE_DIR = os.path.join("output", ".cache", "llm_responses")
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("GLOSSARY_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("GLOSSARY_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+
+class GlossaryResponseCache:
+    def __init__(self, cache_dir: str = RESPONSE_CACHE_DIR, ttl_seconds: int = RESPONSE_CACHE_TTL_SECONDS, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
         """
-        Generador de Glosario de Negocio estructurado para Dataplex
-        soportando Categorías y Etiquetas.
+        Caché en disco de respuestas del modelo, direccionada por contenido
+        (hash de modelo + versión de plantilla + contexto).
+        Las entradas caducan tras `ttl_seconds` y, si el directorio supera `max_bytes`,
+        se eliminan las menos usadas recientemente (el mtime del fichero marca el último acceso).
+        El directorio puede compartirse entre generadores y procesos concurrentes: la caché es
+        best-effort y un error de disco nunca hace fallar la generación.
         """
-        self.client = genai.Client(
-            vertexai=True,
-            project=config.PROJECT_ID,
-            location=config.LOCATION
-        )
-        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
 
-    def _build_prompt(self, technical_context: str) -> str:
-        return f"""
+    @staticmethod
+    def make_key(model_name: str, technical_context: str, template_version: str = PROMPT_TEMPLATE_VERSION) -> str:
+        digest = hashlib.sha256()
+        for part in (model_name, template_version, technical_context):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                return None
+
+            # Otro generador puede haber eliminado la entrada (expirada o desalojada) tras leerla
+            if time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                return None
+
+            try:
+                os.utime(path)  # LRU: marca el acceso
+            except OSError:
+                pass
+            return entry.get("response")
+
+    def put(self, key: str, response: str, model_name: str):
+        path = self._path(key)
+        entry = {"created_at": time.time(), "model": model_name, "response": response}
+        with self._lock:
+            tmp_path = None
+            try:
+                # Temporal único: varios generadores pueden escribir la misma clave a la vez
+                fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(entry, f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+                tmp_path = None
+                self._evict()
+            except OSError as e:
+                print(f"⚠️ No se pudo guardar la respuesta en la caché: {e}")
+            finally:
+                if tmp_path:
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue  # Desalojada por otro generador
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+            total -= size
+
+
+def build_glossary_prompt(technical_context: str, context_format: str = CONTEXT_FORMAT) -> str:
+    """Prompt de generación del glosario (compartido por el modo online y el modo batch)."""
+    format_note = FORMAT_NOTES.get(context_format, "")
+    return f"""
         Eres un experto en Gobierno de Datos y Analítica Avanzada.
         Actúa como un 'Data Steward' corporativo encargado de definir un Glosario de Negocio en Dataplex.
 
         TU TAREA:
         Analiza los siguientes METADATOS TÉCNICOS de BigQuery y estructura un Glosario de Negocio lógico.
         
-        CONTEXTO TÉCNICO (Tablas y Columnas):
+        CONTEXTO TÉCNICO (Tablas y Columnas):{" " + format_note if format_note else ""}
         -------------------------------------
         {technical_context}
         -------------------------------------
@@ -86,21 +196,262 @@ class BusinessGlossaryGenerator:
         - Devuelve los resultados en Español
         """
 
-    def suggest_glossary_structure(self, technical_context: str) -> Optional[str]:
+
+class BusinessGlossaryGenerator:
+    def __init__(self, model_name: Optional[str] = None, max_chunk_tokens: int = MAX_CHUNK_TOKENS, max_workers: int = MAX_PARALLEL_CHUNKS, use_cache: bool = True, cache: Optional[GlossaryResponseCache] = None, context_format: str = CONTEXT_FORMAT, router: Optional[ModelRouter] = None):
         """
-        Genera la estructura del glosario basada en el contexto técnico proporcionado.
+        Generador de Glosario de Negocio estructurado para Dataplex
+        soportando Categorías y Etiquetas.
+
+        Si el contexto supera `max_chunk_tokens`, se divide por tabla/documento, se generan
+        glosarios parciales en paralelo (`max_workers`) y se fusionan en un paso final.
+
+        Con `use_cache=False` se ignora la caché de respuestas y siempre se llama al modelo.
+        `context_format` indica cómo está serializado el contexto (ver modules.context_serializer).
+
+        `model_name` (por defecto config.MODEL_NAME) es el modelo más barato de la cascada: los
+        contextos pequeños empiezan por él y se escala a modelos mayores solo si la respuesta no
+        supera la validación del esquema o la heurística de calidad (ver modules.model_router).
         """
-        prompt = self._build_prompt(technical_context)
-        print("🧠 Gemini analizando estructura de glosario (Categorías + Etiquetas)...")
-        
+        self.client = genai_client(config.PROJECT_ID, config.LOCATION)
+        self.model_name = model_name or config.MODEL_NAME
+        self.router = router or ModelRouter(self.model_name)
+        self.max_chunk_tokens = max_chunk_tokens
+        self.max_workers = max(1, max_workers)
+        self.context_format = context_format
+        self.cache = (cache or GlossaryResponseCache()) if use_cache else None
+
+    def count_prompt_tokens(self, technical_context: str, counter) -> int:
+        """Tokens de los prompts que se enviarán (uno por fragmento si hay map-reduce)."""
+        return sum(counter.count(self._build_prompt(chunk)) for chunk in chunk_context(technical_context, self.max_chunk_tokens))
+
+    @property
+    def usage(self) -> Dict:
+        """Tokens reportados por los modelos (usage_metadata) en las llamadas de esta instancia."""
+        metrics = self.router.summary().values()
+        return {
+            "calls": sum(m["calls"] for m in metrics),
+            "prompt_tokens": sum(m["prompt_tokens"] for m in metrics),
+            "output_tokens": sum(m["output_tokens"] for m in metrics),
+        }
+
+    def _build_prompt(self, technical_context: str) -> str:
+        return build_glossary_prompt(technical_context, self.context_format)
+
+    @staticmethod
+    def _response_config(schema=GlossaryProposal) -> types.GenerateContentConfig:
+        # Salida JSON restringida al esquema: sin fences ni texto alrededor
+        return types.GenerateContentConfig(response_mime_type="application/json", response_schema=schema)
+
+    def _call_model(self, prompt: str, model: str, schema=GlossaryProposal) -> Optional[str]:
+        start = time.monotonic()
         try:
             response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt
+                model=model,
+                contents=prompt,
+                config=self._response_config(schema)
             )
-            if response.text:
-                return response.text.replace("```json", "").replace("```", "").strip()
         except Exception as e:
-            print(f"❌ Error generando glosario: {e}")
-        
+            self.router.record_call(model, (time.monotonic() - start) * 1000, ok=False)
+            print(f"❌ Error generando glosario ({model}): {e}")
+            return None
+        self.router.record_call(model, (time.monotonic() - start) * 1000, getattr(response, "usage_metadata", None))
+        return response.text
+
+    def _get_cached(self, technical_context: str, start_level: int) -> Optional[str]:
+        # Una respuesta cacheada de cualquier modelo de la cascada (desde el nivel de entrada) sirve
+        if not self.cache:
+            return None
+        for model in self.router.models[start_level:]:
+            cached = self.cache.get(GlossaryResponseCache.make_key(model, technical_context))
+            if not cached:
+                continue
+            try:
+                GlossaryProposal.model_validate_json(cached)
+            except ValidationError:
+                continue
+            print(f"⚡ Respuesta recuperada de la caché local ({model}, sin llamada a Gemini).")
+            return cached
         return None
+
+    def _generate(self, technical_context: str, start_level: Optional[int] = None) -> Optional[str]:
+        """
+        Genera con el modelo asignado por el router y escala al siguiente de la cascada si la
+        respuesta no es válida o no supera la heurística de calidad. Si ningún modelo la supera,
+        se devuelve el último resultado válido.
+        """
+        level = self.router.start_level(technical_context) if start_level is None else start_level
+        cached = self._get_cached(technical_context, level)
+        if cached:
+            return cached
+
+        best = None
+        models = self.router.models
+        for level in range(level, len(models)):
+            model = models[level]
+            raw = self._call_model(self._build_prompt(technical_context), model)
+            result = self._validate(raw, technical_context, model) if raw else None
+            issues = quality_issues(result, technical_context) if result else ["respuesta no válida"]
+            if result:
+                best = result
+            if not issues:
+                if self.cache:
+                    self.cache.put(GlossaryResponseCache.make_key(model, technical_context), result, model)
+                return result
+            if level + 1 < len(models):
+                self.router.record_escalation(model)
+                print(f"⬆️ {model}: {'; '.join(issues)}. Escalando a {models[level + 1]}...")
+        return best
+
+    def _validate(self, raw: str, technical_context: str, model: str) -> Optional[str]:
+        """
+        Valida la respuesta contra el esquema. Si falla, se conservan las categorías válidas y
+        solo se regeneran las que fallan (y las que faltan si la respuesta quedó truncada).
+        """
+        try:
+            return GlossaryProposal.model_validate_json(raw).model_dump_json(indent=2)
+        except ValidationError as e:
+            print(f"⚠️ La respuesta no cumple el esquema ({e.error_count()} error(es)); reparando solo las secciones afectadas...")
+
+        parser = IncrementalGlossaryParser(targets={CATEGORY_PATH: "category"})
+        categories = []
+        for _, category in parser.feed(raw):
+            try:
+                categories.append(Category.model_validate(category))
+            except ValidationError as e:
+                name = category.get("display_name") or category.get("id") or "?"
+                print(f"🔧 Regenerando la categoría '{name}' ({e.error_count()} error(es))...")
+                regenerated = self._regenerate_category(technical_context, category, e, model)
+                if regenerated:
+                    categories.append(regenerated)
+
+        if not parser.complete:
+            # Respuesta truncada: se piden solo las categorías que faltan
+            done = [category.display_name for category in categories]
+            print(f"🔧 Respuesta incompleta; solicitando las categorías restantes (ya generadas: {len(done)})...")
+            categories.extend(self._generate_missing_categories(technical_context, done, model))
+
+        if not categories:
+            print("❌ No se pudo recuperar ninguna categoría válida de la respuesta.")
+            return None
+        return GlossaryProposal(glossary=Glossary(categories=categories)).model_dump_json(indent=2)
+
+    def _regenerate_category(self, technical_context: str, category: Dict, error: ValidationError, model: str) -> Optional[Category]:
+        prompt = self._build_prompt(technical_context) + f"""
+        CORRECCIÓN:
+        La siguiente categoría no cumple el esquema ({error.error_count()} error(es): {error.errors(include_url=False, include_input=False)}).
+        Devuelve ÚNICAMENTE esa categoría corregida y completa (un objeto categoría, no el glosario):
+        {json.dumps(category, ensure_ascii=False)}
+        """
+        raw = self._call_model(prompt, model, schema=Category)
+        try:
+            return Category.model_validate_json(raw) if raw else None
+        except ValidationError as e:
+            print(f"⚠️ La categoría regenerada sigue sin ser válida: {e.error_count()} error(es).")
+            return None
+
+    def _generate_missing_categories(self, technical_context: str, done: list, model: str) -> list:
+        prompt = self._build_prompt(technical_context) + f"""
+        CONTINUACIÓN:
+        Ya se han generado estas categorías: {json.dumps(done, ensure_ascii=False)}.
+        Devuelve el glosario con SOLO las categorías que faltan (no repitas las anteriores).
+        """
+        raw = self._call_model(prompt, model)
+        try:
+            return GlossaryProposal.model_validate_json(raw).glossary.categories if raw else []
+        except ValidationError as e:
+            print(f"⚠️ Las categorías restantes no son válidas: {e.error_count()} error(es).")
+            return []
+
+    def suggest_glossary_structure(self, technical_context: str) -> Optional[str]:
+        """
+        Genera la estructura del glosario basada en el contexto técnico proporcionado.
+        """
+        chunks = chunk_context(technical_context, self.max_chunk_tokens)
+        if len(chunks) > 1:
+            return self._suggest_map_reduce(chunks)
+
+        print(f"🧠 Gemini ({self.router.models[self.router.start_level(technical_context)]}) analizando estructura de glosario (Categorías + Etiquetas)...")
+        return self._generate(technical_context)
+
+    def stream_glossary_structure(self, technical_context: str) -> Iterator[Tuple[str, object]]:
+        """
+        Versión en streaming de `suggest_glossary_structure`. Emite ("term", dict) y
+        ("category", dict) en cuanto cada objeto se completa en la salida del modelo y,
+        al final, ("glossary", json_str) con el glosario completo (o None si falla).
+        Con contextos fragmentados (map-reduce) los eventos se emiten tras la fusión.
+        """
+        parser = IncrementalGlossaryParser()
+        chunks = chunk_context(technical_context, self.max_chunk_tokens)
+
+        level = self.router.start_level(technical_context)
+        model = self.router.models[level]
+        cached = self._get_cached(technical_context, level) if len(chunks) == 1 else None
+        if len(chunks) > 1 or cached:
+            full = cached or self._suggest_map_reduce(chunks)
+            if full:
+                yield from parser.feed(full)
+            yield "glossary", parser.result() or full
+            return
+
+        print(f"🧠 Gemini ({model}) analizando estructura de glosario en streaming (Categorías + Etiquetas)...")
+        start = time.monotonic()
+        try:
+            stream = self.client.models.generate_content_stream(
+                model=model,
+                contents=self._build_prompt(technical_context),
+                config=self._response_config()
+            )
+            last_chunk = None
+            raw_parts = []
+            for chunk in stream:
+                last_chunk = chunk
+                if chunk.text:
+                    raw_parts.append(chunk.text)
+                    yield from parser.feed(chunk.text)
+        except Exception as e:
+            self.router.record_call(model, (time.monotonic() - start) * 1000, ok=False)
+            print(f"❌ Error generando glosario ({model}): {e}")
+            raw_parts = None
+
+        if raw_parts is not None:
+            # En streaming, el último fragmento trae el usage_metadata acumulado
+            self.router.record_call(model, (time.monotonic() - start) * 1000, getattr(last_chunk, "usage_metadata", None))
+        result = self._validate("".join(raw_parts), technical_context, model) if raw_parts else None
+        issues = quality_issues(result, technical_context) if result else ["respuesta no válida"]
+        if not issues:
+            if self.cache:
+                self.cache.put(GlossaryResponseCache.make_key(model, technical_context), result, model)
+        elif level + 1 < len(self.router.models):
+            # Escalado sin streaming: los eventos ya emitidos eran del modelo anterior
+            self.router.record_escalation(model)
+            print(f"⬆️ {model}: {'; '.join(issues)}. Escalando a {self.router.models[level + 1]}...")
+            result = self._generate(technical_context, start_level=level + 1) or result
+        yield "glossary", result
+
+    def _suggest_map_reduce(self, chunks: list) -> Optional[str]:
+        print(f"🧩 Contexto dividido en {len(chunks)} fragmentos (máx. ~{self.max_chunk_tokens} tokens). Generando glosarios parciales...")
+
+        def generate_partial(indexed_chunk) -> Optional[Dict]:
+            index, chunk = indexed_chunk
+            # _generate ya devuelve JSON validado contra el esquema
+            raw = self._generate(chunk)
+            if not raw:
+                print(f"⚠️ Fragmento {index + 1}/{len(chunks)} sin glosario válido.")
+                return None
+            print(f"✅ Fragmento {index + 1}/{len(chunks)} generado.")
+            return json.loads(raw)
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as executor:
+            partials = list(map_in_context(executor, generate_partial, enumerate(chunks)))
+
+        # Un fragmento sin glosario son tablas/documentos enteros que faltarían en la propuesta
+        # (y que el modo incremental daría por cubiertos): el resultado no se da por bueno
+        failed = [index + 1 for index, partial in enumerate(partials) if not partial]
+        if failed:
+            print(f"❌ {len(failed)}/{len(chunks)} fragmento(s) sin glosario ({', '.join(map(str, failed))}); no se genera una propuesta incompleta.")
+            return None
+
+        print(f"🔗 Fusionando {len(partials)} glosarios parciales...")
+        merged = merge_glossaries(partials)
+        return json.dumps(merged, ensure_ascii=False, indent=2)
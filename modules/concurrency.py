@@ -0,0 +1,129 @@
+import contextvars
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Tuple, Type
+
+from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
+
+# Errores transitorios de las APIs de Google Cloud que merece la pena reintentar
+RETRYABLE_ERRORS: Tuple[Type[BaseException], ...] = (ResourceExhausted, ServiceUnavailable)
+
+
+def map_in_context(executor: ThreadPoolExecutor, fn: Callable, items: Iterable):
+    """
+    Igual que `executor.map`, pero cada tarea se ejecuta con una copia de los contextvars
+    del hilo que la envía (p.ej. el job actual de la app web, para que los logs de los
+    hilos trabajadores lleguen a su job). Conserva el orden de entrada.
+    """
+    calls = [(contextvars.copy_context(), item) for item in items]
+    return executor.map(lambda call: call[0].run(fn, call[1]), calls)
+
+
+def submit_in_context(executor, fn: Callable, *args):
+    """`executor.submit` que propaga los contextvars del hilo que envía la tarea."""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+class RateLimiter:
+    def __init__(self, qps: float):
+        """
+        Limitador de tasa (token bucket) compartido entre hilos.
+        `qps <= 0` desactiva el límite.
+        """
+        self.qps = qps
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def acquire(self):
+        if self.qps <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(self._next_slot, now) + 1.0 / self.qps
+        if wait > 0:
+            time.sleep(wait)
+
+
+@dataclass
+class ItemResult:
+    """Resultado de una operación individual (p.ej. crear un término)."""
+    item_id: str
+    operation: str
+    outcome: str  # "SUCCESS" | "FAILED"
+    attempts: int
+    latency_ms: float
+    error: Optional[str] = None
+    finished_at: Optional[float] = None  # epoch (time.time()) al terminar
+
+
+def call_with_retry(
+    fn: Callable,
+    rate_limiter: Optional[RateLimiter] = None,
+    retry_on: Tuple[Type[BaseException], ...] = RETRYABLE_ERRORS,
+    max_attempts: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 32.0,
+):
+    """
+    Ejecuta `fn` con backoff exponencial (con jitter) ante errores transitorios.
+    Devuelve (resultado, intentos).
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        if rate_limiter:
+            rate_limiter.acquire()
+        try:
+            return fn(), attempt
+        except retry_on as e:
+            if attempt >= max_attempts:
+                raise
+            delay = min(max_delay, base_delay * (2 ** (attempt - 1)))
+            delay = delay / 2 + random.uniform(0, delay / 2)
+            print(f"⏳ {type(e).__name__}: reintento {attempt}/{max_attempts - 1} en {delay:.1f}s...")
+            time.sleep(delay)
+
+
+def run_parallel(
+    tasks: Iterable[Tuple[str, str, Callable]],
+    max_workers: int = 8,
+    rate_limiter: Optional[RateLimiter] = None,
+    max_attempts: int = 5,
+    on_result: Optional[Callable[[ItemResult], None]] = None,
+) -> List[ItemResult]:
+    """
+    Ejecuta tareas (item_id, operación, función) en un pool de hilos acotado, respetando el
+    límite de tasa y reintentando errores transitorios. Devuelve un resultado por tarea,
+    en el mismo orden de entrada; los fallos no interrumpen el resto de tareas.
+    `on_result` se invoca (desde el hilo trabajador) al terminar cada tarea, p.ej. para progreso.
+    """
+    def run(task) -> ItemResult:
+        item_id, operation, fn = task
+        calls = 0
+
+        def counted_call():
+            nonlocal calls
+            calls += 1
+            return fn()
+
+        start = time.monotonic()
+        try:
+            call_with_retry(counted_call, rate_limiter=rate_limiter, max_attempts=max_attempts)
+            outcome, error = "SUCCESS", None
+        except Exception as e:
+            outcome, error = "FAILED", str(e)
+            print(f"❌ {operation} {item_id}: {e}")
+        result = ItemResult(item_id, operation, outcome, calls, (time.monotonic() - start) * 1000, error, time.time())
+        if on_result:
+            on_result(result)
+        return result
+
+    tasks = list(tasks)
+    if not tasks:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks)))) as executor:
+        return list(map_in_context(executor, run, tasks))
@@ -0,0 +1,324 @@
+import hashlib
+import os
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from modules.glossary_map_reduce import estimate_tokens, is_section_start
+
+# Presupuesto (tokens estimados) del contexto enviado al generador; 0 desactiva la selección.
+# Nunca supera GLOSSARY_MAX_CONTEXT_TOKENS (límite duro de modules.token_budget, ver main.py)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("GLOSSARY_CONTEXT_TOKEN_BUDGET", "120000"))
+TOP_K_PER_DOMAIN = int(os.getenv("GLOSSARY_CONTEXT_TOP_K", "40"))
+MAX_DOMAINS = int(os.getenv("GLOSSARY_CONTEXT_MAX_DOMAINS", "8"))
+PASSAGE_TOKENS = int(os.getenv("GLOSSARY_PASSAGE_TOKENS", "300"))
+
+INDEX_DIR = os.path.join("output", ".cache", "context_index")
+INDEX_MAX_FILES = 20
+# Incrementar al cambiar el tokenizador o el formato del índice
+INDEX_VERSION = "1"
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+    a al algo como con de del el en es esta este for from in is la las lo los o of on or para
+    por que se sin su sus the to un una uno y description columns table string integer int64
+    float64 numeric boolean date timestamp documento inicio fin
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    normalized = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("utf-8").lower()
+    return [token for token in _TOKEN.findall(normalized) if len(token) > 1 and token not in _STOPWORDS]
+
+
+@dataclass
+class Passage:
+    section: int  # Índice de la tabla/documento de origen
+    text: str
+    tokens: int
+
+
+class BM25Index:
+    def __init__(self, vocab: List[str], term_ptr: np.ndarray, posting_docs: np.ndarray, posting_weights: np.ndarray, doc_count: int):
+        """
+        Índice BM25 en formato CSR: las entradas del término `t` ocupan
+        `posting_docs/posting_weights[term_ptr[t]:term_ptr[t + 1]]`. Los pesos ya incluyen
+        idf y la normalización por longitud, así que puntuar una consulta es una suma.
+        """
+        self.vocab = vocab
+        self.term_ids = {term: i for i, term in enumerate(vocab)}
+        self.term_ptr = term_ptr
+        self.posting_docs = posting_docs
+        self.posting_weights = posting_weights
+        self.doc_count = doc_count
+
+    @classmethod
+    def build(cls, documents: List[List[str]], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        vocab_ids: Dict[str, int] = {}
+        doc_ids, term_ids, counts = [], [], []
+        for doc_id, tokens in enumerate(documents):
+            terms, tf = np.unique([vocab_ids.setdefault(token, len(vocab_ids)) for token in tokens], return_counts=True)
+            doc_ids.append(np.full(len(terms), doc_id, dtype=np.int32))
+            term_ids.append(terms.astype(np.int32))
+            counts.append(tf.astype(np.float32))
+
+        doc_count = len(documents)
+        vocab = sorted(vocab_ids, key=vocab_ids.get)
+        if not vocab:
+            return cls(vocab, np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32), doc_count)
+
+        doc_ids, term_ids, tf = np.concatenate(doc_ids), np.concatenate(term_ids), np.concatenate(counts)
+        doc_len = np.array([len(tokens) for tokens in documents], dtype=np.float32)
+        avg_len = max(float(doc_len.mean()), 1.0)
+        df = np.bincount(term_ids, minlength=len(vocab)).astype(np.float32)
+        idf = np.log1p((doc_count - df + 0.5) / (df + 0.5))
+        weights = idf[term_ids] * tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len[doc_ids] / avg_len))
+
+        order = np.argsort(term_ids, kind="stable")
+        term_ptr = np.concatenate([[0], np.cumsum(np.bincount(term_ids, minlength=len(vocab)))]).astype(np.int64)
+        return cls(vocab, term_ptr, doc_ids[order], weights[order].astype(np.float32), doc_count)
+
+    def postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.term_ptr[term_id], self.term_ptr[term_id + 1]
+        return self.posting_docs[start:end], self.posting_weights[start:end]
+
+    def score(self, terms: List[str]) -> np.ndarray:
+        scores = np.zeros(self.doc_count, dtype=np.float32)
+        for term in set(terms):
+            term_id = self.term_ids.get(term)
+            if term_id is not None:
+                docs, weights = self.postings(term_id)
+                scores[docs] += weights
+        return scores
+
+    def document_frequency(self) -> np.ndarray:
+        return np.diff(self.term_ptr)
+
+    def posting_terms(self) -> np.ndarray:
+        return np.repeat(np.arange(len(self.vocab), dtype=np.int32), self.document_frequency())
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            vocab=np.array(self.vocab, dtype=np.str_),
+            term_ptr=self.term_ptr,
+            posting_docs=self.posting_docs,
+            posting_weights=self.posting_weights,
+            doc_count=np.array(self.doc_count),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path) as data:
+            return cls(
+                data["vocab"].tolist(),
+                data["term_ptr"],
+                data["posting_docs"],
+                data["posting_weights"],
+                int(data["doc_count"]),
+            )
+
+
+def split_passages(technical_context: str, passage_tokens: int = PASSAGE_TOKENS) -> Tuple[str, List[str], List[Passage]]:
+    """
+    Divide el contexto en (cabecera, cabeceras de sección, pasajes). Cada tabla o documento
+    se trocea por líneas en pasajes de ~`passage_tokens`; los pasajes repetidos (pies de página,
+    avisos legales...) se descartan.
+    """
+    header: List[str] = []
+    leads: List[str] = []
+    bodies: List[List[str]] = []
+    for line in technical_context.splitlines():
+        if is_section_start(line):
+            leads.append(line)
+            bodies.append([])
+        elif bodies:
+            bodies[-1].append(line)
+        else:
+            header.append(line)
+
+    max_chars = passage_tokens * 4
+    passages: List[Passage] = []
+    seen = set()
+    for section, lines in enumerate(bodies):
+        current: List[str] = []
+        size = 0
+        for line in lines + [None]:
+            if current and (line is None or size + len(line) > max_chars):
+                text = "\n".join(current).strip("\n")
+                fingerprint = " ".join(tokenize(text))
+                if text.strip() and fingerprint not in seen:
+                    seen.add(fingerprint)
+                    passages.append(Passage(section, text, estimate_tokens(text)))
+                current, size = [], 0
+            if line is not None:
+                current.append(line)
+                size += len(line) + 1
+    return "\n".join(header).strip(), leads, passages
+
+
+class ContextSelector:
+    def __init__(self, token_budget: int = CONTEXT_TOKEN_BUDGET, top_k: int = TOP_K_PER_DOMAIN, max_domains: int = MAX_DOMAINS, passage_tokens: int = PASSAGE_TOKENS, index_dir: str = INDEX_DIR):
+        """
+        Etapa entre la ingesta y el generador: cuando el contexto supera `token_budget`,
+        lo trocea en pasajes, los indexa con BM25 (persistido en `index_dir` por hash del
+        contenido) y conserva los `top_k` pasajes más relevantes de cada dominio inferido,
+        repartiendo el presupuesto entre dominios.
+        """
+        self.token_budget = token_budget
+        self.top_k = top_k
+        self.max_domains = max(1, max_domains)
+        self.passage_tokens = passage_tokens
+        self.index_dir = index_dir
+        # Dominios de la última selección: [{"domain", "terms", "passages", "tokens"}]
+        self.last_domains: List[Dict] = []
+
+    def select(self, technical_context: str) -> str:
+        self.last_domains = []
+        total_tokens = estimate_tokens(technical_context)
+        if self.token_budget <= 0 or total_tokens <= self.token_budget:
+            return technical_context
+
+        header, leads, passages = split_passages(technical_context, self.passage_tokens)
+        if not passages:
+            return technical_context
+
+        index = self._load_or_build_index(passages)
+        domains = self._infer_domains(index)
+        lead_tokens = [estimate_tokens(lead) for lead in leads]
+        selected = self._select_passages(passages, lead_tokens, index, domains, self.token_budget - estimate_tokens(header))
+
+        result = self._render(header, leads, passages, selected)
+        print(
+            f"🎯 Contexto reducido de ~{total_tokens} a ~{estimate_tokens(result)} tokens: "
+            f"{len(selected)}/{len(passages)} pasajes en {len(self.last_domains)} dominio(s) "
+            f"({', '.join(d['domain'] for d in self.last_domains)})."
+        )
+        return result
+
+    def _load_or_build_index(self, passages: List[Passage]) -> BM25Index:
+        digest = hashlib.sha256(INDEX_VERSION.encode("utf-8"))
+        for passage in passages:
+            digest.update(passage.text.encode("utf-8"))
+            digest.update(b"\0")
+        path = os.path.join(self.index_dir, f"{digest.hexdigest()}.npz")
+
+        try:
+            index = BM25Index.load(path)
+            os.utime(path)  # LRU: marca el acceso
+            print(f"⚡ Índice de pasajes reutilizado ({index.doc_count} pasajes).")
+            return index
+        except (OSError, ValueError, KeyError):
+            pass
+
+        index = BM25Index.build([tokenize(passage.text) for passage in passages])
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            index.save(path)
+            self._evict()
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el índice de pasajes: {e}")
+        return index
+
+    def _evict(self):
+        files = sorted(
+            (os.path.join(self.index_dir, name) for name in os.listdir(self.index_dir) if name.endswith(".npz")),
+            key=os.path.getmtime,
+            reverse=True,
+        )
+        for path in files[INDEX_MAX_FILES:]:
+            os.remove(path)
+
+    def _infer_domains(self, index: BM25Index) -> List[Tuple[str, List[str]]]:
+        """
+        Infiere dominios a partir de términos semilla: términos con más peso BM25 total que
+        aparecen en varios pasajes sin ser ubicuos (el texto repetitivo queda fuera). Se descartan
+        semillas que cubren casi los mismos pasajes que otra ya elegida. Cada dominio se consulta
+        con su semilla y los términos que más pesan en los pasajes donde aparece.
+        """
+        df = index.document_frequency()
+        if not len(df):
+            return []
+        posting_terms = index.posting_terms()
+        term_weight = np.bincount(posting_terms, weights=index.posting_weights, minlength=len(df))
+        max_df = max(2, int(0.5 * index.doc_count))
+        candidates = np.flatnonzero((df >= min(2, index.doc_count)) & (df <= max_df))
+        candidates = candidates[np.argsort(-term_weight[candidates], kind="stable")]
+
+        domains: List[Tuple[str, List[str]]] = []
+        chosen_docs: List[set] = []
+        for term_id in candidates:
+            if index.vocab[term_id].isdigit():
+                continue
+            docs = set(index.postings(term_id)[0].tolist())
+            if any(len(docs & other) / len(docs | other) > 0.5 for other in chosen_docs):
+                continue
+            in_domain = np.isin(index.posting_docs, list(docs))
+            related = np.bincount(posting_terms[in_domain], weights=index.posting_weights[in_domain], minlength=len(df))
+            related[term_id] = 0
+            related[df > max_df] = 0
+            query = [index.vocab[term_id]] + [index.vocab[t] for t in np.argsort(-related, kind="stable")[:4] if related[t] > 0]
+            domains.append((index.vocab[term_id], query))
+            chosen_docs.append(docs)
+            if len(domains) >= self.max_domains:
+                break
+        return domains
+
+    def _select_passages(self, passages: List[Passage], lead_tokens: List[int], index: BM25Index, domains: List[Tuple[str, List[str]]], budget: int) -> List[int]:
+        if domains:
+            scores = np.vstack([index.score(query) for _, query in domains])
+        else:
+            # Sin dominios distinguibles: un único dominio ordenado por densidad de información
+            scores = np.bincount(index.posting_docs, weights=index.posting_weights, minlength=index.doc_count)[None, :]
+            domains = [("general", [])]
+
+        # Cada pasaje pertenece al dominio que mejor lo puntúa; los que no puntúan en ninguno se descartan
+        owner = scores.argmax(axis=0)
+        ranked = []
+        for d in range(len(domains)):
+            members = np.flatnonzero((owner == d) & (scores[d] > 0))
+            ranked.append(members[np.argsort(-scores[d][members], kind="stable")][:self.top_k].tolist())
+
+        # Turnos: cada dominio toma su siguiente mejor pasaje mientras quede presupuesto
+        # (la cabecera de la tabla/documento cuenta la primera vez que se usa uno de sus pasajes)
+        selected, used = [], 0
+        sections = set()
+        taken = [0] * len(domains)
+        cursors = [0] * len(domains)
+        while any(cursor < len(r) for cursor, r in zip(cursors, ranked)):
+            for d, candidates in enumerate(ranked):
+                while cursors[d] < len(candidates):
+                    passage = passages[candidates[cursors[d]]]
+                    cost = passage.tokens + (0 if passage.section in sections else lead_tokens[passage.section])
+                    cursors[d] += 1
+                    if used + cost <= budget:
+                        selected.append(candidates[cursors[d] - 1])
+                        sections.add(passage.section)
+                        used += cost
+                        taken[d] += 1
+                        break
+
+        tokens_by_domain = [sum(passages[p].tokens for p in selected if owner[p] == d) for d in range(len(domains))]
+        self.last_domains = [
+            {"domain": name, "terms": query, "passages": taken[d], "tokens": tokens_by_domain[d]}
+            for d, (name, query) in enumerate(domains)
+        ]
+        return sorted(selected)
+
+    @staticmethod
+    def _render(header: str, leads: List[str], passages: List[Passage], selected: List[int]) -> str:
+        # Orden original; la cabecera de cada tabla/documento se escribe una sola vez
+        parts = [header] if header else []
+        current_section: Optional[int] = None
+        for passage_id in selected:
+            passage = passages[passage_id]
+            if passage.section != current_section:
+                parts.append(leads[passage.section])
+                current_section = passage.section
+            parts.append(passage.text)
+        return "\n".join(parts)
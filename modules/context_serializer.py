@@ -0,0 +1,120 @@
+import json
+import os
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# "text" (formato indentado original) | "tsv" | "json"
+CONTEXT_FORMAT = os.getenv("GLOSSARY_CONTEXT_FORMAT", "text")
+CONTEXT_FORMATS = ("text", "tsv", "json")
+
+# Explicación del formato que se añade al prompt (el formato "text" se explica solo)
+FORMAT_NOTES = {
+    "text": "",
+    "tsv": (
+        "El contexto usa un formato compacto separado por tabuladores: cada tabla empieza por "
+        "'Table: <nombre><TAB><descripción>' y cada línea siguiente es '<columna><TAB><tipo><TAB><descripción>'. "
+        "Los tipos se abrevian según la leyenda 'Tipos'. Las referencias '#n' remiten a las columnas "
+        "comunes definidas una sola vez en 'Columnas comunes'."
+    ),
+    "json": (
+        "El contexto usa JSON minificado, un valor por línea: cada tabla es una línea 'Table: <nombre>' "
+        "seguida, si tiene descripción, de '{\"d\": descripción}' y de una línea por columna, "
+        "[nombre, tipo, descripción] o una referencia \"#n\" a las columnas comunes. "
+        "Los tipos se abrevian según la leyenda 'Tipos'."
+    ),
+}
+
+_TYPE_CODES = {
+    "STRING": "S", "INT64": "I", "INTEGER": "I", "FLOAT64": "F", "FLOAT": "F", "NUMERIC": "N",
+    "BIGNUMERIC": "BN", "BOOL": "B", "BOOLEAN": "B", "DATE": "D", "DATETIME": "DT", "TIMESTAMP": "TS",
+    "TIME": "T", "BYTES": "BY", "RECORD": "R", "STRUCT": "R", "JSON": "J", "GEOGRAPHY": "G",
+}
+
+
+def _clean(value: str) -> str:
+    # Tabuladores y saltos de línea romperían el formato por líneas
+    return " ".join((value or "").split())
+
+
+def _type_legend(tables: List[Dict]) -> Dict[str, str]:
+    codes: Dict[str, str] = {}
+    for table in tables:
+        for column in table["columns"]:
+            column_type = column["type"]
+            if column_type not in codes:
+                # Tipos sin abreviatura conocida (ARRAY<...>, etc.) se dejan tal cual
+                codes[column_type] = _TYPE_CODES.get(column_type, column_type)
+    return codes
+
+
+def _shared_columns(tables: List[Dict]) -> Dict[Tuple[str, str, str], str]:
+    """Columnas idénticas (nombre, tipo, descripción) presentes en 2+ tablas -> referencia '#n'."""
+    counts = Counter(
+        (column["name"], column["type"], _clean(column.get("description")))
+        for table in tables
+        for column in {(c["name"], c["type"], _clean(c.get("description"))): c for c in table["columns"]}.values()
+    )
+    shared = [key for key, count in counts.items() if count > 1]
+    return {key: f"#{index + 1}" for index, key in enumerate(sorted(shared))}
+
+
+def _header(dataset_id: str, codes: Dict[str, str], shared: Dict[Tuple[str, str, str], str], fmt: str) -> List[str]:
+    lines = [f"Dataset: {dataset_id}"]
+    legend = {code: column_type for column_type, code in codes.items() if code != column_type}
+    if legend:
+        lines.append("Tipos: " + " ".join(f"{code}={column_type}" for code, column_type in sorted(legend.items())))
+    if shared:
+        lines.append("Columnas comunes:")
+        for (name, column_type, description), ref in sorted(shared.items(), key=lambda item: int(item[1][1:])):
+            if fmt == "json":
+                column = [name, codes[column_type], description] if description else [name, codes[column_type]]
+                lines.append(f"{ref} " + json.dumps(column, ensure_ascii=False, separators=(",", ":")))
+            else:
+                lines.append("\t".join([ref, name, codes[column_type], description]).rstrip("\t"))
+    return lines
+
+
+def serialize_tables(dataset_id: str, tables: List[Dict], fmt: str = CONTEXT_FORMAT) -> str:
+    """
+    Serializa los metadatos de tablas (formato de BigQueryMetadataReader.tables) para el prompt.
+    Los formatos compactos abrevian los tipos y definen una sola vez las columnas repetidas entre
+    tablas. Todas las tablas empiezan por 'Table: ', así el troceado map-reduce sigue funcionando.
+    """
+    if fmt not in CONTEXT_FORMATS:
+        raise ValueError(f"Formato de contexto desconocido: {fmt} (opciones: {', '.join(CONTEXT_FORMATS)})")
+    if fmt == "text":
+        # Import diferido: bigquery_reader importa este módulo
+        from modules.bigquery_reader import render_context
+        return render_context(dataset_id, tables)
+
+    codes = _type_legend(tables)
+    shared = _shared_columns(tables)
+    lines = _header(dataset_id, codes, shared, fmt)
+    for table in tables:
+        description = _clean(table.get("description"))
+        columns = []
+        for column in table["columns"]:
+            key = (column["name"], column["type"], _clean(column.get("description")))
+            if key in shared:
+                columns.append(shared[key])
+            elif fmt == "json":
+                columns.append([key[0], codes[key[1]], key[2]] if key[2] else [key[0], codes[key[1]]])
+            else:
+                columns.append("\t".join([key[0], codes[key[1]], key[2]]).rstrip("\t"))
+
+        if fmt == "json":
+            # Una columna por línea: el troceado por líneas (map-reduce, pasajes, presupuesto)
+            # corta en límites de columna y cada línea sigue siendo JSON válido
+            lines.append(f"Table: {table['table_id']}")
+            if description:
+                lines.append(json.dumps({"d": description}, ensure_ascii=False, separators=(",", ":")))
+            lines.extend(json.dumps(column, ensure_ascii=False, separators=(",", ":")) for column in columns)
+        else:
+            lines.append(f"Table: {table['table_id']}\t{description}".rstrip("\t"))
+            # Referencias a columnas comunes consecutivas en una sola línea
+            for column in columns:
+                if column.startswith("#") and lines[-1].startswith("#"):
+                    lines[-1] += f" {column}"
+                else:
+                    lines.append(column)
+    return "\n".join(lines)
@@ -32,15 +32,23 @@ class DataplexClient:
     
     # RE-WRITING CLASS TO USE DATA CATALOG (Correct API for Glossaries)
     
+import json
+import os
+import threading
 from google.cloud import dataplex_v1
-from google.api_core.exceptions import AlreadyExists, NotFound
+from google.api_core.exceptions import AlreadyExists, NotFound, ResourceExhausted, ServiceUnavailable
+from core.client_pool import dataplex_glossary_client
+from modules.concurrency import RateLimiter, run_parallel
+
+# Resumable purge checkpoints
+PURGE_CHECKPOINT_DIR = os.path.join("output", ".cache")
 
 class DataplexGlossaryClient:
     def __init__(self, project_id: str, location: str):
         self.project_id = project_id
         self.location = location
         self.parent = f"projects/{project_id}/locations/{location}"
-        self.client = dataplex_v1.BusinessGlossaryServiceClient()
+        self.client = dataplex_glossary_client()
 
     def create_or_update_glossary(self, glossary_id: str, display_name: str, description: str = ""):
         glossary_name = f"{self.parent}/glossaries/{glossary_id}"
@@ -68,46 +76,168 @@ class DataplexGlossaryClient:
             # But technically we should call update_glossary.
             pass
 
-    def delete_glossary(self, glossary_id: str):
-        """Deletes the glossary and all its children (categories/terms) if it exists."""
-        glossary_name = f"{self.parent}/glossaries/{glossary_id}"
-        print(f"Checking for existing glossary: {glossary_id}...")
-        
+    def glossary_name(self, glossary_id: str) -> str:
+        return f"{self.parent}/glossaries/{glossary_id}"
+
+    def list_categories(self, glossary_id: str) -> list:
+        """Lists all categories of the glossary (empty list if the glossary does not exist)."""
+        try:
+            return list(self.client.list_glossary_categories(parent=self.glossary_name(glossary_id)))
+        except NotFound:
+            return []
+
+    def list_terms(self, glossary_id: str) -> list:
+        """Lists all terms of the glossary (empty list if the glossary does not exist)."""
         try:
-             # Check if glossary exists first to avoid unnecessary API calls if it's missing
-             try:
-                 self.client.get_glossary(name=glossary_name)
-             except NotFound:
-                 print("Glossary does not exist. Proceeding to creation...")
-                 return
-
-             # 1. Delete all Categories
-             # Note: Deleting a category moves its terms to the glossary root (parent), so we delete categories first.
-             print(f"Clearing categories from {glossary_id}...")
-             categories = self.client.list_glossary_categories(parent=glossary_name)
-             for cat in categories:
-                 # print(f"Deleting category: {cat.name}")
-                 self.client.delete_glossary_category(name=cat.name)
-            
-             # 2. Delete all Terms
-             # Now deleting all terms (including those moved from categories)
-             print(f"Clearing terms from {glossary_id}...")
-             terms = self.client.list_glossary_terms(parent=glossary_name)
-             for term in terms:
-                 # print(f"Deleting term: {term.name}")
-                 self.client.delete_glossary_term(name=term.name)
-
-             # 3. Delete Glossary
-             print(f"Deleting glossary {glossary_id}...")
-             operation = self.client.delete_glossary(name=glossary_name)
-             operation.result() # Wait for deletion
-             print("Glossary deleted successfully.")
+            return list(self.client.list_glossary_terms(parent=self.glossary_name(glossary_id)))
+        except NotFound:
+            return []
+
+    def update_category(self, glossary_id: str, category_id: str, display_name: str, description: str, labels: dict = None):
+        from google.protobuf import field_mask_pb2
+        category = dataplex_v1.GlossaryCategory(
+            name=f"{self.glossary_name(glossary_id)}/categories/{category_id}",
+            display_name=display_name,
+            description=description,
+            labels=labels
+        )
+        update_mask = field_mask_pb2.FieldMask(paths=["display_name", "description", "labels"])
+        self.client.update_glossary_category(category=category, update_mask=update_mask)
+
+    def update_term(self, glossary_id: str, term_id: str, display_name: str, description: str, parent_category_id: str = None, labels: dict = None):
+        from google.protobuf import field_mask_pb2
+        glossary_name = self.glossary_name(glossary_id)
+        term = dataplex_v1.GlossaryTerm(
+            name=f"{glossary_name}/terms/{term_id}",
+            display_name=display_name,
+            description=description,
+            labels=labels
+        )
+        paths = ["display_name", "description", "labels"]
+        if "parent" in term.__class__.meta.fields:
+            term.parent = f"{glossary_name}/categories/{parent_category_id}" if parent_category_id else glossary_name
+            paths.append("parent")
+        update_mask = field_mask_pb2.FieldMask(paths=paths)
+        self.client.update_glossary_term(term=term, update_mask=update_mask)
 
+    def delete_category(self, name: str):
+        self.client.delete_glossary_category(name=name)
+
+    def delete_term(self, name: str):
+        self.client.delete_glossary_term(name=name)
+
+    def delete_glossary(self, glossary_id: str, max_workers: int = 8, qps: float = 10):
+        """Deletes the glossary and all its children (categories/terms) if it exists."""
+        try:
+             self.purge_glossary(glossary_id, max_workers=max_workers, qps=qps)
         except Exception as e:
              print(f"Error cleaning up/deleting glossary: {e}")
              # We raise to stop execution if cleanup fails, as creation might fail too
              raise e
 
+    def purge_glossary(self, glossary_id: str, delete_root: bool = True, max_workers: int = 8, qps: float = 10, checkpoint_dir: str = PURGE_CHECKPOINT_DIR) -> dict:
+        """
+        Deletes all categories and terms of the glossary concurrently (bounded pool, QPS limit,
+        retries on transient errors) and optionally the glossary itself.
+
+        Progress is checkpointed per phase; if a previous purge was interrupted, the completed
+        phases are skipped and the current one resumes by re-listing the remaining resources
+        (already deleted resources are simply no longer listed). A checkpoint is only trusted
+        after re-listing confirms its completed phases are still empty (resources may have been
+        recreated since, e.g. by a later publish). Returns deletion counts.
+        """
+        glossary_name = self.glossary_name(glossary_id)
+        checkpoint_path = os.path.join(checkpoint_dir, f"purge_{glossary_id}.json")
+        state = {"phase": "categories", "categories_deleted": 0, "terms_deleted": 0, "failed": 0}
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path, "r", encoding="utf-8") as f:
+                state.update(json.load(f))
+            # Failures of the interrupted run are retried now; only count this run's failures
+            state["failed"] = 0
+            print(f"Resuming purge of {glossary_id} from phase '{state['phase']}' ({state})...")
+
+        def save_state():
+            os.makedirs(checkpoint_dir, exist_ok=True)
+            with open(checkpoint_path, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+
+        print(f"Checking for existing glossary: {glossary_id}...")
+        try:
+            self.client.get_glossary(name=glossary_name)
+        except NotFound:
+            print("Glossary does not exist. Proceeding to creation...")
+            if os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+            return state
+
+        # Verify the phases the checkpoint marks as completed are still empty
+        if state["phase"] != "categories" and self.list_categories(glossary_id):
+            print("Checkpoint is stale: categories exist again. Restarting from phase 'categories'.")
+            state["phase"] = "categories"
+        elif state["phase"] in ("glossary", "done") and self.list_terms(glossary_id):
+            print("Checkpoint is stale: terms exist again. Restarting from phase 'terms'.")
+            state["phase"] = "terms"
+
+        rate_limiter = RateLimiter(qps)
+
+        def delete_all(kind: str, resources: list, delete_fn) -> int:
+            total = len(resources)
+            done = 0
+            lock = threading.Lock()
+
+            def ignore_not_found(name):
+                try:
+                    delete_fn(name=name)
+                except NotFound:
+                    pass  # Already deleted (e.g. by an interrupted previous run)
+
+            def on_result(result):
+                nonlocal done
+                with lock:
+                    done += 1
+                    if done == total or done % 50 == 0:
+                        print(f"Deleting {kind}: {done}/{total}")
+
+            results = run_parallel(
+                [(r.name, f"DELETE_{kind.upper()}", lambda n=r.name: ignore_not_found(n)) for r in resources],
+                max_workers=max_workers,
+                rate_limiter=rate_limiter,
+                on_result=on_result
+            )
+            failed = sum(1 for r in results if r.outcome != "SUCCESS")
+            state["failed"] += failed
+            if failed:
+                save_state()
+                raise RuntimeError(f"{failed} {kind} could not be deleted; re-run purge_glossary to resume.")
+            return total
+
+        # 1. Delete all Categories
+        # Note: Deleting a category moves its terms to the glossary root (parent), so we delete categories first.
+        if state["phase"] == "categories":
+            print(f"Clearing categories from {glossary_id}...")
+            state["categories_deleted"] += delete_all("categories", self.list_categories(glossary_id), self.client.delete_glossary_category)
+            state["phase"] = "terms"
+            save_state()
+
+        # 2. Delete all Terms (including those moved from categories)
+        if state["phase"] == "terms":
+            print(f"Clearing terms from {glossary_id}...")
+            state["terms_deleted"] += delete_all("terms", self.list_terms(glossary_id), self.client.delete_glossary_term)
+            state["phase"] = "glossary" if delete_root else "done"
+            save_state()
+
+        # 3. Delete Glossary
+        if state["phase"] == "glossary":
+            print(f"Deleting glossary {glossary_id}...")
+            operation = self.client.delete_glossary(name=glossary_name)
+            operation.result() # Wait for deletion
+            print("Glossary deleted successfully.")
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        print(f"Purge of {glossary_id} completed: {state['categories_deleted']} categories, {state['terms_deleted']} terms deleted.")
+        return state
+
     def create_category(self, glossary_id: str, category_id: str, display_name: str, description: str, labels: dict = None):
         glossary_name = f"{self.parent}/glossaries/{glossary_id}"
         
@@ -140,8 +270,10 @@ class DataplexGlossaryClient:
                     print(f"Category '{display_name}' updated successfully.")
                 except Exception as update_err:
                     print(f"Error updating category {category_id}: {update_err}")
+                    raise update_err
             else:
                 print(f"Error creating category {category_id}: {e}")
+                raise e
 
     def create_term(self, glossary_id: str, term_id: str, display_name: str, description: str, parent_category_id: str = None, is_category: bool = False, labels: dict = None):
         glossary_name = f"{self.parent}/glossaries/{glossary_id}"
@@ -196,6 +328,9 @@ class DataplexGlossaryClient:
                  except Exception as update_err:
                      print(f"Error updating term {term_id}: {update_err}")
                      raise update_err
+             elif isinstance(e, (ResourceExhausted, ServiceUnavailable)):
+                 # Transient quota/availability errors are retried by the caller, not moved to root
+                 raise e
              else:
                  # Fallback: if category parent fails due to stricter validation, try creating under glossary directly
                  print(f"Error creating term {term_id} under category: {e}. Trying root...")
@@ -1,16 +1,247 @@
+import gzip
 import io
+import json
+import multiprocessing
 import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
 import google.auth
 from pypdf import PdfReader
 
+from modules.concurrency import submit_in_context
+
+DRIVE_DOWNLOAD_WORKERS = int(os.getenv("DRIVE_DOWNLOAD_WORKERS", "8"))
+DRIVE_EXTRACT_WORKERS = int(os.getenv("DRIVE_EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+SYNC_STATE_DIR = os.path.join("output", ".cache")
+TEXT_CACHE_DIR = os.path.join("output", ".cache", "drive_text")
+TEXT_CACHE_MAX_BYTES = int(os.getenv("DRIVE_TEXT_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+# Límites de texto extraído (bytes UTF-8) por documento y por ejecución; 0 = sin límite
+MAX_DOCUMENT_BYTES = int(os.getenv("DRIVE_MAX_DOCUMENT_BYTES", str(5 * 1024 * 1024)))
+MAX_CONTEXT_BYTES = int(os.getenv("DRIVE_MAX_CONTEXT_BYTES", str(50 * 1024 * 1024)))
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+PDF_MIME_TYPE = "application/pdf"
+
+
+def iter_pdf_pages(path: str) -> Iterator[str]:
+    """
+    Genera el texto de cada página del PDF de una en una; pypdf lee el fichero
+    bajo demanda, sin cargar el documento completo en memoria.
+    """
+    with open(path, "rb") as f:
+        pdf = PdfReader(f)
+        for page in pdf.pages:
+            extracted = page.extract_text()
+            if extracted:
+                yield extracted
+
+
+def extract_pdf_pages(path: str, max_bytes: int = MAX_DOCUMENT_BYTES) -> List[str]:
+    """
+    Extrae el texto de cada página de un PDF descargado en disco, hasta `max_bytes`.
+    Función de módulo para poder ejecutarse en un pool de procesos (CPU-bound).
+    """
+    pages = []
+    total = 0
+    for text in iter_pdf_pages(path):
+        size = len(text.encode("utf-8"))
+        if max_bytes and total + size > max_bytes:
+            pages.append(text.encode("utf-8")[:max_bytes - total].decode("utf-8", "ignore"))
+            break
+        pages.append(text)
+        total += size
+    return pages
+
+
+class ExtractedTextCache:
+    def __init__(self, cache_dir: str = TEXT_CACHE_DIR, max_bytes: int = TEXT_CACHE_MAX_BYTES):
+        """
+        Caché en disco del texto extraído de cada PDF, por página y comprimido (gzip),
+        indexada por ID de fichero de Drive + md5Checksum. Si el directorio supera `max_bytes`
+        se eliminan las entradas usadas hace más tiempo.
+        El directorio puede compartirse entre trabajos concurrentes: la caché es best-effort
+        y un error de disco nunca hace perder un PDF ya extraído.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, item: dict) -> Optional[str]:
+        version = item.get("md5Checksum")
+        if not version:
+            return None
+        return os.path.join(self.cache_dir, f"{item['id']}_{version}.json.gz")
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # Ya eliminado por otro trabajo
+
+    def get(self, item: dict) -> Optional[List[str]]:
+        path = self._path(item)
+        with self._lock:
+            if path:
+                try:
+                    with gzip.open(path, "rt", encoding="utf-8") as f:
+                        pages = json.load(f)
+                except FileNotFoundError:
+                    pages = None
+                except (OSError, ValueError):
+                    # Entrada corrupta: se descarta y se vuelve a extraer
+                    self._remove(path)
+                    pages = None
+                if pages is not None:
+                    try:
+                        os.utime(path)  # LRU: marca el acceso
+                    except OSError:
+                        pass
+                    self.hits += 1
+                    self.bytes_saved += int(item.get("size", 0))
+                    return pages
+            self.misses += 1
+            return None
+
+    def put(self, item: dict, pages: List[str]):
+        path = self._path(item)
+        if not path:
+            return
+        with self._lock:
+            tmp_path = None
+            try:
+                # Las versiones anteriores del mismo fichero ya no sirven
+                for name in os.listdir(self.cache_dir):
+                    if name.startswith(f"{item['id']}_") and name.endswith(".json.gz") and name != os.path.basename(path):
+                        self._remove(os.path.join(self.cache_dir, name))
+                # Temporal único: varios trabajos pueden escribir el mismo PDF a la vez
+                fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+                with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+                    json.dump(pages, f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+                tmp_path = None
+                self._evict()
+            except OSError as e:
+                print(f"⚠️ No se pudo guardar el texto extraído en la caché: {e}")
+            finally:
+                if tmp_path:
+                    self._remove(tmp_path)
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            # Los temporales de otros trabajos en curso no cuentan ni se desalojan
+            if not name.endswith(".json.gz"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue  # Desalojada por otro trabajo
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "bytes_saved": self.bytes_saved}
+
+
+class DriveSyncState:
+    def __init__(self, folder_id: str, state_dir: str = SYNC_STATE_DIR):
+        """
+        Estado de sincronización incremental de una carpeta de Drive: md5Checksum y
+        modifiedTime de cada PDF procesado, la última propuesta generada a partir de ellos
+        y qué términos de esa propuesta salieron de cada PDF (procedencia, por id de fichero).
+        """
+        self.path = os.path.join(state_dir, f"drive_sync_{folder_id}.json")
+        self.files: Dict[str, dict] = {}
+        self.proposal_file: Optional[str] = None
+        self.provenance: Dict[str, List[str]] = {}
+        # PDFs procesados en esta ejecución, se confirman con commit() tras generar el glosario
+        self.pending: Dict[str, dict] = {}
+        self.pending_removed: List[str] = []
+
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.files = state.get("files", {})
+            self.proposal_file = state.get("proposal_file")
+            self.provenance = state.get("provenance", {})
+
+    @staticmethod
+    def _version(item: dict) -> str:
+        return item.get("md5Checksum") or item.get("modifiedTime", "")
+
+    def diff(self, items: List[dict]) -> Dict[str, List[dict]]:
+        current = {item["id"]: item for item in items}
+        changes = {"new": [], "changed": [], "removed": [], "unchanged": []}
+        for item in items:
+            known = self.files.get(item["id"])
+            if known is None:
+                changes["new"].append(item)
+            elif known.get("version") != self._version(item):
+                changes["changed"].append(item)
+            else:
+                changes["unchanged"].append(item)
+        changes["removed"] = [{"id": file_id, **info} for file_id, info in self.files.items() if file_id not in current]
+        return changes
+
+    def mark_processed(self, item: dict):
+        self.pending[item["id"]] = {"name": item["name"], "version": self._version(item)}
+
+    def commit(self, proposal_file: Optional[str] = None, provenance: Optional[Dict[str, List[str]]] = None):
+        self.files.update(self.pending)
+        for file_id in self.pending_removed:
+            self.files.pop(file_id, None)
+            self.provenance.pop(file_id, None)
+        self.pending, self.pending_removed = {}, []
+        if proposal_file:
+            self.proposal_file = proposal_file
+        if provenance is not None:
+            self.provenance = provenance
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files, "proposal_file": self.proposal_file, "provenance": self.provenance}, f, ensure_ascii=False, indent=2)
+
+
 class DrivePDFReader:
-    def __init__(self):
+    def __init__(self, max_download_workers: int = DRIVE_DOWNLOAD_WORKERS, max_extract_workers: int = DRIVE_EXTRACT_WORKERS, max_in_flight: int = None, text_cache: Optional[ExtractedTextCache] = None, use_text_cache: bool = True, max_document_bytes: int = MAX_DOCUMENT_BYTES, max_context_bytes: int = MAX_CONTEXT_BYTES):
         """
         Inicializa el cliente de lectura de Google Drive.
         Usa las Application Default Credentials (ADC).
+
+        Las descargas se hacen en un pool de hilos (`max_download_workers`) y la extracción
+        de texto en un pool de procesos (`max_extract_workers`). Como máximo `max_in_flight`
+        PDFs descargados pueden estar esperando extracción a la vez (backpressure).
+        Los PDFs sin cambios (mismo md5Checksum) se sirven desde la caché de texto extraído.
+
+        Los PDFs se descargan a ficheros temporales en disco (no en memoria) y el texto se
+        limita a `max_document_bytes` por documento y `max_context_bytes` por ejecución.
         """
+        self.max_download_workers = max(1, max_download_workers)
+        self.max_extract_workers = max(1, max_extract_workers)
+        self.max_in_flight = max_in_flight or 2 * self.max_download_workers
+        self.max_document_bytes = max_document_bytes
+        self.max_context_bytes = max_context_bytes
+        # El cliente de googleapiclient (httplib2) no es thread-safe: uno por hilo de descarga
+        self._local = threading.local()
+        self.text_cache = (text_cache or ExtractedTextCache()) if use_text_cache else None
+        self.sync_state: Optional[DriveSyncState] = None
+        self.last_changes: Optional[Dict[str, List[dict]]] = None
+        # Documentos escritos en el último contexto: ruta (marcador INICIO DOCUMENTO) -> id de fichero
+        self.last_documents: Dict[str, str] = {}
         try:
             # Autenticación automática con ADC
             self.credentials, self.project = google.auth.default(
@@ -22,10 +253,80 @@ class DrivePDFReader:
             print(f"❌ Error al autenticar Google Drive: {e}")
             self.service = None
 
-    def get_context_from_drive_folder(self, folder_id: str) -> str:
+    def _thread_service(self):
+        if not hasattr(self._local, "service"):
+            self._local.service = build('drive', 'v3', credentials=self.credentials, cache_discovery=False)
+        return self._local.service
+
+    def _download(self, file_id: str) -> str:
+        """
+        Descarga el fichero por trozos a un fichero temporal y devuelve su ruta.
+        El llamador es responsable de borrarlo.
+        """
+        request = self._thread_service().files().get_media(fileId=file_id)
+        fh = tempfile.NamedTemporaryFile(prefix="drive_", suffix=".pdf", delete=False)
+        try:
+            downloader = MediaIoBaseDownload(fh, request)
+            done = False
+            while done is False:
+                status, done = downloader.next_chunk()
+            return fh.name
+        except Exception:
+            fh.close()
+            os.remove(fh.name)
+            raise
+        finally:
+            fh.close()
+
+    def list_pdfs(self, folder_id: str, recursive: bool = True) -> List[dict]:
+        """
+        Lista todos los PDFs de la carpeta (todas las páginas de resultados) y, si `recursive`,
+        de sus subcarpetas. Cada elemento incluye 'path' relativo a la carpeta raíz.
+        """
+        pdfs = []
+        pending = [(folder_id, "")]
+        visited = set()
+        while pending:
+            current_id, prefix = pending.pop(0)
+            if current_id in visited:
+                continue
+            visited.add(current_id)
+
+            query = (
+                f"'{current_id}' in parents and trashed=false and "
+                f"(mimeType='{PDF_MIME_TYPE}' or mimeType='{FOLDER_MIME_TYPE}')"
+            )
+            page_token = None
+            while True:
+                results = self.service.files().list(
+                    q=query,
+                    spaces='drive',
+                    fields='nextPageToken, files(id, name, mimeType, md5Checksum, modifiedTime, size)',
+                    pageSize=1000,
+                    pageToken=page_token,
+                    supportsAllDrives=True,
+                    includeItemsFromAllDrives=True
+                ).execute()
+                for item in results.get('files', []):
+                    if item['mimeType'] == FOLDER_MIME_TYPE:
+                        if recursive:
+                            pending.append((item['id'], f"{prefix}{item['name']}/"))
+                    else:
+                        item['path'] = f"{prefix}{item['name']}"
+                        pdfs.append(item)
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    break
+
+        return sorted(pdfs, key=lambda item: item['path'])
+
+    def get_context_from_drive_folder(self, folder_id: str, recursive: bool = True, incremental: bool = False) -> str:
         """
-        Busca archivos PDF en la carpeta dada, los descarga en memoria,
+        Busca archivos PDF en la carpeta dada (y subcarpetas), los descarga en memoria,
         extrae su texto y devuelve el contenido consolidado.
+
+        Con `incremental`, solo se descargan los PDFs nuevos o modificados (md5Checksum /
+        modifiedTime) desde la última sincronización y el contexto contiene solo esos documentos.
         """
         import re
         
@@ -42,15 +343,10 @@ class DrivePDFReader:
             print("⚠️ Cliente de Google Drive no inicializado.")
             return ""
 
-        context_parts = []
+        self.sync_state = DriveSyncState(folder_id)
         try:
-            print(f"DEBUG: Buscando archivos PDF en la carpeta con ID '{folder_id}'...")
-            # Filtrar por mimetype PDF y padre igual a la carpeta
-            query = f"'{folder_id}' in parents and mimeType='application/pdf' and trashed=false"
-            results = self.service.files().list(
-                q=query, spaces='drive', fields='nextPageToken, files(id, name)'
-            ).execute()
-            items = results.get('files', [])
+            print(f"DEBUG: Buscando archivos PDF en la carpeta con ID '{folder_id}'{' (recursivo)' if recursive else ''}...")
+            items = self.list_pdfs(folder_id, recursive=recursive)
 
             if not items:
                 print(f"⚠️ No se encontraron archivos PDF en la carpeta '{folder_id}'.")
@@ -58,43 +354,171 @@ class DrivePDFReader:
 
             print(f"✅ Se encontraron {len(items)} archivo(s) PDF.")
 
+            changes = self.sync_state.diff(items)
+            self.last_changes = changes
+            self.sync_state.pending_removed = [item["id"] for item in changes["removed"]]
+            if incremental:
+                print(
+                    f"🔁 Sincronización incremental: {len(changes['new'])} nuevo(s), {len(changes['changed'])} modificado(s), "
+                    f"{len(changes['removed'])} eliminado(s), {len(changes['unchanged'])} sin cambios."
+                )
+                items = changes["new"] + changes["changed"]
+                if not items:
+                    return ""
+
+            final_context = self._extract_items(items)
+
+        except Exception as e:
+            print(f"❌ Error al recuperar archivos de Google Drive: {e}")
+            return ""
+
+        return final_context
+
+    def _extract_items(self, items: List[dict]) -> str:
+        """
+        Pipeline descarga (hilos, I/O) -> extracción (procesos, CPU). El contexto se escribe
+        de forma incremental, documento a documento, y conserva el orden de `items`
+        independientemente del orden en que terminen.
+        """
+        in_flight = threading.BoundedSemaphore(self.max_in_flight)
+
+        def remove_temp_file(path: Optional[str]):
+            # Un fichero ya borrado o bloqueado (antivirus en Windows) no debe bloquear el pipeline
+            if path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+        def download_and_dispatch(index: int, item: dict):
+            print(f"📥 [{index+1}/{len(items)}] Descargando y procesando: {item['path']}...")
+            path = None
+            try:
+                path = self._download(item['id'])
+                future = extractors.submit(extract_pdf_pages, path, self.max_document_bytes)
+            except Exception:
+                try:
+                    remove_temp_file(path)
+                finally:
+                    in_flight.release()
+                raise
+
+            def on_extracted(_):
+                # El permiso se libera siempre: si no, tras max_in_flight fallos acquire() se bloquea
+                try:
+                    remove_temp_file(path)
+                finally:
+                    in_flight.release()
+
+            future.add_done_callback(on_extracted)
+            return future
+
+        context = io.StringIO()
+        context_bytes = 0
+        documents = 0
+        self.last_documents = {}
+        # 'spawn' evita hacer fork de un proceso con hilos activos (Flask, pools de descarga)
+        with ThreadPoolExecutor(max_workers=self.max_download_workers) as downloads, \
+                ProcessPoolExecutor(max_workers=self.max_extract_workers, mp_context=multiprocessing.get_context("spawn")) as extractors:
+            submitted = []
             for index, item in enumerate(items):
-                file_id = item['id']
-                file_name = item['name']
-                print(f"📥 [{index+1}/{len(items)}] Descargando y procesando: {file_name}...")
-
-                # Descargar en memoria
-                request = self.service.files().get_media(fileId=file_id)
-                fh = io.BytesIO()
-                downloader = MediaIoBaseDownload(fh, request)
-                done = False
-                while done is False:
-                    status, done = downloader.next_chunk()
-                
-                # Extraer texto del PDF en memoria
-                fh.seek(0)
+                cached_pages = self.text_cache.get(item) if self.text_cache else None
+                if cached_pages is not None:
+                    print(f"⚡ [{index+1}/{len(items)}] {item['path']} servido desde la caché de texto.")
+                    submitted.append((item, None, cached_pages))
+                    continue
+                in_flight.acquire()
+                submitted.append((item, submit_in_context(downloads, download_and_dispatch, index, item), None))
+
+            for item, download_future, cached_pages in submitted:
+                file_name = item['path']
                 try:
-                    pdf = PdfReader(fh)
-                    text = ""
-                    for page_num in range(len(pdf.pages)):
-                        page = pdf.pages[page_num]
-                        extracted = page.extract_text()
-                        if extracted:
-                            text += extracted + "\n"
-                            
-                    if text.strip():
-                        context_parts.append(f"--- INICIO DOCUMENTO: {file_name} ---\n{text.strip()}\n--- FIN DOCUMENTO: {file_name} ---")
-                        print(f"✅ Texto extraído de {file_name} exitosamente.")
+                    if cached_pages is not None:
+                        pages = cached_pages
                     else:
+                        pages = download_future.result().result()
+                except Exception as pdf_err:
+                    print(f"❌ Error al leer o extraer texto del PDF {file_name}: {pdf_err}")
+                    continue
+                if cached_pages is None and self.text_cache:
+                    # Best-effort: put() no lanza errores de disco, pero nada de la caché debe descartar el PDF
+                    try:
+                        self.text_cache.put(item, pages)
+                    except Exception as cache_err:
+                        print(f"⚠️ No se pudo cachear el texto de {file_name}: {cache_err}")
+                try:
+                    if not any(page.strip() for page in pages):
                         print(f"⚠️ El archivo {file_name} está vacío o no contiene texto extraíble.")
+                        # Nada que enviar al modelo: se da por procesado para no descargarlo en cada ejecución
+                        if self.sync_state:
+                            self.sync_state.mark_processed(item)
+                        continue
+
+                    written, truncated = 0, True
+                    if not self.max_context_bytes or context_bytes < self.max_context_bytes:
+                        remaining = self.max_context_bytes - context_bytes if self.max_context_bytes else 0
+                        written, truncated = self._write_document(context, file_name, pages, documents > 0, remaining)
+                    if not written:
+                        print(f"⚠️ Límite de contexto alcanzado ({self.max_context_bytes} bytes); se omite {file_name}.")
+                        continue
+                    context_bytes += written
+                    documents += 1
+                    self.last_documents[file_name] = item["id"]
+                    # Solo se confirma un PDF cuyo texto ha entrado completo en el contexto: los omitidos
+                    # o recortados por el límite se vuelven a enviar en la siguiente ejecución incremental
+                    if truncated:
+                        print(f"⚠️ {file_name} recortado por el límite de contexto ({self.max_context_bytes} bytes); se reprocesará.")
+                    elif self.sync_state:
+                        self.sync_state.mark_processed(item)
+                    print(f"✅ Texto extraído de {file_name} exitosamente.")
                 except Exception as pdf_err:
                     print(f"❌ Error al leer o extraer texto del PDF {file_name}: {pdf_err}")
-                finally:
-                    fh.close()
 
-        except Exception as e:
-            print(f"❌ Error al recuperar archivos de Google Drive: {e}")
-            return ""
+        if self.text_cache:
+            stats = self.text_cache.stats()
+            print(f"📦 Caché de texto Drive: {stats['hits']} acierto(s), {stats['misses']} fallo(s), {stats['bytes_saved'] / 1024 / 1024:.1f} MB de descarga evitados.")
+        return context.getvalue()
 
-        final_context = "\n\n".join(context_parts)
-        return final_context
+    @staticmethod
+    def _write_document(context: io.StringIO, file_name: str, pages: List[str], separator: bool, max_bytes: int) -> Tuple[int, bool]:
+        """
+        Escribe un documento en el contexto página a página, sin construir el texto completo,
+        hasta `max_bytes` (0 = sin límite). Los marcadores INICIO/FIN se escriben siempre completos
+        (split_documents y la procedencia dependen de ellos) y sus bytes se reservan antes de recortar
+        el texto; si ni siquiera caben los marcadores no se escribe nada.
+        Devuelve (bytes escritos, texto recortado).
+        """
+        header = ("\n\n" if separator else "") + f"--- INICIO DOCUMENTO: {file_name} ---\n"
+        footer = f"\n--- FIN DOCUMENTO: {file_name} ---"
+        overhead = len(header.encode("utf-8")) + len(footer.encode("utf-8"))
+        if max_bytes and overhead >= max_bytes:
+            return 0, True
+
+        body_limit = max_bytes - overhead if max_bytes else 0
+        written = 0
+        truncated = False
+
+        def write(text: str) -> bool:
+            nonlocal written, truncated
+            size = len(text.encode("utf-8"))
+            if body_limit and written + size > body_limit:
+                # Un carácter multibyte cortado se descarta: se cuentan los bytes realmente escritos
+                partial = text.encode("utf-8")[:body_limit - written].decode("utf-8", "ignore")
+                context.write(partial)
+                written += len(partial.encode("utf-8"))
+                truncated = True
+                return False
+            context.write(text)
+            written += size
+            return True
+
+        context.write(header)
+        # Equivale a "\n".join(pages).strip(), pero página a página
+        pages = [page for page in pages if page.strip()]
+        if pages:
+            pages[0], pages[-1] = pages[0].lstrip(), pages[-1].rstrip()
+        for index, page in enumerate(pages):
+            if not write(("\n" if index else "") + page):
+                break
+        context.write(footer)
+        return written + overhead, truncated
@@ -0,0 +1,154 @@
+import re
+import unicodedata
+from typing import Dict, List
+
+# Aproximación habitual para modelos Gemini: ~4 caracteres por token
+CHARS_PER_TOKEN = 4
+
+_SECTION_START = re.compile(r"^(\s*Table: |--- INICIO DOCUMENTO: )")
+_LIST_FIELDS = ("related_terms", "synonym_terms", "contacts")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def is_section_start(line: str) -> bool:
+    """True si la línea abre una tabla (BigQuery) o un documento (Drive) del contexto."""
+    return bool(_SECTION_START.match(line))
+
+
+def split_sections(technical_context: str) -> List[str]:
+    """
+    Divide el contexto en secciones por tabla (BigQuery) o por documento (Drive).
+    La cabecera previa a la primera sección (p.ej. 'Dataset: X') se antepone a cada sección
+    para que cada trozo conserve su contexto.
+    """
+    header: List[str] = []
+    sections: List[List[str]] = []
+    for line in technical_context.splitlines():
+        if _SECTION_START.match(line):
+            sections.append([line])
+        elif sections:
+            sections[-1].append(line)
+        else:
+            header.append(line)
+
+    prefix = "\n".join(header).strip()
+    if not sections:
+        return [prefix] if prefix else []
+    return [
+        f"{prefix}\n" + "\n".join(lines).strip("\n") if prefix else "\n".join(lines).strip("\n")
+        for lines in sections
+    ]
+
+
+def _split_oversized(section: str, max_tokens: int) -> List[str]:
+    # Una sola tabla o documento mayor que el presupuesto: se corta por líneas y cada
+    # trozo repite la cabecera de la sección para no perder a qué tabla/documento pertenece
+    lines = section.splitlines()
+    lead_end = next((i + 1 for i, line in enumerate(lines) if _SECTION_START.match(line)), 0)
+    lead = "\n".join(lines[:lead_end])
+    max_chars = max(max_tokens * CHARS_PER_TOKEN - len(lead) - 1, CHARS_PER_TOKEN)
+    pieces, current, size = [], [], 0
+    for line in lines[lead_end:]:
+        while len(line) > max_chars:
+            if current:
+                pieces.append("\n".join(current))
+                current, size = [], 0
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        if size + len(line) + 1 > max_chars and current:
+            pieces.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        pieces.append("\n".join(current))
+    return [f"{lead}\n{piece}" if lead else piece for piece in pieces]
+
+
+def chunk_context(technical_context: str, max_tokens: int) -> List[str]:
+    """
+    Agrupa las secciones del contexto en trozos que no superan `max_tokens` (estimados).
+    El orden original de las secciones se conserva.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for section in split_sections(technical_context):
+        section_tokens = estimate_tokens(section)
+        if section_tokens > max_tokens:
+            if current:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            chunks.extend(_split_oversized(section, max_tokens))
+            continue
+        if current and current_tokens + section_tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(section)
+        current_tokens += section_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def normalize_key(value: str) -> str:
+    normalized = unicodedata.normalize("NFKD", value or "").encode("ascii", "ignore").decode("utf-8")
+    return re.sub(r"[^a-z0-9]+", "", normalized.lower())
+
+
+def _merge_term(target: Dict, source: Dict):
+    for key, value in source.items():
+        if key in _LIST_FIELDS:
+            existing = target.setdefault(key, [])
+            seen = {normalize_key(item) for item in existing}
+            for item in value or []:
+                if normalize_key(item) not in seen:
+                    existing.append(item)
+                    seen.add(normalize_key(item))
+        elif key == "labels":
+            labels = target.setdefault("labels", {})
+            for label_key, label_value in (value or {}).items():
+                labels.setdefault(label_key, label_value)
+        elif not target.get(key):
+            target[key] = value
+
+
+def merge_glossaries(partials: List[Dict]) -> Dict:
+    """
+    Paso 'reduce': fusiona glosarios parciales deduplicando categorías (por id o nombre)
+    y términos (por nombre, en todo el glosario). Gana la primera aparición y se completan
+    los campos vacíos y las listas con el resto. Los términos sin nombre no se deduplican.
+    """
+    categories: List[Dict] = []
+    categories_by_key: Dict[str, Dict] = {}
+    terms_by_key: Dict[str, Dict] = {}
+
+    for partial in partials:
+        for category in (partial or {}).get("glossary", {}).get("categories", []):
+            keys = [key for key in (normalize_key(category.get("id", "")), normalize_key(category.get("display_name", ""))) if key]
+            target = next((categories_by_key[key] for key in keys if key in categories_by_key), None)
+            if target is None:
+                target = {k: v for k, v in category.items() if k != "terms"}
+                target["terms"] = []
+                categories.append(target)
+            else:
+                _merge_term(target, {k: v for k, v in category.items() if k != "terms"})
+            for key in keys:
+                categories_by_key.setdefault(key, target)
+
+            for term in category.get("terms", []):
+                # Sin nombre no hay con qué deduplicar: cada término sin nombre se conserva por separado
+                term_key = normalize_key(term.get("term", ""))
+                if term_key and term_key in terms_by_key:
+                    _merge_term(terms_by_key[term_key], term)
+                    continue
+                merged_term = dict(term)
+                merged_term["parent_category"] = target.get("display_name", term.get("parent_category"))
+                target["terms"].append(merged_term)
+                if term_key:
+                    terms_by_key[term_key] = merged_term
+
+    return {"glossary": {"categories": categories}}
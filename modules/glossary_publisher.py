@@ -0,0 +1,231 @@
+import os
+import re
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from modules.concurrency import ItemResult, RateLimiter, run_parallel
+from modules.dataplex_client import DataplexGlossaryClient
+
+# Publicación en paralelo: tamaño del pool de trabajadores y límite global de peticiones por segundo
+PUBLISH_MAX_WORKERS = int(os.getenv("DATAPLEX_PUBLISH_WORKERS", "8"))
+PUBLISH_QPS = float(os.getenv("DATAPLEX_PUBLISH_QPS", "10"))
+
+
+def sanitize_id(value: str, max_length: int = 99) -> str:
+    """
+    Convierte un nombre visible / id del JSON en un ID de recurso válido de Dataplex
+    (ascii en minúsculas, dígitos y guiones simples).
+    """
+    # Normaliza a NFKD para separar los acentos y descarta lo que no es ascii
+    normalized = unicodedata.normalize('NFKD', value or "").encode('ascii', 'ignore').decode('utf-8')
+    # Espacios, guiones bajos y barras pasan a guiones; solo se conservan alfanuméricos y guiones
+    safe_id = re.sub(r'[^a-zA-Z0-9-]', '', normalized.lower().replace(" ", "-").replace("/", "-").replace("_", "-"))
+    # Sin guiones dobles
+    return re.sub(r'-+', '-', safe_id).strip('-')[:max_length].strip('-')
+
+
+def build_desired_state(data: dict) -> Tuple[Dict[str, dict], Dict[str, dict]]:
+    """
+    Traduce el JSON de una propuesta de glosario ({"glossary": {"categories": [...], "terms": [...]}})
+    al estado deseado en Dataplex: category_id -> campos y term_id -> campos.
+    """
+    glossary_data = data.get("glossary", {})
+    categories = glossary_data.get("categories", [])
+
+    desired_categories: Dict[str, dict] = {}
+    # ID original y display_name del JSON -> ID saneado para Dataplex
+    cat_id_map: Dict[str, str] = {}
+    # (término, id de su categoría): los términos pueden estar en la raíz o dentro de las categorías (salida estándar de Gemini)
+    terms = [(term, None) for term in glossary_data.get("terms", [])]
+    for cat in categories:
+        original_id = cat.get("id") or cat.get("display_name", "")
+        safe_id = sanitize_id(original_id)
+        cat_id_map[original_id] = safe_id
+        if cat.get("display_name"):
+            cat_id_map.setdefault(cat["display_name"], safe_id)
+        desired_categories[safe_id] = {
+            "display_name": cat.get("display_name", original_id),
+            # La API (v1) no admite overview; se completa manualmente.
+            "description": cat.get("description", ""),
+            "labels": cat.get("labels") or {},
+        }
+        terms.extend((term, safe_id) for term in cat.get("terms", []))
+
+    desired_terms: Dict[str, dict] = {}
+    for term, enclosing_cat_id in terms:
+        term_name = term.get("term", "Unnamed")
+        desired_terms[sanitize_id(term_name)] = {
+            "display_name": term_name,
+            # La descripción solo lleva la definición. Overview, términos relacionados,
+            # sinónimos y contactos se completan manualmente.
+            "description": term.get("definition", "No definition provided."),
+            "labels": term.get("labels") or {},
+            "parent_category_id": cat_id_map.get(term.get("parent_category")) or enclosing_cat_id,
+        }
+
+    return desired_categories, desired_terms
+
+
+@dataclass
+class GlossaryPlan:
+    """Operaciones de creación/actualización/borrado necesarias para que el glosario de Dataplex coincida con una propuesta."""
+    create_categories: List[Tuple[str, dict]] = field(default_factory=list)
+    update_categories: List[Tuple[str, dict]] = field(default_factory=list)
+    delete_categories: List[str] = field(default_factory=list)
+    create_terms: List[Tuple[str, dict]] = field(default_factory=list)
+    update_terms: List[Tuple[str, dict]] = field(default_factory=list)
+    delete_terms: List[str] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def is_empty(self) -> bool:
+        return not any([
+            self.create_categories, self.update_categories, self.delete_categories,
+            self.create_terms, self.update_terms, self.delete_terms,
+        ])
+
+    def summary(self) -> dict:
+        return {
+            "categories_created": len(self.create_categories),
+            "categories_updated": len(self.update_categories),
+            "categories_deleted": len(self.delete_categories),
+            "terms_created": len(self.create_terms),
+            "terms_updated": len(self.update_terms),
+            "terms_deleted": len(self.delete_terms),
+            "unchanged": self.unchanged,
+        }
+
+
+class GlossaryReconciler:
+    def __init__(self, client: DataplexGlossaryClient, glossary_id: str, max_workers: int = PUBLISH_MAX_WORKERS, qps: float = PUBLISH_QPS):
+        """
+        Publica una propuesta de glosario comparándola con el glosario actual de Dataplex
+        (listado una sola vez) y aplicando solo las diferencias, en lugar de borrar y recrear.
+        """
+        self.client = client
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(qps)
+        self.results: List[ItemResult] = []
+        self.glossary_id = glossary_id
+        self.glossary_name = client.glossary_name(glossary_id)
+
+    @staticmethod
+    def _resource_id(name: str) -> str:
+        return name.rsplit("/", 1)[-1]
+
+    def resource_name(self, result: ItemResult) -> str:
+        """Nombre completo del recurso de Dataplex (categoría/término) sobre el que actuó una operación."""
+        collection = "categories" if result.operation.endswith("_CATEGORY") else "terms"
+        return f"{self.glossary_name}/{collection}/{result.item_id}"
+
+    def plan(self, data: dict) -> GlossaryPlan:
+        desired_categories, desired_terms = build_desired_state(data)
+        current_categories = {self._resource_id(c.name): c for c in self.client.list_categories(self.glossary_id)}
+        current_terms = {self._resource_id(t.name): t for t in self.client.list_terms(self.glossary_id)}
+
+        plan = GlossaryPlan()
+        for cat_id, wanted in desired_categories.items():
+            current = current_categories.get(cat_id)
+            if current is None:
+                plan.create_categories.append((cat_id, wanted))
+            elif (current.display_name, current.description, dict(current.labels)) != (wanted["display_name"], wanted["description"], wanted["labels"]):
+                plan.update_categories.append((cat_id, wanted))
+            else:
+                plan.unchanged += 1
+        plan.delete_categories = [c.name for cat_id, c in current_categories.items() if cat_id not in desired_categories]
+
+        for term_id, wanted in desired_terms.items():
+            current = current_terms.get(term_id)
+            wanted_parent = (
+                f"{self.glossary_name}/categories/{wanted['parent_category_id']}"
+                if wanted["parent_category_id"] else self.glossary_name
+            )
+            if current is None:
+                plan.create_terms.append((term_id, wanted))
+            elif (current.display_name, current.description, dict(current.labels), getattr(current, "parent", wanted_parent)) != (wanted["display_name"], wanted["description"], wanted["labels"], wanted_parent):
+                plan.update_terms.append((term_id, wanted))
+            else:
+                plan.unchanged += 1
+        plan.delete_terms = [t.name for term_id, t in current_terms.items() if term_id not in desired_terms]
+
+        return plan
+
+    def print_plan(self, plan: GlossaryPlan):
+        print(f"📋 Plan de publicación para '{self.glossary_id}': {plan.summary()}")
+        for cat_id, _ in plan.create_categories:
+            print(f"  + categoría {cat_id}")
+        for cat_id, _ in plan.update_categories:
+            print(f"  ~ categoría {cat_id}")
+        for name in plan.delete_categories:
+            print(f"  - categoría {self._resource_id(name)}")
+        for term_id, _ in plan.create_terms:
+            print(f"  + término {term_id}")
+        for term_id, _ in plan.update_terms:
+            print(f"  ~ término {term_id}")
+        for name in plan.delete_terms:
+            print(f"  - término {self._resource_id(name)}")
+
+    def apply(self, plan: GlossaryPlan) -> dict:
+        """
+        Aplica el plan por fases. Cada fase se reparte en un pool de trabajadores acotado con
+        un límite de QPS compartido y backoff exponencial ante errores de cuota/disponibilidad.
+        Los resultados por elemento quedan en `self.results`.
+        """
+        client, glossary_id = self.client, self.glossary_id
+        self.results = []
+
+        # Primero las categorías, para que los términos nuevos/movidos puedan referenciarlas
+        self._run_phase("categorías", [
+            (cat_id, "CREATE_CATEGORY", lambda c=cat_id, w=wanted: client.create_category(glossary_id, c, w["display_name"], w["description"], labels=w["labels"]))
+            for cat_id, wanted in plan.create_categories
+        ] + [
+            (cat_id, "UPDATE_CATEGORY", lambda c=cat_id, w=wanted: client.update_category(glossary_id, c, w["display_name"], w["description"], labels=w["labels"]))
+            for cat_id, wanted in plan.update_categories
+        ])
+
+        self._run_phase("términos", [
+            (term_id, "CREATE_TERM", lambda t=term_id, w=wanted: client.create_term(
+                glossary_id, t, w["display_name"], w["description"],
+                parent_category_id=w["parent_category_id"], labels=w["labels"]))
+            for term_id, wanted in plan.create_terms
+        ] + [
+            (term_id, "UPDATE_TERM", lambda t=term_id, w=wanted: client.update_term(
+                glossary_id, t, w["display_name"], w["description"],
+                parent_category_id=w["parent_category_id"], labels=w["labels"]))
+            for term_id, wanted in plan.update_terms
+        ])
+
+        # Términos antes que categorías: borrar una categoría mueve sus términos restantes a la raíz
+        self._run_phase("borrado de términos", [
+            (self._resource_id(name), "DELETE_TERM", lambda n=name: client.delete_term(n))
+            for name in plan.delete_terms
+        ])
+        self._run_phase("borrado de categorías", [
+            (self._resource_id(name), "DELETE_CATEGORY", lambda n=name: client.delete_category(n))
+            for name in plan.delete_categories
+        ])
+
+        failed = [r for r in self.results if r.outcome != "SUCCESS"]
+        if failed:
+            print(f"⚠️ {len(failed)} operación(es) fallida(s): {', '.join(f'{r.operation} {r.item_id}' for r in failed)}")
+        return {**plan.summary(), "failed": len(failed)}
+
+    def _run_phase(self, label: str, tasks: list):
+        if not tasks:
+            return
+        start = time.monotonic()
+        results = run_parallel(tasks, max_workers=self.max_workers, rate_limiter=self.rate_limiter)
+        self.results.extend(results)
+        ok = sum(1 for r in results if r.outcome == "SUCCESS")
+        print(f"⚙️ {label}: {ok}/{len(results)} OK en {time.monotonic() - start:.1f}s")
+
+    def sync(self, data: dict, dry_run: bool = False) -> dict:
+        plan = self.plan(data)
+        self.print_plan(plan)
+        if dry_run or plan.is_empty:
+            if plan.is_empty:
+                print("✅ El glosario ya está sincronizado; no hay cambios que aplicar.")
+            return plan.summary()
+        return self.apply(plan)
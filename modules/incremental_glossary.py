@@ -0,0 +1,258 @@
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from modules.glossary_map_reduce import merge_glossaries, normalize_key
+
+STATE_DIR = os.path.join("output", ".cache")
+
+_DOCUMENT_START = re.compile(r"^--- INICIO DOCUMENTO: (.+?) ---$", re.MULTILINE)
+
+
+class IncrementalGlossaryState:
+    def __init__(self, dataset_id: str, state_dir: str = STATE_DIR):
+        """
+        Estado de la última generación de glosario para un dataset: propuesta de la que parte,
+        versión (last_modified_time) de cada tabla y qué términos salieron de cada tabla.
+        Permite enviar al modelo solo las tablas nuevas o modificadas.
+        """
+        self.path = os.path.join(state_dir, f"glossary_state_{dataset_id}.json")
+        self.proposal_file: Optional[str] = None
+        self.table_versions: Dict[str, Optional[int]] = {}
+        self.provenance: Dict[str, List[str]] = {}
+        # Contexto enviado al modelo en la última generación incremental (None: no hubo llamada)
+        self.last_context: Optional[str] = None
+
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.proposal_file = state.get("proposal_file")
+            self.table_versions = state.get("table_versions", {})
+            self.provenance = state.get("provenance", {})
+
+    def load_previous_glossary(self) -> Optional[Dict]:
+        if not self.proposal_file or not os.path.exists(self.proposal_file):
+            return None
+        with open(self.proposal_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def diff(self, tables: List[Dict]) -> Dict[str, List[str]]:
+        """
+        Tablas nuevas/modificadas/eliminadas respecto a la última generación.
+        Una tabla sin versión conocida se considera siempre modificada.
+        """
+        current = {table["table_id"]: table.get("modified") for table in tables}
+        changes = {"new": [], "changed": [], "removed": [], "unchanged": []}
+        for table_id, modified in current.items():
+            if table_id not in self.table_versions:
+                changes["new"].append(table_id)
+            elif modified is None or self.table_versions[table_id] != modified:
+                changes["changed"].append(table_id)
+            else:
+                changes["unchanged"].append(table_id)
+        changes["removed"] = sorted(set(self.table_versions) - set(current))
+        return changes
+
+    def save(self, proposal_file: str, glossary: Dict, tables: List[Dict], incomplete_tables: Iterable[str] = ()):
+        """
+        Guarda la propuesta como punto de partida de la próxima ejecución. Las tablas de
+        `incomplete_tables` (recortadas por el presupuesto de tokens) se guardan sin versión,
+        así la próxima ejecución incremental las vuelve a generar.
+        """
+        incomplete = set(incomplete_tables)
+        self.proposal_file = proposal_file
+        self.table_versions = {
+            table["table_id"]: None if table["table_id"] in incomplete else table.get("modified")
+            for table in tables
+        }
+        self.provenance = attribute_terms_to_tables(glossary, tables)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "proposal_file": proposal_file,
+                    "table_versions": self.table_versions,
+                    "provenance": self.provenance,
+                },
+                f,
+                ensure_ascii=False,
+                indent=2
+            )
+
+
+def _iter_terms(glossary: Dict):
+    for category in glossary.get("glossary", {}).get("categories", []):
+        for term in category.get("terms", []):
+            yield category, term
+
+
+def attribute_terms_to_tables(glossary: Dict, tables: List[Dict]) -> Dict[str, List[str]]:
+    """
+    Asocia cada término a la(s) tabla(s) cuya columna coincide con su 'related_technical_column'
+    (admite 'columna' o 'tabla.columna'). Los términos sin coincidencia no se asocian a ninguna tabla.
+    """
+    column_index: Dict[str, set] = {}
+    for table in tables:
+        table_key = normalize_key(table["table_id"])
+        for column in table.get("columns", []):
+            column_key = normalize_key(column["name"])
+            column_index.setdefault(column_key, set()).add(table["table_id"])
+            column_index.setdefault(table_key + column_key, set()).add(table["table_id"])
+
+    provenance: Dict[str, List[str]] = {}
+    for _, term in _iter_terms(glossary):
+        column_ref = term.get("related_technical_column") or ""
+        matches = set()
+        for ref in column_ref.split(","):
+            parts = ref.strip().split(".")
+            # 'dataset.tabla.columna' -> 'tabla' + 'columna'
+            key = normalize_key("".join(parts[-2:]))
+            matches |= column_index.get(key, set()) or column_index.get(normalize_key(parts[-1]), set())
+        for table_id in matches:
+            provenance.setdefault(table_id, []).append(normalize_key(term.get("term", "")))
+
+    return {table_id: sorted(set(keys)) for table_id, keys in sorted(provenance.items())}
+
+
+def prune_glossary(glossary: Dict, provenance: Dict[str, List[str]], stale_tables: List[str]) -> Tuple[Dict, int]:
+    """
+    Elimina los términos que provienen exclusivamente de tablas modificadas o eliminadas.
+    Los términos sin procedencia conocida o compartidos con tablas sin cambios se conservan.
+    """
+    stale = set(stale_tables)
+    stale_terms = {key for table_id in stale for key in provenance.get(table_id, [])}
+    fresh_terms = {key for table_id, keys in provenance.items() if table_id not in stale for key in keys}
+    to_remove = stale_terms - fresh_terms
+
+    removed = 0
+    categories = []
+    for category in glossary.get("glossary", {}).get("categories", []):
+        terms = [t for t in category.get("terms", []) if normalize_key(t.get("term", "")) not in to_remove]
+        removed += len(category.get("terms", [])) - len(terms)
+        if terms or not category.get("terms"):
+            categories.append({**category, "terms": terms})
+
+    return {"glossary": {"categories": categories}}, removed
+
+
+def build_incremental_context(changed_context: str, previous_glossary: Dict) -> str:
+    """
+    Contexto reducido (solo tablas nuevas/modificadas) más la lista de categorías ya existentes,
+    para que el modelo reutilice las categorías en lugar de inventar otras equivalentes.
+    """
+    categories = [c.get("display_name", c.get("id", "")) for c in previous_glossary.get("glossary", {}).get("categories", [])]
+    context = changed_context
+    if categories:
+        context += (
+            "\n\nCATEGORÍAS YA EXISTENTES EN EL GLOSARIO (reutilízalas si los conceptos encajan):\n"
+            + "\n".join(f"  - {name}" for name in categories)
+        )
+    return context
+
+
+def splice_glossary(pruned_glossary: Dict, partial_glossary: Dict) -> Dict:
+    # El glosario regenerado va primero: sus definiciones sustituyen a las de la propuesta anterior
+    return merge_glossaries([partial_glossary, pruned_glossary])
+
+
+def split_documents(context: str) -> Dict[str, str]:
+    """Texto de cada documento de un contexto de Drive, por ruta (marcadores INICIO DOCUMENTO)."""
+    matches = list(_DOCUMENT_START.finditer(context))
+    return {
+        match.group(1): context[match.end():matches[i + 1].start() if i + 1 < len(matches) else len(context)]
+        for i, match in enumerate(matches)
+    }
+
+
+def attribute_terms_to_documents(glossary: Dict, context: str, document_ids: Dict[str, str]) -> Dict[str, List[str]]:
+    """
+    Equivalente de attribute_terms_to_tables para PDFs: asocia cada término a los documentos
+    (id de fichero) cuyo texto contiene su nombre. Un término que no aparece literalmente en
+    ningún documento se asocia a todos los documentos del contexto del que se generó.
+    """
+    texts = {
+        document_ids[path]: normalize_key(text)
+        for path, text in split_documents(context).items()
+        if path in document_ids
+    }
+    provenance: Dict[str, List[str]] = {}
+    for _, term in _iter_terms(glossary):
+        key = normalize_key(term.get("term", ""))
+        if not key:
+            continue
+        for file_id in [file_id for file_id, text in texts.items() if key in text] or list(texts):
+            provenance.setdefault(file_id, []).append(key)
+    return {file_id: sorted(set(keys)) for file_id, keys in sorted(provenance.items())}
+
+
+def splice_document_glossary(
+    previous_glossary: Dict,
+    partial_glossary: Dict,
+    provenance: Dict[str, List[str]],
+    partial_provenance: Dict[str, List[str]],
+    stale_documents: List[str],
+) -> Tuple[Dict, Dict[str, List[str]], int]:
+    """
+    Inserta el glosario de los PDFs nuevos/modificados en la propuesta anterior.
+    Se retiran los términos que provenían solo de PDFs modificados o eliminados y el glosario
+    regenerado va primero, para que sus definiciones sustituyan a las anteriores.
+    Devuelve (glosario, procedencia actualizada, términos retirados).
+    """
+    pruned, removed = prune_glossary(previous_glossary, provenance, stale_documents)
+    stale = set(stale_documents) | set(partial_provenance)
+    merged_provenance = {file_id: keys for file_id, keys in provenance.items() if file_id not in stale}
+    merged_provenance.update(partial_provenance)
+    return merge_glossaries([partial_glossary, pruned]), dict(sorted(merged_provenance.items())), removed
+
+
+def generate_incremental_glossary(generator, state: IncrementalGlossaryState, dataset_id: str, tables: List[Dict], token_budget=None) -> Optional[str]:
+    """
+    Regenera solo la parte del glosario afectada por tablas nuevas/modificadas/eliminadas
+    y la inserta en la propuesta anterior. Devuelve None si no es posible (sin propuesta previa
+    o fallo del modelo), en cuyo caso se debe generar el glosario completo.
+    Con `token_budget` (modules.token_budget.TokenBudget) se aplica el límite al contexto reducido;
+    las tablas recortadas quedan en `token_budget.truncated_sources` y no deben darse por cubiertas
+    al guardar el estado. El contexto realmente enviado queda en `state.last_context`.
+    """
+    from modules.context_serializer import serialize_tables
+
+    state.last_context = None
+    previous = state.load_previous_glossary()
+    if not previous:
+        print("ℹ️ No hay propuesta previa para este dataset; se genera el glosario completo.")
+        return None
+
+    changes = state.diff(tables)
+    print(
+        f"🔁 Modo incremental: {len(changes['new'])} tabla(s) nueva(s), {len(changes['changed'])} modificada(s), "
+        f"{len(changes['removed'])} eliminada(s), {len(changes['unchanged'])} sin cambios."
+    )
+
+    to_generate = set(changes["new"] + changes["changed"])
+    if not to_generate and not changes["removed"]:
+        print(f"✅ Sin cambios desde {state.proposal_file}; se reutiliza la propuesta anterior.")
+        return json.dumps({"glossary": previous.get("glossary", {})}, ensure_ascii=False, indent=2)
+
+    pruned, removed = prune_glossary(previous, state.provenance, changes["changed"] + changes["removed"])
+    print(f"✂️ {removed} término(s) retirados por pertenecer a tablas modificadas o eliminadas.")
+
+    partial = {"glossary": {"categories": []}}
+    if to_generate:
+        changed_tables = [table for table in tables if table["table_id"] in to_generate]
+        context = build_incremental_context(serialize_tables(dataset_id, changed_tables, generator.context_format), previous)
+        if token_budget:
+            context = token_budget.enforce(context)
+        state.last_context = context
+        raw = generator.suggest_glossary_structure(context)
+        if not raw:
+            print("⚠️ Falló la generación incremental; se generará el glosario completo.")
+            return None
+        try:
+            partial = json.loads(raw)
+        except json.JSONDecodeError as e:
+            print(f"⚠️ La generación incremental devolvió JSON inválido ({e}); se generará el glosario completo.")
+            return None
+
+    merged = splice_glossary(pruned, partial)
+    return json.dumps(merged, ensure_ascii=False, indent=2)
@@ -0,0 +1,141 @@
+import contextvars
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+# Job al que pertenece el código en ejecución (se propaga a los hilos de modules.concurrency)
+current_job: contextvars.ContextVar = contextvars.ContextVar("current_job", default=None)
+
+
+class Job:
+    def __init__(self, log_size: int):
+        """
+        Ejecución individual del agente con su propio buffer circular de logs.
+        Cada línea tiene un número de secuencia para que los clientes SSE puedan
+        reanudar la lectura (Last-Event-ID) sin duplicados.
+        """
+        self.id = uuid.uuid4().hex[:12]
+        self.status = "QUEUED"
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._logs: deque = deque(maxlen=log_size)
+        self._next_seq = 0
+        self._condition = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("SUCCEEDED", "FAILED")
+
+    def append(self, line: str):
+        with self._condition:
+            self._logs.append((self._next_seq, line))
+            self._next_seq += 1
+            self._condition.notify_all()
+
+    def read(self, after_seq: int = -1, timeout: float = 30) -> List[Tuple[int, str]]:
+        """
+        Devuelve las líneas con secuencia > `after_seq`, esperando hasta `timeout` segundos
+        si todavía no hay ninguna y el job sigue en marcha.
+        """
+        with self._condition:
+            if not self.finished and (not self._logs or self._logs[-1][0] <= after_seq):
+                self._condition.wait(timeout)
+            return [(seq, line) for seq, line in self._logs if seq > after_seq]
+
+    def _set_status(self, status: str, error: Optional[str] = None):
+        with self._condition:
+            self.status = status
+            self.error = error
+            if status == "RUNNING":
+                self.started_at = time.time()
+            elif self.finished:
+                self.finished_at = time.time()
+            self._condition.notify_all()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "log_lines": self._next_seq,
+        }
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobManager:
+    def __init__(self, max_workers: int = 4, max_pending: int = 20, log_size: int = 5000, max_retained: int = 100):
+        """
+        Ejecuta jobs en un pool de hilos acotado. Como máximo `max_pending` jobs pueden estar
+        en cola o en ejecución a la vez; se conservan los últimos `max_retained` jobs terminados.
+        """
+        self.max_pending = max_pending
+        self.log_size = log_size
+        self.max_retained = max_retained
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="glossary-job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, **kwargs) -> Job:
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if not job.finished)
+            if active >= self.max_pending:
+                raise JobQueueFull(f"Hay {active} ejecuciones en curso; inténtalo más tarde.")
+            job = Job(self.log_size)
+            self._jobs[job.id] = job
+            self._evict_finished()
+
+        def run():
+            current_job.set(job)
+            job._set_status("RUNNING")
+            try:
+                fn(**kwargs)
+                job._set_status("SUCCEEDED")
+            except Exception as e:
+                job.append(f"❌ ERROR: {e}")
+                job._set_status("FAILED", str(e))
+
+        # Contexto limpio por job: evita heredar el job de quien lo envía
+        self._executor.submit(contextvars.Context().run, run)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _evict_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_retained)]:
+            del self._jobs[job_id]
+
+
+class JobStreamCapture:
+    def __init__(self, original_stdout):
+        """
+        Sustituto de sys.stdout que envía cada línea al log del job actual (si lo hay)
+        además de a la salida original.
+        """
+        self.original_stdout = original_stdout
+
+    def write(self, text):
+        job = current_job.get()
+        if job and text.strip():
+            job.append(text.strip())
+        return self.original_stdout.write(text)
+
+    def flush(self):
+        self.original_stdout.flush()
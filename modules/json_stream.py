@@ -0,0 +1,95 @@
+import json
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Rutas (claves de objeto y "[]" para elementos de lista) que se emiten en cuanto se completan
+CATEGORY_PATH = ("glossary", "categories", "[]")
+TERM_PATH = ("glossary", "categories", "[]", "terms", "[]")
+DEFAULT_TARGETS = {TERM_PATH: "term", CATEGORY_PATH: "category"}
+
+
+class _Frame:
+    __slots__ = ("is_object", "path", "start", "key", "expect_key")
+
+    def __init__(self, is_object: bool, path: Tuple[str, ...], start: int):
+        self.is_object = is_object
+        self.path = path
+        self.start = start
+        self.key: Optional[str] = None
+        self.expect_key = is_object
+
+
+class IncrementalGlossaryParser:
+    def __init__(self, targets: Dict[Tuple[str, ...], str] = None):
+        """
+        Parser JSON incremental para la salida en streaming del modelo.
+        Se le pasan fragmentos de texto con `feed` y devuelve los objetos completos cuya ruta
+        coincide con `targets` (por defecto términos y categorías del glosario) en cuanto se cierran,
+        sin esperar al final de la respuesta. Ignora el texto fuera del JSON (p.ej. ```json).
+        """
+        self.targets = targets or DEFAULT_TARGETS
+        self._text = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._root_start: Optional[int] = None
+        self._root_end: Optional[int] = None
+
+    def feed(self, chunk: str) -> Iterator[Tuple[str, Dict]]:
+        self._text += chunk
+        text = self._text
+        while self._pos < len(text):
+            i = self._pos
+            char = text[i]
+            self._pos += 1
+
+            if self._root_end is not None:
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    frame = self._stack[-1] if self._stack else None
+                    if frame and frame.is_object and frame.expect_key:
+                        frame.key = json.loads(text[self._string_start:i + 1])
+                        frame.expect_key = False
+                continue
+
+            if not self._stack and char != "{":
+                continue  # Texto previo al JSON (```json, espacios...)
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in "{[":
+                path = ()
+                if self._stack:
+                    parent = self._stack[-1]
+                    path = parent.path + ((parent.key or "",) if parent.is_object else ("[]",))
+                else:
+                    self._root_start = i
+                self._stack.append(_Frame(char == "{", path, i))
+            elif char in "}]":
+                frame = self._stack.pop()
+                kind = self.targets.get(frame.path)
+                if kind and frame.is_object:
+                    yield kind, json.loads(text[frame.start:i + 1])
+                if not self._stack:
+                    self._root_end = i + 1
+            elif char == "," and self._stack and self._stack[-1].is_object:
+                self._stack[-1].expect_key = True
+
+    @property
+    def complete(self) -> bool:
+        return self._root_end is not None
+
+    def result(self) -> Optional[str]:
+        """Texto JSON completo (sin fences) una vez cerrado el objeto raíz."""
+        if self._root_start is None or self._root_end is None:
+            return None
+        return self._text[self._root_start:self._root_end]
@@ -0,0 +1,91 @@
+import json
+import os
+import sqlite3
+from contextlib import closing
+from typing import Dict, List, Optional
+
+DEFAULT_CACHE_PATH = os.path.join("output", ".cache", "bigquery_metadata.sqlite")
+
+
+class MetadataSnapshotCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        """
+        Caché local persistente (SQLite) de los metadatos de tablas de BigQuery.
+        Cada tabla se guarda junto a su `last_modified_time` y etag, de modo que
+        solo se vuelven a leer las tablas que han cambiado desde la última ejecución.
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS table_snapshots (
+                    project_id TEXT NOT NULL,
+                    dataset_id TEXT NOT NULL,
+                    table_id TEXT NOT NULL,
+                    modified INTEGER,
+                    etag TEXT,
+                    payload TEXT NOT NULL,
+                    PRIMARY KEY (project_id, dataset_id, table_id)
+                )
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path)
+
+    def get_versions(self, project_id: str, dataset_id: str) -> Dict[str, Optional[int]]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT table_id, modified FROM table_snapshots WHERE project_id = ? AND dataset_id = ?",
+                (project_id, dataset_id),
+            ).fetchall()
+        return {table_id: modified for table_id, modified in rows}
+
+    def diff(self, project_id: str, dataset_id: str, current_versions: Dict[str, int]) -> Dict[str, List[str]]:
+        """
+        Compara las versiones actuales (table_id -> last_modified_time en ms) con las cacheadas.
+        """
+        cached = self.get_versions(project_id, dataset_id)
+        changes = {"new": [], "changed": [], "removed": [], "unchanged": []}
+        for table_id in sorted(current_versions):
+            if table_id not in cached:
+                changes["new"].append(table_id)
+            elif cached[table_id] != current_versions[table_id]:
+                changes["changed"].append(table_id)
+            else:
+                changes["unchanged"].append(table_id)
+        changes["removed"] = sorted(set(cached) - set(current_versions))
+        return changes
+
+    def load(self, project_id: str, dataset_id: str, table_ids: List[str]) -> List[Dict]:
+        """
+        Devuelve los metadatos cacheados de las tablas indicadas, en el mismo orden.
+        """
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT table_id, payload FROM table_snapshots WHERE project_id = ? AND dataset_id = ?",
+                (project_id, dataset_id),
+            ).fetchall()
+        payloads = {table_id: json.loads(payload) for table_id, payload in rows}
+        return [payloads[table_id] for table_id in table_ids if table_id in payloads]
+
+    def store(self, project_id: str, dataset_id: str, tables: List[Dict]):
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO table_snapshots (project_id, dataset_id, table_id, modified, etag, payload)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (project_id, dataset_id, table["table_id"], table.get("modified"), table.get("etag"), json.dumps(table))
+                    for table in tables
+                ],
+            )
+
+    def remove(self, project_id: str, dataset_id: str, table_ids: List[str]):
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "DELETE FROM table_snapshots WHERE project_id = ? AND dataset_id = ? AND table_id = ?",
+                [(project_id, dataset_id, table_id) for table_id in table_ids],
+            )
@@ -0,0 +1,108 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+from modules.glossary_map_reduce import estimate_tokens, is_section_start
+
+# Modelos de menor a mayor capacidad (y coste); se escala al siguiente si la respuesta falla
+MODEL_CASCADE = [m.strip() for m in os.getenv("GLOSSARY_MODEL_CASCADE", "gemini-2.5-flash-lite,gemini-2.5-flash,gemini-2.5-pro").split(",") if m.strip()]
+# Contextos (tokens estimados) hasta este tamaño empiezan por el modelo más barato
+SMALL_CONTEXT_TOKENS = int(os.getenv("GLOSSARY_SMALL_CONTEXT_TOKENS", "8000"))
+# Heurística de calidad: términos mínimos por tabla/documento del contexto
+MIN_TERMS_PER_SECTION = float(os.getenv("GLOSSARY_MIN_TERMS_PER_SECTION", "0.25"))
+
+# USD por millón de tokens (entrada, salida), tarifa estándar de Vertex AI
+MODEL_PRICING = {
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+
+
+def quality_issues(glossary_json: str, technical_context: str) -> List[str]:
+    """
+    Heurísticas baratas sobre un glosario ya validado contra el esquema.
+    Devuelve la lista de problemas (vacía si el resultado es aceptable).
+    """
+    categories = json.loads(glossary_json).get("glossary", {}).get("categories", [])
+    terms = [term for category in categories for term in category.get("terms", [])]
+    if not terms:
+        return ["el glosario no contiene términos"]
+
+    issues = []
+    empty = [c.get("display_name") for c in categories if not c.get("terms")]
+    if empty:
+        issues.append(f"categorías sin términos: {', '.join(empty)}")
+
+    weak = [t for t in terms if len((t.get("definition") or "").strip()) < 20 or t.get("definition", "").strip().lower() == t.get("term", "").strip().lower()]
+    if len(weak) > 0.2 * len(terms):
+        issues.append(f"{len(weak)}/{len(terms)} definiciones vacías o triviales")
+
+    sections = sum(1 for line in technical_context.splitlines() if is_section_start(line))
+    if sections and len(terms) < MIN_TERMS_PER_SECTION * sections:
+        issues.append(f"solo {len(terms)} términos para {sections} tablas/documentos")
+    return issues
+
+
+class ModelRouter:
+    def __init__(self, primary_model: str, cascade: Optional[List[str]] = None, small_context_tokens: int = SMALL_CONTEXT_TOKENS):
+        """
+        Decide con qué modelo empieza cada contexto y a cuáles se escala.
+        La cascada es `primary_model` seguido de los modelos más capaces de `cascade`.
+        Acumula métricas de latencia, tokens y coste por modelo para ajustar el enrutado.
+        """
+        cascade = cascade or MODEL_CASCADE
+        higher = cascade[cascade.index(primary_model) + 1:] if primary_model in cascade else cascade
+        self.models = [primary_model] + [m for m in higher if m != primary_model]
+        self.small_context_tokens = small_context_tokens
+        self.metrics: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def start_level(self, technical_context: str) -> int:
+        """Contextos pequeños: el modelo más barato; el resto empieza un nivel por encima."""
+        if estimate_tokens(technical_context) <= self.small_context_tokens:
+            return 0
+        return min(1, len(self.models) - 1)
+
+    def _entry(self, model: str) -> Dict:
+        return self.metrics.setdefault(model, {
+            "calls": 0, "failures": 0, "escalations": 0, "latency_ms": 0.0,
+            "prompt_tokens": 0, "output_tokens": 0, "cost_usd": 0.0,
+        })
+
+    def record_call(self, model: str, latency_ms: float, usage=None, ok: bool = True):
+        prompt_tokens = (getattr(usage, "prompt_token_count", None) or 0) if usage else 0
+        output_tokens = (getattr(usage, "candidates_token_count", None) or 0) if usage else 0
+        input_price, output_price = MODEL_PRICING.get(model, (0.0, 0.0))
+        with self._lock:
+            entry = self._entry(model)
+            entry["calls"] += 1
+            entry["failures"] += 0 if ok else 1
+            entry["latency_ms"] += latency_ms
+            entry["prompt_tokens"] += prompt_tokens
+            entry["output_tokens"] += output_tokens
+            entry["cost_usd"] += (prompt_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+    def record_escalation(self, model: str):
+        with self._lock:
+            self._entry(model)["escalations"] += 1
+
+    def summary(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                model: {
+                    **entry,
+                    "latency_ms": round(entry["latency_ms"], 1),
+                    "avg_latency_ms": round(entry["latency_ms"] / entry["calls"], 1) if entry["calls"] else None,
+                    "cost_usd": round(entry["cost_usd"], 6),
+                }
+                for model, entry in self.metrics.items()
+            }
+
+    def print_summary(self):
+        for model, entry in self.summary().items():
+            print(
+                f"📈 {model}: {entry['calls']} llamada(s), {entry['failures']} fallo(s), {entry['escalations']} escalado(s), "
+                f"latencia media {entry['avg_latency_ms']} ms, {entry['prompt_tokens']}+{entry['output_tokens']} tokens, ~${entry['cost_usd']:.4f}"
+            )
@@ -0,0 +1,248 @@
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from modules.context_serializer import CONTEXT_FORMAT, CONTEXT_FORMATS
+from modules.glossary_map_reduce import estimate_tokens, is_section_start
+
+# Límite duro de tokens del contexto técnico (suma de todos los fragmentos); 0 = sin límite.
+# Se aplica después de la selección por relevancia (GLOSSARY_CONTEXT_TOKEN_BUDGET, modules.context_selector),
+# que es el objetivo "blando" y main.py limita a este valor: este recorte solo actúa como red de seguridad
+# (selección desactivada, recuento del SDK mayor que la estimación, contexto del modo incremental).
+MAX_CONTEXT_TOKENS = int(os.getenv("GLOSSARY_MAX_CONTEXT_TOKENS", "200000"))
+# "fair_share" | "compact" | "tail"
+BUDGET_POLICY = os.getenv("GLOSSARY_BUDGET_POLICY", "fair_share")
+# "estimate" (local, ~4 caracteres/token) | "sdk" (models.count_tokens, una llamada por recuento)
+TOKEN_COUNTER = os.getenv("GLOSSARY_TOKEN_COUNTER", "estimate")
+
+# Ventana de entrada de los modelos usados por el agente
+MODEL_INPUT_LIMITS = {
+    "gemini-2.5-flash-lite": 1_048_576,
+    "gemini-2.5-flash": 1_048_576,
+    "gemini-2.5-pro": 1_048_576,
+}
+
+POLICIES = ("fair_share", "compact", "tail")
+# Recortes como máximo hasta que el recuento real (contador del SDK) cumple el límite
+ENFORCE_MAX_PASSES = 3
+_COLUMN_DESCRIPTION = re.compile(r"^(\s*- .+?) - Description: .*$")
+
+
+class TokenCounter:
+    def __init__(self, client=None, model_name: Optional[str] = None, use_sdk: bool = TOKEN_COUNTER == "sdk"):
+        """
+        Cuenta tokens con `client.models.count_tokens` (exacto, requiere llamada a la API)
+        o con el estimador local. Si la API falla se usa el estimador.
+        """
+        self.client = client
+        self.model_name = model_name
+        self.use_sdk = use_sdk and client is not None and model_name is not None
+        self.method = "sdk" if self.use_sdk else "estimate"
+
+    def count(self, text: str) -> int:
+        if self.use_sdk:
+            try:
+                return self.client.models.count_tokens(model=self.model_name, contents=text).total_tokens
+            except Exception as e:
+                print(f"⚠️ count_tokens no disponible ({e}); se usa la estimación local.")
+                self.use_sdk = False
+                self.method = "estimate"
+        return estimate_tokens(text)
+
+
+def split_sources(technical_context: str) -> Tuple[str, List[Tuple[str, str]]]:
+    """Devuelve (cabecera, [(nombre de tabla/documento, texto de la sección)])."""
+    header: List[str] = []
+    sources: List[Tuple[str, List[str]]] = []
+    for line in technical_context.splitlines():
+        if is_section_start(line):
+            # En formato TSV la cabecera de la tabla lleva también la descripción
+            name = line.strip().removeprefix("Table: ").removeprefix("--- INICIO DOCUMENTO: ").removesuffix(" ---").split("\t")[0]
+            sources.append((name, [line]))
+        elif sources:
+            sources[-1][1].append(line)
+        else:
+            header.append(line)
+    return "\n".join(header), [(name, "\n".join(lines)) for name, lines in sources]
+
+
+def _truncate_lines(text: str, max_tokens: int) -> str:
+    # Corta por líneas completas (la primera línea, cabecera de la sección, se conserva siempre)
+    lines = text.splitlines()
+    kept, used = lines[:1], estimate_tokens(lines[0]) if lines else 0
+    for line in lines[1:]:
+        cost = estimate_tokens(line + "\n")
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept)
+
+
+def _strip_column_description(line: str, context_format: str) -> str:
+    # La cabecera de la sección (y la descripción de la tabla) se conserva
+    if is_section_start(line):
+        return line
+    if context_format == "tsv":
+        # <columna><TAB><tipo><TAB><descripción>
+        return "\t".join(line.split("\t")[:2])
+    if context_format == "json" and line.startswith("["):
+        # [nombre, tipo, descripción]
+        try:
+            column = json.loads(line)
+        except ValueError:
+            return line
+        return json.dumps(column[:2], ensure_ascii=False, separators=(",", ":")) if len(column) > 2 else line
+    return _COLUMN_DESCRIPTION.sub(r"\1", line)
+
+
+def _strip_descriptions(text: str, context_format: str = "text") -> str:
+    return "\n".join(_strip_column_description(line, context_format) for line in text.splitlines())
+
+
+class TokenBudget:
+    def __init__(self, counter: Optional[TokenCounter] = None, max_tokens: int = MAX_CONTEXT_TOKENS, policy: str = BUDGET_POLICY, context_format: str = CONTEXT_FORMAT):
+        """
+        Contabiliza tokens por tabla/documento y aplica un presupuesto al contexto técnico.
+        Políticas (deterministas, mismo contexto -> mismo resultado):
+          - fair_share: las secciones que caben en su cuota se conservan enteras y el resto del
+            presupuesto se reparte a partes iguales entre las grandes, que se cortan por líneas.
+          - compact: primero elimina las descripciones de columnas, empezando por las tablas más
+            grandes; si no basta, aplica fair_share.
+          - tail: conserva las secciones en orden hasta agotar el presupuesto.
+        `context_format` (modules.context_serializer) indica cómo localizar las descripciones
+        de columnas para la política compact.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Política de presupuesto desconocida: {policy} (opciones: {', '.join(POLICIES)})")
+        if context_format not in CONTEXT_FORMATS:
+            raise ValueError(f"Formato de contexto desconocido: {context_format} (opciones: {', '.join(CONTEXT_FORMATS)})")
+        self.counter = counter or TokenCounter()
+        self.max_tokens = max_tokens
+        self.policy = policy
+        self.context_format = context_format
+        self.truncated_sources: List[str] = []
+
+    def enforce(self, technical_context: str) -> str:
+        """
+        Recorta el contexto a `max_tokens`. Las políticas trabajan con el estimador local; con el
+        contador del SDK el resultado se comprueba con el recuento real y, si aún supera el límite,
+        se repite el recorte con un objetivo reducido en proporción. Las tablas/documentos
+        recortados quedan en `truncated_sources`.
+        """
+        self.truncated_sources = []
+        if self.max_tokens <= 0:
+            return technical_context
+
+        target = self.max_tokens
+        result = technical_context
+        for _ in range(ENFORCE_MAX_PASSES):
+            result = self._enforce_estimated(technical_context, target)
+            if not self.counter.use_sdk:
+                return result
+            actual = self.counter.count(result)
+            if actual <= self.max_tokens:
+                return result
+            target = max(target * self.max_tokens // actual - 1, 0)
+            print(f"⚠️ El recuento real ({actual} tokens) supera el límite {self.max_tokens}; se recorta con objetivo ~{target} tokens estimados.")
+        print(f"⚠️ El contexto sigue superando el límite de {self.max_tokens} tokens tras {ENFORCE_MAX_PASSES} intentos.")
+        return result
+
+    def _enforce_estimated(self, technical_context: str, max_tokens: int) -> str:
+        self.truncated_sources = []
+        if estimate_tokens(technical_context) <= max_tokens:
+            return technical_context
+
+        header, sources = split_sources(technical_context)
+        # Saltos de línea entre secciones incluidos
+        budget = max(max_tokens - estimate_tokens(header) - estimate_tokens("\n" * (len(sources) + 1)), 0)
+        reduced = self._compact(sources, budget) if self.policy == "compact" else sources
+        if self.policy == "tail":
+            kept = self._tail(reduced, budget)
+        else:
+            kept = self._fair_share(reduced, budget)
+
+        self.truncated_sources = [name for (name, text), (_, new_text) in zip(sources, kept) if new_text != text]
+        result = "\n".join(part for part in [header] + [text for _, text in kept] if part)
+        print(
+            f"✂️ Contexto recortado a ~{estimate_tokens(result)} tokens (límite {max_tokens}, política '{self.policy}'): "
+            f"{len(self.truncated_sources)} tabla(s)/documento(s) afectados."
+        )
+        return result
+
+    def _compact(self, sources: List[Tuple[str, str]], budget: int) -> List[Tuple[str, str]]:
+        sources = list(sources)
+        total = sum(estimate_tokens(text) for _, text in sources)
+        for index in sorted(range(len(sources)), key=lambda i: (-estimate_tokens(sources[i][1]), i)):
+            if total <= budget:
+                break
+            name, text = sources[index]
+            compacted = _strip_descriptions(text, self.context_format)
+            total -= estimate_tokens(text) - estimate_tokens(compacted)
+            sources[index] = (name, compacted)
+        return sources
+
+    @staticmethod
+    def _fair_share(sources: List[Tuple[str, str]], budget: int) -> List[Tuple[str, str]]:
+        sizes = [estimate_tokens(text) for _, text in sources]
+        # Water-filling: se fija la cuota a partir de la cual se recorta
+        remaining, pending = budget, sorted(range(len(sources)), key=lambda i: (sizes[i], i))
+        while pending and sizes[pending[0]] <= remaining // len(pending):
+            remaining -= sizes[pending.pop(0)]
+        share = remaining // len(pending) if pending else 0
+        large = set(pending)
+        return [
+            (name, _truncate_lines(text, share) if i in large else text)
+            for i, (name, text) in enumerate(sources)
+        ]
+
+    @staticmethod
+    def _tail(sources: List[Tuple[str, str]], budget: int) -> List[Tuple[str, str]]:
+        kept, used = [], 0
+        for name, text in sources:
+            allowed = max(budget - used, 0)
+            text = text if estimate_tokens(text) <= allowed else (_truncate_lines(text, allowed) if allowed else "")
+            used += estimate_tokens(text)
+            kept.append((name, text))
+        return kept
+
+    def report(self, technical_context: str, prompt_tokens: Optional[int] = None, model_name: Optional[str] = None, top: int = 20) -> Dict:
+        """
+        Estadísticas de tokens: total del contexto, por tabla/documento (las `top` mayores)
+        y, si se indica, del prompt completo frente a la ventana del modelo.
+        Con el contador del SDK solo el total es exacto; el desglose se escala con él.
+        """
+        _, sources = split_sources(technical_context)
+        estimated = [(name, estimate_tokens(text)) for name, text in sources]
+        context_tokens = self.counter.count(technical_context)
+        scale = context_tokens / max(estimate_tokens(technical_context), 1)
+        per_source = sorted(((name, round(tokens * scale)) for name, tokens in estimated), key=lambda item: (-item[1], item[0]))
+
+        stats = {
+            "token_counter": self.counter.method,
+            "context_tokens": context_tokens,
+            "sources_count": len(sources),
+            "top_sources": [{"source": name, "tokens": tokens} for name, tokens in per_source[:top]],
+            "budget": {
+                "max_context_tokens": self.max_tokens,
+                "policy": self.policy,
+                "truncated_sources": self.truncated_sources,
+            },
+        }
+        if prompt_tokens is not None:
+            stats["prompt_tokens"] = prompt_tokens
+            limit = MODEL_INPUT_LIMITS.get(model_name)
+            if limit:
+                stats["model_input_limit"] = limit
+                stats["model_input_usage_pct"] = round(100 * prompt_tokens / limit, 2)
+        return stats
+
+    @staticmethod
+    def print_report(stats: Dict, top: int = 5):
+        print(f"🔢 Contexto: {stats['context_tokens']} tokens ({stats['token_counter']}) en {stats['sources_count']} tabla(s)/documento(s).")
+        if "prompt_tokens" in stats:
+            usage = f" ({stats['model_input_usage_pct']}% de {stats['model_input_limit']})" if "model_input_limit" in stats else ""
+            print(f"🔢 Prompt total: {stats['prompt_tokens']} tokens{usage}.")
+        for item in stats["top_sources"][:top]:
+            print(f"   · {item['source']}: {item['tokens']} tokens")
@@ -0,0 +1,84 @@
+import sys
+import os
+
+# Add the project root directory to sys.path so we can import 'modules'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+from modules.batch_glossary import BatchGlossaryRunner, LocalBatchBackend
+from modules.context_serializer import CONTEXT_FORMAT, CONTEXT_FORMATS, serialize_tables
+from modules.metadata_cache import MetadataSnapshotCache
+
+# Configuration (Env vars or defaults)
+PROJECT_ID = os.getenv("GCP_PROJECT_ID", "pg-gccoe-carlos-monteverde")
+LOCATION = os.getenv("GCP_LOCATION", "us")
+BATCH_LOCATION = os.getenv("GLOSSARY_BATCH_LOCATION", "us-central1")
+BATCH_BUCKET = os.getenv("GLOSSARY_BATCH_BUCKET", os.getenv("GCS_BUCKET", ""))
+BATCH_MODEL = os.getenv("GLOSSARY_BATCH_MODEL", "gemini-2.5-flash")
+
+
+def load_contexts(datasets: list, context_format: str, offline: bool) -> dict:
+    """Dataset contexts from BigQuery (refreshing the snapshot cache) or, with --offline, from the cache only."""
+    contexts = {}
+    cache = MetadataSnapshotCache()
+    reader = None
+    if not offline:
+        from modules.bigquery_reader import BigQueryMetadataReader
+        reader = BigQueryMetadataReader(PROJECT_ID, LOCATION, cache=cache)
+
+    for dataset_id in datasets:
+        if reader:
+            context = reader.get_context_from_dataset(dataset_id, context_format)
+        else:
+            tables = cache.load(PROJECT_ID, dataset_id, sorted(cache.get_versions(PROJECT_ID, dataset_id)))
+            context = serialize_tables(dataset_id, tables, context_format) if tables else ""
+        if context:
+            contexts[dataset_id] = context
+        else:
+            print(f"⚠️ No metadata for {dataset_id}; skipped.")
+    return contexts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate glossary proposals for many datasets with one Vertex AI batch prediction job.")
+    parser.add_argument("datasets", nargs="+", help="BigQuery datasets to process.")
+    parser.add_argument("--model", default=BATCH_MODEL)
+    parser.add_argument("--format", dest="context_format", default=CONTEXT_FORMAT, choices=CONTEXT_FORMATS)
+    parser.add_argument("--bucket", default=BATCH_BUCKET, help="GCS bucket for batch input/output.")
+    parser.add_argument("--stub", action="store_true", help="Use the local stub backend (no Vertex AI calls).")
+    parser.add_argument("--offline", action="store_true", help="Read metadata only from the local snapshot cache.")
+    parser.add_argument("--online-fallback", action="store_true", help="Regenerate chunks without a valid batch result with online calls.")
+    args = parser.parse_args()
+
+    contexts = load_contexts(args.datasets, args.context_format, args.offline)
+    if not contexts:
+        print("❌ No dataset context available.")
+        return
+
+    fallback = None
+    if args.stub:
+        backend = LocalBatchBackend()
+    else:
+        if not args.bucket:
+            parser.error("--bucket (or GLOSSARY_BATCH_BUCKET / GCS_BUCKET) is required for Vertex AI batch jobs")
+        from core.client_pool import genai_client
+        from modules.batch_glossary import VertexBatchBackend
+        # Batch prediction for Gemini is regional (not available in the 'us' multi-region)
+        client = genai_client(PROJECT_ID, BATCH_LOCATION)
+        backend = VertexBatchBackend(client, args.bucket)
+
+    if args.online_fallback:
+        from modules.business_glossary import BusinessGlossaryGenerator
+        fallback = BusinessGlossaryGenerator(model_name=args.model, context_format=args.context_format)
+
+    runner = BatchGlossaryRunner(backend, args.model, context_format=args.context_format, fallback_generator=fallback)
+    outputs = runner.run(contexts)
+
+    failed = [dataset_id for dataset_id, path in outputs.items() if not path]
+    print(f"🏁 {len(outputs) - len(failed)}/{len(outputs)} dataset(s) generated.")
+    if failed:
+        raise RuntimeError(f"No glossary generated for: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
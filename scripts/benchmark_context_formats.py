@@ -0,0 +1,104 @@
+import sys
+import os
+
+# Add the project root directory to sys.path so we can import 'modules'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import json
+import time
+from modules.context_serializer import CONTEXT_FORMATS, serialize_tables
+from modules.glossary_map_reduce import chunk_context, estimate_tokens
+from modules.metadata_cache import MetadataSnapshotCache
+
+# Configuration (Env vars or defaults)
+PROJECT_ID = os.getenv("GCP_PROJECT_ID", "pg-gccoe-carlos-monteverde")
+LOCATION = os.getenv("GCP_LOCATION", "us")
+DATASETS = ["pharmaceutical_drugs"]
+
+
+def load_tables(dataset_id: str, live: bool) -> list:
+    """Metadata from the local snapshot cache (no BigQuery calls) or, with --live, from BigQuery."""
+    if live:
+        from modules.bigquery_reader import BigQueryMetadataReader
+        reader = BigQueryMetadataReader(PROJECT_ID, LOCATION)
+        return reader.fetch_tables(dataset_id, reader.list_table_ids(dataset_id))
+
+    cache = MetadataSnapshotCache()
+    return cache.load(PROJECT_ID, dataset_id, sorted(cache.get_versions(PROJECT_ID, dataset_id)))
+
+
+def benchmark(dataset_id: str, tables: list, formats: list, generate: bool, use_sdk: bool) -> list:
+    generator = None
+    counter = None
+    if generate or use_sdk:
+        from modules.business_glossary import BusinessGlossaryGenerator
+        from modules.token_budget import TokenCounter
+        generator = BusinessGlossaryGenerator(use_cache=False)
+        counter = TokenCounter(generator.client, generator.model_name, use_sdk=use_sdk)
+
+    rows = []
+    for fmt in formats:
+        context = serialize_tables(dataset_id, tables, fmt)
+        row = {
+            "dataset": dataset_id,
+            "format": fmt,
+            "chars": len(context),
+            "tokens": counter.count(context) if counter else estimate_tokens(context),
+        }
+        if generator:
+            generator.context_format = fmt
+            row["chunks"] = len(chunk_context(context, generator.max_chunk_tokens))
+            row["prompt_tokens"] = generator.count_prompt_tokens(context, counter)
+        if generate:
+            start = time.monotonic()
+            result = generator.suggest_glossary_structure(context)
+            row["latency_s"] = round(time.monotonic() - start, 2)
+            try:
+                glossary = json.loads(result or "")
+                row["terms"] = sum(len(c.get("terms", [])) for c in glossary.get("glossary", {}).get("categories", []))
+            except ValueError:
+                row["terms"] = None
+        rows.append(row)
+    return rows
+
+
+def print_rows(rows: list):
+    baseline = {row["dataset"]: row["tokens"] for row in rows if row["format"] == "text"}
+    columns = ["dataset", "format", "chars", "tokens", "vs_text", "chunks", "prompt_tokens", "latency_s", "terms"]
+    columns = [c for c in columns if c == "vs_text" or any(c in row for row in rows)]
+    print("\t".join(columns))
+    for row in rows:
+        base = baseline.get(row["dataset"])
+        row["vs_text"] = f"{100 * row['tokens'] / base:.0f}%" if base else "-"
+        print("\t".join(str(row.get(c, "-")) for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare prompt size (and optionally generation latency) of the context formats.")
+    parser.add_argument("datasets", nargs="*", default=DATASETS, help="BigQuery datasets to benchmark.")
+    parser.add_argument("--formats", nargs="+", default=list(CONTEXT_FORMATS), choices=CONTEXT_FORMATS)
+    parser.add_argument("--live", action="store_true", help="Read metadata from BigQuery instead of the local snapshot cache.")
+    parser.add_argument("--sdk-tokens", action="store_true", help="Count tokens with the Gemini count_tokens API.")
+    parser.add_argument("--generate", action="store_true", help="Also generate a glossary per format (bypassing the response cache) and time it.")
+    parser.add_argument("--json", dest="json_output", help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    rows = []
+    for dataset_id in args.datasets:
+        tables = load_tables(dataset_id, args.live)
+        if not tables:
+            print(f"⚠️ No metadata for {dataset_id} (run the agent once to fill the cache, or use --live).")
+            continue
+        print(f"📊 {dataset_id}: {len(tables)} table(s), {sum(len(t['columns']) for t in tables)} column(s)")
+        rows.extend(benchmark(dataset_id, tables, args.formats, args.generate, args.sdk_tokens))
+
+    if rows:
+        print_rows(rows)
+    if args.json_output:
+        with open(args.json_output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import sys
+import os
+
+# Add the project root directory to sys.path so we can import 'modules'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import json
+import subprocess
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Entry points whose cold start matters (Cloud Run web app and CLI)
+DEFAULT_TARGETS = ["app", "main", "config.settings"]
+# Heavy SDKs that must only be imported on first use, never at startup
+FORBIDDEN_AT_STARTUP = [
+    "google.cloud.bigquery",
+    "google.cloud.dataplex_v1",
+    "google.cloud.secretmanager",
+    "google.cloud.storage",
+    "google.genai",
+    "github",
+    "googleapiclient",
+    "numpy",
+    "pypdf",
+]
+
+
+def profile(target: str, runs: int) -> dict:
+    """
+    Imports `target` in a fresh interpreter with `python -X importtime` (best of `runs`)
+    and parses the per-module timings written to stderr.
+    """
+    best = None
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+        )
+        modules = {}
+        for line in proc.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            if not line.startswith("import time:") or "imported package" in line:
+                continue
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            modules[name.strip()] = (int(self_us), int(cumulative_us))
+        result = {
+            "target": target,
+            "ok": proc.returncode == 0,
+            "error": proc.stderr.strip().splitlines()[-1] if proc.returncode else None,
+            "total_ms": modules.get(target, (0, 0))[1] / 1000,
+            "modules": modules,
+        }
+        if best is None or (result["ok"] and result["total_ms"] < best["total_ms"]):
+            best = result
+    return best
+
+
+def forbidden_imports(modules: dict, forbidden: list) -> list:
+    return sorted(name for name in modules if any(name == f or name.startswith(f + ".") for f in forbidden))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of the app/CLI entry points (python -X importtime).")
+    parser.add_argument("targets", nargs="*", default=DEFAULT_TARGETS, help="Modules to import.")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per target (best run is reported).")
+    parser.add_argument("--top", type=int, default=15, help="Heaviest imports to list per target.")
+    parser.add_argument("--max-ms", type=float, default=0, help="Fail if a target takes longer than this to import (0 = no limit).")
+    parser.add_argument("--allow-sdk", action="store_true", help="Do not fail when a heavy SDK is imported at startup.")
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this JSON file.")
+    args = parser.parse_args()
+
+    report, failures = [], []
+    for target in args.targets:
+        result = profile(target, max(1, args.runs))
+        heavy = forbidden_imports(result["modules"], FORBIDDEN_AT_STARTUP)
+        top = sorted(result["modules"].items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+
+        print(f"\n⏱️ import {target}: {result['total_ms']:.1f} ms ({len(result['modules'])} modules)")
+        if not result["ok"]:
+            print(f"  ⚠️ Import failed: {result['error']}")
+        for name, (self_us, cumulative_us) in top:
+            print(f"  {self_us / 1000:8.1f} ms self {cumulative_us / 1000:8.1f} ms cumulative  {name}")
+        if heavy:
+            print(f"  ❌ SDKs imported at startup: {', '.join(heavy)}")
+
+        if not result["ok"]:
+            failures.append(f"{target}: import failed ({result['error']})")
+        if heavy and not args.allow_sdk:
+            failures.append(f"{target}: imports {', '.join(heavy)} at startup")
+        if args.max_ms and result["total_ms"] > args.max_ms:
+            failures.append(f"{target}: {result['total_ms']:.1f} ms > {args.max_ms:.1f} ms")
+        report.append({
+            "target": target,
+            "ok": result["ok"],
+            "error": result["error"],
+            "total_ms": result["total_ms"],
+            "sdk_imports": heavy,
+            "top": [{"module": name, "self_ms": s / 1000, "cumulative_ms": c / 1000} for name, (s, c) in top],
+        })
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📄 Report written to {args.json_path}")
+
+    if failures:
+        print("\n❌ Cold-start regressions:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("\n✅ No cold-start regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,11 @@ import os
 # This assumes the script is located at [project_root]/scripts/publish_glossary.py
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+import argparse
 import json
-import uuid
-import unicodedata
-import re
-from google.cloud import bigquery
 from modules.dataplex_client import DataplexGlossaryClient
-from modules.audit_logger import AuditLogger
+from modules.audit_logger import PublishEventLog, get_audit_logger
+from modules.glossary_publisher import GlossaryReconciler, build_desired_state
 
 # Configuration (Env vars or defaults)
 PROJECT_ID = os.getenv("GCP_PROJECT_ID", "pg-gccoe-carlos-monteverde")
@@ -19,7 +17,7 @@ LOCATION = os.getenv("GCP_LOCATION", "us")
 DATASET_ID = "openFormatHealthcare" # For Audit Log
 GLOSSARY_ID = "business-glossary-v1" # Fixed ID (hyphens only)
 
-def main():
+def main(dry_run: bool = False, purge: bool = False):
     print("🚀 Starting Glossary Publishing Process...")
     
     # 1. Load JSON file
@@ -48,138 +46,44 @@ def main():
 
     # 2. Init Clients
     client = DataplexGlossaryClient(PROJECT_ID, LOCATION)
-    audit = AuditLogger(PROJECT_ID, DATASET_ID)
+    audit = get_audit_logger(PROJECT_ID, DATASET_ID)
     
     actor = os.getenv("GITHUB_ACTOR", "unknown_user")
 
     try:
-        # 3. Clean up existing glossary to ensure fresh start
-        client.delete_glossary(GLOSSARY_ID)
-        
-        # 4. Create Glossary
-        # Expected structure from BusinessGlossaryGenerator:
-        # { "glossary": { "categories": [...], "terms": [...] } }
-        
-        # Create root glossary container
-        # Create/Update root glossary
-        client.create_or_update_glossary(GLOSSARY_ID, "Business Glossary", "Corporate Business Glossary")
-        
-        # Parse new structure: { "glossary": { "categories": [...], "terms": [...] } }
-        glossary_data = data.get("glossary", {})
-        print(f"DEBUG: Glossary keys: {glossary_data.keys()}")
-        categories = glossary_data.get("categories", [])
-        if categories:
-            print(f"DEBUG: First category keys: {categories[0].keys()}")
-        terms = glossary_data.get("terms", [])
-
-        # FIX: If terms are nested inside categories (Standard Gemini Output), collect them
-        if not terms:
-            print("ℹ️ Terms not found at root, extracting from categories...")
-            for cat in categories:
-                cat_terms = cat.get("terms", [])
-                if cat_terms:
-                    terms.extend(cat_terms)
-        
-        print(f"📊 Found {len(categories)} categories and {len(terms)} terms.")
+        # 3. Optional full rebuild (e.g. staging): purge everything first (resumable)
+        if purge and not dry_run:
+            client.purge_glossary(GLOSSARY_ID)
 
-        # 1. Create Categories
-        # Map original ID from JSON to sanitized ID for Dataplex
-        cat_id_map = {} 
-
-        for cat in categories:
-            original_id = cat.get("id")
-            # Sanitize ID: normalize to NFKD form to split accents, encode to ascii ignoring non-ascii, decode back
-            normalized = unicodedata.normalize('NFKD', original_id).encode('ascii', 'ignore').decode('utf-8')
-            # Replace spaces/underscores with hyphens and keep only alphanumeric/hyphens
-            safe_id = re.sub(r'[^a-zA-Z0-9-]', '', normalized.lower().replace("_", "-").replace(" ", "-"))
-            # Ensure no double hyphens
-            safe_id = re.sub(r'-+', '-', safe_id).strip('-')
-            
-        for cat in categories:
-            original_id = cat.get("id")
-            # Sanitize ID: normalize to NFKD form to split accents, encode to ascii ignoring non-ascii, decode back
-            normalized = unicodedata.normalize('NFKD', original_id).encode('ascii', 'ignore').decode('utf-8')
-            # Replace spaces/underscores with hyphens and keep only alphanumeric/hyphens
-            safe_id = re.sub(r'[^a-zA-Z0-9-]', '', normalized.lower().replace("_", "-").replace(" ", "-"))
-            # Ensure no double hyphens
-            safe_id = re.sub(r'-+', '-', safe_id).strip('-')
-            
-            cat_id_map[original_id] = safe_id
-            
-            # User requested Overview to be separate, but API doesn't support it in v1.
-            # We will NOT append it to description as requested ("manual").
-            cat_desc = cat.get("description", "")
-            
-            client.create_category(
-                GLOSSARY_ID, 
-                safe_id, 
-                cat.get("display_name", original_id), 
-                cat_desc,
-                labels=cat.get("labels", {})
-            )
+        # Create/Update root glossary container (categories/terms are reconciled below)
+        if not dry_run:
+            client.create_or_update_glossary(GLOSSARY_ID, "Business Glossary", "Corporate Business Glossary")
 
-        # 2. Create Terms
-        term_count = 0
-        for term in terms:
-            term_name = term.get("term", "Unnamed")
-            
-            # User requested to keep Description clean (only definition).
-            # Overview, Related Terms, Synonyms, Contacts will be filled manually.
-            rich_description = term.get("definition", "No definition provided.")
-            
-            # Sanitize Term ID
-            normalized_term = unicodedata.normalize('NFKD', term_name).encode('ascii', 'ignore').decode('utf-8')
-            term_id = re.sub(r'[^a-zA-Z0-9-]', '', normalized_term.lower().replace(" ", "-").replace("/", "-").replace("_", "-"))
-            term_id = re.sub(r'-+', '-', term_id).strip('-')[:99]
-            
-            # Find parent category ID
-            parent_cat_name = term.get("parent_category")
-            parent_cat_id = None
-            
-            # We need to map 'parent_category' Name -> Category ID
-            # Let's rebuild a map from category display_name -> original_id -> safe_id
-            cat_name_to_id = {c.get("display_name"): cat_id_map.get(c.get("id")) for c in categories}
-            
-            if parent_cat_name:
-                parent_cat_id = cat_name_to_id.get(parent_cat_name)
-                # Fallback: if name matches ID directly (check original IDs)
-                if not parent_cat_id:
-                     # Check if 'parent_category' matches one of the original IDs
-                     if parent_cat_name in cat_id_map:
-                         parent_cat_id = cat_id_map[parent_cat_name]
+        # 4. Diff the proposal against the live glossary and apply only the differences
+        reconciler = GlossaryReconciler(client, GLOSSARY_ID)
+        summary = reconciler.sync(data, dry_run=dry_run)
 
-            # Add Technical Column to labels if possible (sanitized)
-            term_labels = term.get("labels", {})
-            if term.get("related_technical_column"):
-                # Labels keys must be lowercase, numbers, underscores, hyphens. Max 63 chars.
-                # We will use a generic key 'related_technical_column' and truncate the value if needed?
-                # Wait, label values also have restrictions.
-                # Let's try to put it in labels.
-                tech_col = term.get("related_technical_column")
-                # Sanitize value for label (lowercase, etc? No, values can contain unicode but usually restricted)
-                # Dataplex Label values: max 63 chars, lowercase, digits, -_
-                # Columns like 'pharmaceutical_drugs.drug_molecule.id' are too long/complex for label values usually.
-                # We will skip adding it to labels to avoid errors, as user said "Related entries" (which we can't do easily).
-                pass
+        if dry_run:
+            print("ℹ️ Dry-run: no changes were applied.")
+            return
 
-            client.create_term(
-                GLOSSARY_ID, 
-                term_id, 
-                term_name, 
-                rich_description, 
-                parent_category_id=parent_cat_id,
-                labels=term_labels
+        # One row per category/term operation (bulk load job), also when some of them failed
+        if reconciler.results:
+            summary["publish_run_id"] = PublishEventLog(PROJECT_ID, DATASET_ID).log_results(
+                reconciler.results, glossary_id=GLOSSARY_ID, actor=actor, resource_name=reconciler.resource_name
             )
-            term_count += 1
 
-        print(f"✅ Glossary published successfully. {len(categories)} categories, {term_count} terms.")
+        if summary.get("failed"):
+            raise RuntimeError(f"{summary['failed']} glossary operation(s) failed: {summary}")
+
+        print(f"✅ Glossary published successfully. {summary}")
         
-        # 4. Audit Log
+        # 5. Audit Log
         audit.log_event(
             status="APPROVED_AND_PUBLISHED", 
             actor=actor, 
             glossary_id=GLOSSARY_ID, 
-            details={"file": latest_file, "terms_count": term_count}
+            details={"file": latest_file, "terms_count": len(build_desired_state(data)[1]), **summary}
         )
 
     except Exception as e:
@@ -193,4 +97,8 @@ def main():
         raise e
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Publish the latest glossary proposal to Dataplex.")
+    parser.add_argument("--dry-run", action="store_true", help="Print the create/update/delete plan without applying it.")
+    parser.add_argument("--purge", action="store_true", help="Delete the whole glossary before publishing (full rebuild, resumable).")
+    args = parser.parse_args()
+    main(dry_run=args.dry_run, purge=args.purge)
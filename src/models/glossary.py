@@ -0,0 +1,62 @@
+from pydantic import BaseModel, Field, field_serializer, field_validator
+from typing import Dict, List, Optional
+
+
+def _coerce_labels(value):
+    # Proposals store labels as {"key": "value"}; the model schema uses a list because
+    # response_schema does not support free-form object keys.
+    if isinstance(value, dict):
+        return [{"key": str(k), "value": str(v)} for k, v in value.items()]
+    return value or []
+
+
+class Label(BaseModel):
+    key: str = Field(..., description="Label key (e.g. domain, subdomain, data_sensitivity).")
+    value: str = Field(..., description="Label value.")
+
+
+class Term(BaseModel):
+    term: str = Field(..., description="Business term name.")
+    definition: str = Field(..., description="Functional (non-technical) definition.")
+    parent_category: Optional[str] = Field(None, description="Display name of the category the term belongs to.")
+    labels: List[Label] = Field(default_factory=list, description="Term labels.")
+    overview: Optional[str] = Field(None, description="Detailed (long) description.")
+    related_terms: List[str] = Field(default_factory=list, description="Related business terms.")
+    synonym_terms: List[str] = Field(default_factory=list, description="Synonyms.")
+    contacts: List[str] = Field(default_factory=list, description="Suggested contacts (roles).")
+    related_technical_column: Optional[str] = Field(None, description="Related technical column.")
+
+    @field_validator("labels", mode="before")
+    @classmethod
+    def _labels_from_dict(cls, value):
+        return _coerce_labels(value)
+
+    @field_serializer("labels")
+    def _labels_to_dict(self, labels: List[Label]) -> Dict[str, str]:
+        return {label.key: label.value for label in labels}
+
+
+class Category(BaseModel):
+    id: Optional[str] = Field(None, description="Stable category identifier (snake_case).")
+    display_name: str = Field(..., description="Category display name.")
+    description: str = Field("", description="Short description.")
+    overview: Optional[str] = Field(None, description="Detailed explanation of the category.")
+    labels: List[Label] = Field(default_factory=list, description="Category labels.")
+    terms: List[Term] = Field(default_factory=list, description="Business terms in this category.")
+
+    @field_validator("labels", mode="before")
+    @classmethod
+    def _labels_from_dict(cls, value):
+        return _coerce_labels(value)
+
+    @field_serializer("labels")
+    def _labels_to_dict(self, labels: List[Label]) -> Dict[str, str]:
+        return {label.key: label.value for label in labels}
+
+
+class Glossary(BaseModel):
+    categories: List[Category] = Field(default_factory=list, description="Glossary categories.")
+
+
+class GlossaryProposal(BaseModel):
+    glossary: Glossary = Field(..., description="Business glossary proposal.")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Add the project root directory to sys.path so we can import 'modules'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,81 @@
+import numpy as np
+
+from modules.context_selector import BM25Index, ContextSelector, split_passages, tokenize
+from modules.glossary_map_reduce import estimate_tokens
+
+
+def _document(name: str, topic: str, lines: int) -> str:
+    body = [f"Sección {i}: el {topic} se registra con su {topic}_id y fecha de {topic} número {i}." for i in range(lines)]
+    return "\n".join([f"--- INICIO DOCUMENTO: {name} ---"] + body + [f"--- FIN DOCUMENTO: {name} ---"])
+
+
+def test_tokenize_normalizes_accents_and_drops_stopwords():
+    assert tokenize("La Facturación del Cliente y el pedido_ID") == ["facturacion", "cliente", "pedido", "id"]
+
+
+def test_bm25_scores_matching_documents_first():
+    index = BM25Index.build([
+        tokenize("factura importe iva factura"),
+        tokenize("cliente nombre direccion"),
+        tokenize("pedido cliente fecha"),
+    ])
+
+    scores = index.score(["cliente"])
+
+    assert scores[0] == 0
+    assert scores[1] > 0 and scores[2] > 0
+    assert int(np.argmax(index.score(["factura", "iva"]))) == 0
+    assert index.score(["inexistente"]).sum() == 0
+
+
+def test_bm25_save_and_load_roundtrip(tmp_path):
+    index = BM25Index.build([tokenize("factura importe"), tokenize("cliente factura")])
+    path = str(tmp_path / "index.npz")
+
+    index.save(path)
+    loaded = BM25Index.load(path)
+
+    assert loaded.vocab == index.vocab
+    assert loaded.doc_count == index.doc_count
+    np.testing.assert_allclose(loaded.score(["factura"]), index.score(["factura"]))
+
+
+def test_split_passages_drops_repeated_passages():
+    footer = "Documento confidencial, prohibida su distribución."
+    context = "\n".join([
+        "--- INICIO DOCUMENTO: a.pdf ---", "Los clientes tienen pedidos.", footer,
+        "--- INICIO DOCUMENTO: b.pdf ---", footer,
+    ])
+
+    header, leads, passages = split_passages(context, passage_tokens=10)
+
+    assert header == ""
+    assert leads == ["--- INICIO DOCUMENTO: a.pdf ---", "--- INICIO DOCUMENTO: b.pdf ---"]
+    assert [p.text for p in passages].count(footer) == 1
+
+
+def test_select_returns_context_within_budget_untouched(tmp_path):
+    context = _document("a.pdf", "cliente", 5)
+    selector = ContextSelector(token_budget=10_000, index_dir=str(tmp_path))
+
+    assert selector.select(context) == context
+
+
+def test_select_reduces_context_and_keeps_section_headers(tmp_path):
+    context = "\n".join([
+        _document("clientes.pdf", "cliente", 80),
+        _document("facturas.pdf", "factura", 80),
+        _document("pedidos.pdf", "pedido", 80),
+    ])
+    budget = estimate_tokens(context) // 4
+    selector = ContextSelector(token_budget=budget, passage_tokens=50, index_dir=str(tmp_path))
+
+    result = selector.select(context)
+
+    assert estimate_tokens(result) <= budget
+    for name in ("clientes.pdf", "facturas.pdf", "pedidos.pdf"):
+        assert f"--- INICIO DOCUMENTO: {name} ---" in result
+    assert selector.last_domains
+    # Mismo contexto: se reutiliza el índice persistido y el resultado es determinista
+    assert len(list(tmp_path.glob("*.npz"))) == 1
+    assert ContextSelector(token_budget=budget, passage_tokens=50, index_dir=str(tmp_path)).select(context) == result
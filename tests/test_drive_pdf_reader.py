@@ -0,0 +1,149 @@
+import io
+import os
+import threading
+
+from modules.drive_pdf_reader import DrivePDFReader, DriveSyncState, ExtractedTextCache
+from modules.incremental_glossary import split_documents
+
+ITEM = {"id": "file-1", "md5Checksum": "v1", "size": "2048"}
+
+
+def test_cache_roundtrip_and_stats(tmp_path):
+    cache = ExtractedTextCache(str(tmp_path))
+
+    assert cache.get(ITEM) is None
+    cache.put(ITEM, ["página 1", "página 2"])
+
+    assert cache.get(ITEM) == ["página 1", "página 2"]
+    assert cache.stats() == {"hits": 1, "misses": 1, "bytes_saved": 2048}
+
+
+def test_cache_replaces_previous_versions_of_a_file(tmp_path):
+    cache = ExtractedTextCache(str(tmp_path))
+    cache.put(ITEM, ["v1"])
+
+    cache.put({**ITEM, "md5Checksum": "v2"}, ["v2"])
+
+    assert os.listdir(tmp_path) == ["file-1_v2.json.gz"]
+
+
+def test_cache_discards_corrupt_entries(tmp_path):
+    cache = ExtractedTextCache(str(tmp_path))
+    (tmp_path / "file-1_v1.json.gz").write_bytes(b"no es gzip")
+
+    assert cache.get(ITEM) is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_cache_evicts_least_recently_used_and_ignores_temporary_files(tmp_path):
+    (tmp_path / "otro-trabajo.tmp").write_bytes(b"x" * 10_000)
+    cache = ExtractedTextCache(str(tmp_path))
+    # Texto aleatorio: todas las entradas ocupan lo mismo y caben dos
+    cache.put({"id": "a", "md5Checksum": "1"}, [os.urandom(400).hex()])
+    os.utime(tmp_path / "a_1.json.gz", (1, 1))
+    cache.max_bytes = int(2.5 * os.path.getsize(tmp_path / "a_1.json.gz"))
+    cache.put({"id": "b", "md5Checksum": "1"}, [os.urandom(400).hex()])
+
+    cache.put({"id": "c", "md5Checksum": "1"}, [os.urandom(400).hex()])
+
+    names = sorted(os.listdir(tmp_path))
+    assert names == ["b_1.json.gz", "c_1.json.gz", "otro-trabajo.tmp"]
+
+
+def test_cache_concurrent_writers_share_the_directory(tmp_path):
+    caches = [ExtractedTextCache(str(tmp_path)) for _ in range(4)]
+
+    def write(cache):
+        for _ in range(25):
+            cache.put(ITEM, ["texto"])
+
+    threads = [threading.Thread(target=write, args=(cache,)) for cache in caches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert os.listdir(tmp_path) == ["file-1_v1.json.gz"]
+    assert caches[0].get(ITEM) == ["texto"]
+
+
+def test_cache_write_errors_are_not_raised(tmp_path):
+    cache = ExtractedTextCache(str(tmp_path))
+    cache.cache_dir = str(tmp_path / "no-existe")
+
+    cache.put(ITEM, ["texto"])
+
+
+def _write(pages, max_bytes, separator=False):
+    context = io.StringIO()
+    written, truncated = DrivePDFReader._write_document(context, "a.pdf", pages, separator, max_bytes)
+    return context.getvalue(), written, truncated
+
+
+def test_write_document_without_limit():
+    text, written, truncated = _write(["  página 1 ", "", "página 2  "], 0)
+
+    assert text == "--- INICIO DOCUMENTO: a.pdf ---\npágina 1 \npágina 2\n--- FIN DOCUMENTO: a.pdf ---"
+    assert written == len(text.encode("utf-8"))
+    assert not truncated
+
+
+def test_write_document_truncates_body_but_keeps_both_markers():
+    text, written, truncated = _write(["ñ" * 500], 100, separator=True)
+
+    assert truncated
+    assert written == len(text.encode("utf-8")) <= 100
+    assert text.startswith("\n\n--- INICIO DOCUMENTO: a.pdf ---\n")
+    assert text.endswith("\n--- FIN DOCUMENTO: a.pdf ---")
+    assert list(split_documents(text)) == ["a.pdf"]
+
+
+def test_write_document_writes_nothing_when_markers_do_not_fit():
+    assert _write(["texto"], 20) == ("", 0, True)
+
+
+class CachedOnlyReader(DrivePDFReader):
+    """Lector sin Drive: todos los PDFs se sirven desde la caché de texto."""
+
+    def __init__(self, cache, state_dir, max_context_bytes=0):
+        self.max_download_workers = 1
+        self.max_extract_workers = 1
+        self.max_in_flight = 1
+        self.max_document_bytes = 0
+        self.max_context_bytes = max_context_bytes
+        self.text_cache = cache
+        self.sync_state = DriveSyncState("carpeta", state_dir=state_dir)
+        self.last_documents = {}
+
+
+def _cached_items(tmp_path, pages_by_name):
+    cache = ExtractedTextCache(str(tmp_path / "cache"))
+    items = []
+    for index, (name, pages) in enumerate(pages_by_name.items()):
+        item = {"id": f"id-{index}", "name": name, "path": name, "md5Checksum": "v1"}
+        cache.put(item, pages)
+        items.append(item)
+    return cache, items
+
+
+def test_extract_items_keeps_order_and_marks_documents_processed(tmp_path):
+    cache, items = _cached_items(tmp_path, {"b.pdf": ["Texto B"], "vacio.pdf": ["  "], "a.pdf": ["Texto A"]})
+    reader = CachedOnlyReader(cache, str(tmp_path))
+
+    context = reader._extract_items(items)
+
+    assert list(split_documents(context)) == ["b.pdf", "a.pdf"]
+    assert reader.last_documents == {"b.pdf": "id-0", "a.pdf": "id-2"}
+    assert sorted(reader.sync_state.pending) == ["id-0", "id-1", "id-2"]
+
+
+def test_documents_over_the_context_cap_are_not_marked_processed(tmp_path):
+    cache, items = _cached_items(tmp_path, {"a.pdf": ["A" * 50], "b.pdf": ["B" * 500], "c.pdf": ["C" * 50]})
+    reader = CachedOnlyReader(cache, str(tmp_path), max_context_bytes=200)
+
+    context = reader._extract_items(items)
+
+    assert len(context.encode("utf-8")) <= 200
+    # b.pdf se recorta y c.pdf ya no cabe: ambos se reenviarán en la siguiente ejecución
+    assert list(split_documents(context)) == ["a.pdf", "b.pdf"]
+    assert sorted(reader.sync_state.pending) == ["id-0"]
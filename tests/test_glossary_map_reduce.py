@@ -0,0 +1,93 @@
+import json
+
+from modules.business_glossary import BusinessGlossaryGenerator
+from modules.glossary_map_reduce import chunk_context, estimate_tokens, merge_glossaries, split_sections
+
+
+def _glossary(category, *terms):
+    return {"glossary": {"categories": [{"id": category.lower(), "display_name": category, "terms": [dict(t) for t in terms]}]}}
+
+
+def _terms(glossary):
+    return [term for category in glossary["glossary"]["categories"] for term in category["terms"]]
+
+
+def test_split_sections_repeats_dataset_header():
+    context = "Dataset: ventas\n  Table: clientes\n    Columns:\n  Table: pedidos\n    Columns:"
+
+    assert split_sections(context) == [
+        "Dataset: ventas\n  Table: clientes\n    Columns:",
+        "Dataset: ventas\n  Table: pedidos\n    Columns:",
+    ]
+
+
+def test_chunk_context_respects_budget_and_order():
+    tables = [f"  Table: t{i}\n" + "\n".join(f"      - col_{j} (STRING)" for j in range(20)) for i in range(10)]
+    context = "Dataset: ventas\n" + "\n".join(tables)
+
+    chunks = chunk_context(context, max_tokens=400)
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 400 for chunk in chunks)
+    names = [line.strip() for chunk in chunks for line in chunk.splitlines() if line.strip().startswith("Table: ")]
+    assert names == [f"Table: t{i}" for i in range(10)]
+
+
+def test_chunk_context_splits_oversized_section_keeping_its_header():
+    context = "  Table: enorme\n" + "\n".join(f"      - col_{j} (STRING)" for j in range(300))
+
+    chunks = chunk_context(context, max_tokens=200)
+
+    assert len(chunks) > 1
+    assert all(chunk.startswith("  Table: enorme\n") for chunk in chunks)
+
+
+def test_merge_first_occurrence_wins_and_fills_gaps():
+    first = _glossary("Ventas", {"term": "Cliente", "definition": "nueva", "synonym_terms": ["Comprador"]})
+    second = _glossary("ventas", {"term": "cliente", "definition": "antigua", "overview": "detalle", "synonym_terms": ["comprador", "Usuario"]})
+
+    merged = merge_glossaries([first, second])
+
+    assert len(merged["glossary"]["categories"]) == 1
+    [term] = _terms(merged)
+    assert term["definition"] == "nueva"
+    assert term["overview"] == "detalle"
+    assert term["synonym_terms"] == ["Comprador", "Usuario"]
+
+
+def test_merge_keeps_distinct_unnamed_terms():
+    first = _glossary("Ventas", {"term": "", "definition": "a"}, {"definition": "b"})
+    second = _glossary("Finanzas", {"term": "", "definition": "c"})
+
+    merged = merge_glossaries([first, second])
+
+    assert [term["definition"] for term in _terms(merged)] == ["a", "b", "c"]
+
+
+class ChunkedGenerator(BusinessGlossaryGenerator):
+    """Generador sin cliente del modelo: cada fragmento devuelve una respuesta prefijada."""
+
+    def __init__(self, responses):
+        self.max_chunk_tokens = 100
+        self.max_workers = 2
+        self.responses = responses
+
+    def _generate(self, technical_context, start_level=None):
+        return self.responses[technical_context]
+
+
+def test_map_reduce_merges_all_chunks():
+    generator = ChunkedGenerator({
+        "a": json.dumps(_glossary("Ventas", {"term": "Cliente"})),
+        "b": json.dumps(_glossary("Ventas", {"term": "Pedido"})),
+    })
+
+    result = generator._suggest_map_reduce(["a", "b"])
+
+    assert [term["term"] for term in _terms(json.loads(result))] == ["Cliente", "Pedido"]
+
+
+def test_map_reduce_fails_when_any_chunk_fails():
+    generator = ChunkedGenerator({"a": json.dumps(_glossary("Ventas", {"term": "Cliente"})), "b": None})
+
+    assert generator._suggest_map_reduce(["a", "b"]) is None
@@ -0,0 +1,139 @@
+from types import SimpleNamespace
+
+from modules.glossary_publisher import GlossaryReconciler, build_desired_state, sanitize_id
+
+GLOSSARY_NAME = "projects/p/locations/global/glossaries/g"
+
+
+def _category(cat_id, display_name, description="", labels=None):
+    return SimpleNamespace(name=f"{GLOSSARY_NAME}/categories/{cat_id}", display_name=display_name, description=description, labels=labels or {})
+
+
+def _term(term_id, display_name, description, parent=GLOSSARY_NAME, labels=None):
+    return SimpleNamespace(name=f"{GLOSSARY_NAME}/terms/{term_id}", display_name=display_name, description=description, labels=labels or {}, parent=parent)
+
+
+class FakeDataplexClient:
+    def __init__(self, categories=(), terms=(), failing=()):
+        self.categories = list(categories)
+        self.terms = list(terms)
+        self.failing = set(failing)
+        self.calls = []
+
+    def glossary_name(self, glossary_id):
+        return GLOSSARY_NAME
+
+    def list_categories(self, glossary_id):
+        return self.categories
+
+    def list_terms(self, glossary_id):
+        return self.terms
+
+    def _call(self, operation, resource, *args, **kwargs):
+        self.calls.append((operation, resource))
+        if resource in self.failing:
+            raise ValueError(f"{resource} rechazado")
+
+    def create_category(self, glossary_id, cat_id, *args, **kwargs):
+        self._call("create_category", cat_id)
+
+    def update_category(self, glossary_id, cat_id, *args, **kwargs):
+        self._call("update_category", cat_id)
+
+    def delete_category(self, name):
+        self._call("delete_category", name.rsplit("/", 1)[-1])
+
+    def create_term(self, glossary_id, term_id, *args, **kwargs):
+        self._call("create_term", term_id)
+
+    def update_term(self, glossary_id, term_id, *args, **kwargs):
+        self._call("update_term", term_id)
+
+    def delete_term(self, name):
+        self._call("delete_term", name.rsplit("/", 1)[-1])
+
+
+PROPOSAL = {
+    "glossary": {
+        "categories": [
+            {"id": "Ventas_Category", "display_name": "Ventas", "description": "Comercial", "terms": [
+                {"term": "Cliente", "definition": "Quien compra"},
+                {"term": "Pedido Único", "definition": "Solicitud de compra", "parent_category": "Ventas"},
+            ]},
+            {"id": "finanzas", "display_name": "Finanzas", "description": "Dinero"},
+        ],
+        "terms": [{"term": "Glosario", "definition": "Término en la raíz"}],
+    }
+}
+
+
+def test_sanitize_id():
+    assert sanitize_id("Pedido Único / Año_2024--") == "pedido-unico-ano-2024"
+
+
+def test_build_desired_state_resolves_parent_categories():
+    categories, terms = build_desired_state(PROPOSAL)
+
+    assert sorted(categories) == ["finanzas", "ventas-category"]
+    assert terms["cliente"]["parent_category_id"] == "ventas-category"
+    assert terms["pedido-unico"]["parent_category_id"] == "ventas-category"
+    assert terms["glosario"]["parent_category_id"] is None
+
+
+def test_plan_only_contains_differences():
+    client = FakeDataplexClient(
+        categories=[
+            _category("ventas-category", "Ventas", "Comercial"),
+            _category("finanzas", "Finanzas", "Texto anterior"),
+            _category("obsoleta", "Obsoleta"),
+        ],
+        terms=[
+            _term("cliente", "Cliente", "Quien compra", parent=f"{GLOSSARY_NAME}/categories/ventas-category"),
+            _term("glosario", "Glosario", "Término en la raíz", parent=f"{GLOSSARY_NAME}/categories/finanzas"),
+            _term("antiguo", "Antiguo", "Ya no existe"),
+        ],
+    )
+
+    plan = GlossaryReconciler(client, "g").plan(PROPOSAL)
+
+    assert [cat_id for cat_id, _ in plan.create_categories] == []
+    assert [cat_id for cat_id, _ in plan.update_categories] == ["finanzas"]
+    assert plan.delete_categories == [f"{GLOSSARY_NAME}/categories/obsoleta"]
+    assert [term_id for term_id, _ in plan.create_terms] == ["pedido-unico"]
+    # Movido de categoría a la raíz
+    assert [term_id for term_id, _ in plan.update_terms] == ["glosario"]
+    assert plan.delete_terms == [f"{GLOSSARY_NAME}/terms/antiguo"]
+    assert plan.unchanged == 2
+
+
+def test_plan_is_empty_when_already_in_sync():
+    _, terms = build_desired_state(PROPOSAL)
+    client = FakeDataplexClient(
+        categories=[_category("ventas-category", "Ventas", "Comercial"), _category("finanzas", "Finanzas", "Dinero")],
+        terms=[
+            _term(term_id, wanted["display_name"], wanted["description"],
+                  parent=f"{GLOSSARY_NAME}/categories/{wanted['parent_category_id']}" if wanted["parent_category_id"] else GLOSSARY_NAME)
+            for term_id, wanted in terms.items()
+        ],
+    )
+
+    plan = GlossaryReconciler(client, "g").plan(PROPOSAL)
+
+    assert plan.is_empty
+    assert plan.unchanged == 5
+
+
+def test_apply_runs_categories_before_terms_and_reports_failures():
+    client = FakeDataplexClient(terms=[_term("antiguo", "Antiguo", "x")], failing={"glosario"})
+    reconciler = GlossaryReconciler(client, "g", max_workers=2, qps=0)
+
+    summary = reconciler.apply(reconciler.plan(PROPOSAL))
+
+    operations = [operation for operation, _ in client.calls]
+    assert operations.index("create_term") > max(i for i, op in enumerate(operations) if op == "create_category")
+    assert operations[-1] == "delete_term"
+    assert summary["categories_created"] == 2 and summary["terms_created"] == 3
+    assert summary["failed"] == 1
+    [failed] = [r for r in reconciler.results if r.outcome != "SUCCESS"]
+    assert (failed.operation, failed.item_id) == ("CREATE_TERM", "glosario")
+    assert reconciler.resource_name(failed) == f"{GLOSSARY_NAME}/terms/glosario"
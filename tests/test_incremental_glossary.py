@@ -0,0 +1,172 @@
+import json
+
+from modules.incremental_glossary import (
+    IncrementalGlossaryState,
+    attribute_terms_to_documents,
+    attribute_terms_to_tables,
+    generate_incremental_glossary,
+    prune_glossary,
+    splice_document_glossary,
+    splice_glossary,
+    split_documents,
+)
+from modules.token_budget import TokenBudget
+
+
+def _tables(modified: int):
+    return [
+        {"table_id": "clientes", "modified": 1, "columns": [{"name": "id_cliente", "type": "STRING", "description": "Identificador"}]},
+        {
+            "table_id": "pedidos",
+            "modified": modified,
+            "columns": [{"name": f"col_{i}", "type": "STRING", "description": "columna de pedidos " * 5} for i in range(200)],
+        },
+    ]
+
+
+def _glossary(*terms):
+    return {"glossary": {"categories": [{"id": "ventas", "display_name": "Ventas", "terms": [dict(term) for term in terms]}]}}
+
+
+class FakeGenerator:
+    context_format = "text"
+
+    def __init__(self, response):
+        self.response = response
+        self.contexts = []
+
+    def suggest_glossary_structure(self, context):
+        self.contexts.append(context)
+        return json.dumps(self.response)
+
+
+def _terms(glossary):
+    return {term["term"]: term for category in glossary["glossary"]["categories"] for term in category["terms"]}
+
+
+def _saved_state(tmp_path, glossary, tables):
+    proposal = tmp_path / "proposal.json"
+    proposal.write_text(json.dumps(glossary), encoding="utf-8")
+    state = IncrementalGlossaryState("ventas", state_dir=str(tmp_path))
+    state.save(str(proposal), glossary, tables)
+    return state
+
+
+def test_attribute_terms_to_tables():
+    glossary = _glossary(
+        {"term": "Cliente", "related_technical_column": "ventas.clientes.id_cliente"},
+        {"term": "Pedido", "related_technical_column": "col_3"},
+        {"term": "Sin columna"},
+    )
+
+    assert attribute_terms_to_tables(glossary, _tables(modified=1)) == {"clientes": ["cliente"], "pedidos": ["pedido"]}
+
+
+def test_prune_keeps_terms_shared_with_unchanged_tables():
+    glossary = _glossary({"term": "Cliente"}, {"term": "Pedido"}, {"term": "Importe"})
+    provenance = {"clientes": ["cliente", "importe"], "pedidos": ["importe", "pedido"]}
+
+    pruned, removed = prune_glossary(glossary, provenance, ["pedidos"])
+
+    assert removed == 1
+    assert sorted(_terms(pruned)) == ["Cliente", "Importe"]
+
+
+def test_splice_regenerated_definitions_win():
+    pruned = _glossary({"term": "Cliente", "definition": "antigua", "overview": "detalle"})
+    partial = _glossary({"term": "cliente", "definition": "nueva"})
+
+    term = _terms(splice_glossary(pruned, partial))["cliente"]
+
+    assert term["definition"] == "nueva"
+    assert term["overview"] == "detalle"
+
+
+def test_incremental_regenerates_only_changed_tables(tmp_path):
+    previous = _glossary(
+        {"term": "Cliente", "definition": "v1", "related_technical_column": "clientes.id_cliente"},
+        {"term": "Pedido", "definition": "v1", "related_technical_column": "pedidos.col_0"},
+    )
+    state = _saved_state(tmp_path, previous, _tables(modified=1))
+    generator = FakeGenerator(_glossary({"term": "Pedido", "definition": "v2", "related_technical_column": "pedidos.col_0"}))
+
+    result = json.loads(generate_incremental_glossary(generator, state, "ventas", _tables(modified=2)))
+
+    assert len(generator.contexts) == 1
+    assert "Table: pedidos" in generator.contexts[0] and "Table: clientes" not in generator.contexts[0]
+    assert state.last_context == generator.contexts[0]
+    terms = _terms(result)
+    assert terms["Pedido"]["definition"] == "v2"
+    assert terms["Cliente"]["definition"] == "v1"
+
+
+def test_incremental_without_changes_reuses_previous_proposal(tmp_path):
+    previous = _glossary({"term": "Cliente", "definition": "v1", "related_technical_column": "clientes.id_cliente"})
+    state = _saved_state(tmp_path, previous, _tables(modified=1))
+    generator = FakeGenerator(None)
+
+    result = json.loads(generate_incremental_glossary(generator, state, "ventas", _tables(modified=1)))
+
+    assert generator.contexts == []
+    assert state.last_context is None
+    assert result == previous
+
+
+def test_truncated_tables_are_not_recorded_as_current(tmp_path):
+    previous = _glossary({"term": "Cliente", "definition": "v1", "related_technical_column": "clientes.id_cliente"})
+    proposal = tmp_path / "proposal.json"
+    proposal.write_text(json.dumps(previous), encoding="utf-8")
+    state = IncrementalGlossaryState("ventas", state_dir=str(tmp_path))
+    state.save(str(proposal), previous, _tables(modified=1))
+
+    # 'pedidos' cambia y no cabe en el presupuesto
+    tables = _tables(modified=2)
+    budget = TokenBudget(max_tokens=500)
+    generator = FakeGenerator(_glossary({"term": "Pedido", "definition": "v2", "related_technical_column": "pedidos.col_0"}))
+    clean_json = generate_incremental_glossary(generator, state, "ventas", tables, token_budget=budget)
+    assert clean_json and budget.truncated_sources == ["pedidos"]
+    state.save(str(proposal), json.loads(clean_json), tables, incomplete_tables=budget.truncated_sources)
+
+    changes = IncrementalGlossaryState("ventas", state_dir=str(tmp_path)).diff(tables)
+    assert changes["changed"] == ["pedidos"]
+    assert changes["unchanged"] == ["clientes"]
+
+
+DRIVE_CONTEXT = (
+    "--- INICIO DOCUMENTO: manual/clientes.pdf ---\nEl Cliente realiza compras.\n--- FIN DOCUMENTO: manual/clientes.pdf ---\n\n"
+    "--- INICIO DOCUMENTO: facturas.pdf ---\nCada Factura tiene un importe.\n--- FIN DOCUMENTO: facturas.pdf ---"
+)
+
+
+def test_split_documents():
+    documents = split_documents(DRIVE_CONTEXT)
+
+    assert list(documents) == ["manual/clientes.pdf", "facturas.pdf"]
+    assert "El Cliente realiza compras." in documents["manual/clientes.pdf"]
+    assert "Factura" not in documents["manual/clientes.pdf"]
+
+
+def test_attribute_terms_to_documents_falls_back_to_every_document():
+    glossary = _glossary({"term": "Cliente"}, {"term": "Factura"}, {"term": "Margen"})
+
+    provenance = attribute_terms_to_documents(glossary, DRIVE_CONTEXT, {"manual/clientes.pdf": "id-1", "facturas.pdf": "id-2"})
+
+    assert provenance == {"id-1": ["cliente", "margen"], "id-2": ["factura", "margen"]}
+
+
+def test_splice_document_glossary_replaces_changed_and_removed_documents():
+    previous = _glossary(
+        {"term": "Cliente", "definition": "antigua"},
+        {"term": "Factura", "definition": "antigua"},
+        {"term": "Albarán", "definition": "antigua"},
+    )
+    provenance = {"id-1": ["cliente"], "id-2": ["factura"], "id-3": ["albaran"]}
+    partial = _glossary({"term": "Cliente", "definition": "nueva"})
+
+    merged, merged_provenance, removed = splice_document_glossary(previous, partial, provenance, {"id-1": ["cliente"]}, ["id-1", "id-3"])
+
+    terms = _terms(merged)
+    assert removed == 2
+    assert sorted(terms) == ["Cliente", "Factura"]
+    assert terms["Cliente"]["definition"] == "nueva"
+    assert merged_provenance == {"id-1": ["cliente"], "id-2": ["factura"]}
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from modules.json_stream import CATEGORY_PATH, IncrementalGlossaryParser
+
+GLOSSARY = {
+    "glossary": {
+        "categories": [
+            {
+                "id": "ventas",
+                "display_name": "Ventas",
+                "labels": {"domain": "comercial"},
+                "terms": [
+                    {"term": "Cliente", "definition": "Persona que compra {con llaves} y \"comillas\"", "related_terms": ["Pedido"]},
+                    {"term": "Pedido", "definition": "Solicitud de compra [con corchetes]\\n"},
+                ],
+            },
+            {"id": "finanzas", "display_name": "Finanzas", "terms": [{"term": "Factura", "definition": "Documento"}]},
+        ]
+    }
+}
+
+
+def _feed_in_chunks(parser, text, size):
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    return events
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 10_000])
+def test_emits_terms_and_categories_as_they_close(chunk_size):
+    text = json.dumps(GLOSSARY, ensure_ascii=False)
+    parser = IncrementalGlossaryParser()
+
+    events = _feed_in_chunks(parser, text, chunk_size)
+
+    assert [(kind, obj.get("term") or obj.get("display_name")) for kind, obj in events] == [
+        ("term", "Cliente"),
+        ("term", "Pedido"),
+        ("category", "Ventas"),
+        ("term", "Factura"),
+        ("category", "Finanzas"),
+    ]
+    assert events[0][1] == GLOSSARY["glossary"]["categories"][0]["terms"][0]
+    assert parser.complete
+    assert json.loads(parser.result()) == GLOSSARY
+
+
+def test_term_is_emitted_before_the_response_ends():
+    text = json.dumps(GLOSSARY, ensure_ascii=False)
+    cut = text.index('"Pedido", "definition"')
+    parser = IncrementalGlossaryParser()
+
+    events = list(parser.feed(text[:cut]))
+
+    assert [obj["term"] for _, obj in events] == ["Cliente"]
+    assert not parser.complete
+    assert parser.result() is None
+
+
+def test_ignores_markdown_fences_and_trailing_text():
+    text = "```json\n" + json.dumps(GLOSSARY) + "\n```\nTexto adicional {no json}"
+    parser = IncrementalGlossaryParser()
+
+    events = list(parser.feed(text))
+
+    assert len(events) == 5
+    assert json.loads(parser.result()) == GLOSSARY
+
+
+def test_custom_targets():
+    parser = IncrementalGlossaryParser(targets={CATEGORY_PATH: "category"})
+
+    events = list(parser.feed(json.dumps(GLOSSARY)))
+
+    assert [kind for kind, _ in events] == ["category", "category"]
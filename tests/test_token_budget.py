@@ -0,0 +1,129 @@
+import pytest
+
+from modules.glossary_map_reduce import estimate_tokens
+from modules.token_budget import TokenBudget, TokenCounter, split_sources
+
+
+def _table(name: str, columns: int, description: str = "descripción de la columna") -> str:
+    lines = [f"  Table: {name}", "    Columns:"]
+    lines += [f"      - col_{i} (STRING) - Description: {description} {i}" for i in range(columns)]
+    return "\n".join(lines)
+
+
+def _context(*tables: str) -> str:
+    return "Dataset: ventas\n" + "\n".join(tables)
+
+
+class ScaledCounter(TokenCounter):
+    """Contador 'SDK' de prueba: el recuento real es `factor` veces la estimación local."""
+
+    def __init__(self, factor: float):
+        super().__init__()
+        self.use_sdk = True
+        self.method = "sdk"
+        self.factor = factor
+
+    def count(self, text: str) -> int:
+        return int(estimate_tokens(text) * self.factor)
+
+
+def test_enforce_keeps_context_within_budget_untouched():
+    context = _context(_table("clientes", 3))
+    budget = TokenBudget(max_tokens=10_000)
+
+    assert budget.enforce(context) == context
+    assert budget.truncated_sources == []
+
+
+def test_enforce_disabled_with_zero_budget():
+    context = _context(_table("clientes", 200))
+    budget = TokenBudget(max_tokens=0)
+
+    assert budget.enforce(context) == context
+
+
+def test_fair_share_truncates_only_large_sources():
+    small, large = _table("pequena", 2), _table("grande", 200)
+    budget = TokenBudget(max_tokens=estimate_tokens(small) + 300, policy="fair_share")
+
+    result = budget.enforce(_context(small, large))
+
+    assert estimate_tokens(result) <= budget.max_tokens
+    assert small in result
+    assert "  Table: grande" in result
+    assert budget.truncated_sources == ["grande"]
+
+
+def test_tail_keeps_sources_in_order():
+    first, second = _table("primera", 20), _table("segunda", 20)
+    budget = TokenBudget(max_tokens=estimate_tokens(first) + 20, policy="tail")
+
+    result = budget.enforce(_context(first, second))
+
+    assert first in result
+    assert budget.truncated_sources == ["segunda"]
+
+
+def test_compact_strips_column_descriptions_before_truncating():
+    context = _context(_table("clientes", 20, description="texto largo " * 10))
+    budget = TokenBudget(max_tokens=estimate_tokens(context) // 2, policy="compact")
+
+    result = budget.enforce(context)
+
+    assert "Description:" not in result
+    assert result.count("      - col_") == 20
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("col_1\tS\tdescripción", "col_1\tS"),
+    ("#1 #2", "#1 #2"),
+])
+def test_compact_tsv(line, expected):
+    context = "Dataset: ventas\nTable: clientes\tTabla de clientes\n" + "\n".join([line] * 50)
+    budget = TokenBudget(max_tokens=estimate_tokens(context) - 10, policy="compact", context_format="tsv")
+
+    _, sources = split_sources(budget.enforce(context))
+
+    assert sources[0][1].splitlines()[0] == "Table: clientes\tTabla de clientes"
+    assert set(sources[0][1].splitlines()[1:]) <= {expected}
+
+
+def test_compact_json():
+    context = "Dataset: ventas\nTable: clientes\n{\"d\":\"Clientes\"}\n" + "\n".join(['["col","S","descripción larga"]'] * 50)
+    budget = TokenBudget(max_tokens=estimate_tokens(context) - 10, policy="compact", context_format="json")
+
+    result = budget.enforce(context)
+
+    assert '{"d":"Clientes"}' in result
+    assert '["col","S"]' in result
+    assert "descripción larga" not in result
+
+
+def test_unknown_policy_or_format_is_rejected():
+    with pytest.raises(ValueError):
+        TokenBudget(policy="random")
+    with pytest.raises(ValueError):
+        TokenBudget(context_format="xml")
+
+
+def test_enforce_checks_result_against_real_token_count():
+    # El estimador cree que el contexto cabe, pero el recuento real es el doble
+    context = _context(_table("clientes", 100), _table("pedidos", 100))
+    counter = ScaledCounter(2.0)
+    budget = TokenBudget(counter=counter, max_tokens=estimate_tokens(context))
+
+    result = budget.enforce(context)
+
+    assert counter.count(result) <= budget.max_tokens
+    assert set(budget.truncated_sources) == {"clientes", "pedidos"}
+
+
+def test_report_lists_truncated_sources():
+    budget = TokenBudget(max_tokens=200)
+    context = budget.enforce(_context(_table("clientes", 100)))
+
+    stats = budget.report(context, prompt_tokens=1000, model_name="gemini-2.5-flash")
+
+    assert stats["budget"]["truncated_sources"] == ["clientes"]
+    assert stats["sources_count"] == 1
+    assert stats["model_input_usage_pct"] > 0